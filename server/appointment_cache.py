@@ -0,0 +1,142 @@
+"""Read-through cache for single appointments, per-day busy bitmaps and
+the recurring occurrences expanded per window.
+
+Entries are dropped by the write paths (create, update, cancel, import)
+rather than waiting for expiry: an appointment's own entry and the
+bitmaps of every day its old and new time ranges touch. Expanded
+occurrences only change with the series, so writes to series drop them
+all. For reads without validators (chat), the TTL bounds staleness from
+writes made by other processes.
+
+Validated responses (ETag/Last-Modified) carry the change version of the
+whole database, which other processes' writes also move. The conditional
+views therefore report every version they read through ``observe``, and
+the cache empties itself whenever the version moves past the newest one
+it has seen, so an entry is never served under a version newer than the
+data it was loaded from.
+
+A fill can race a write: the reader loads the old rows, the writer
+invalidates, then the reader caches what it loaded. Readers therefore
+take ``generation()`` before going to storage and pass it to the set_*
+call, which skips caching if any invalidation happened in between.
+"""
+import threading
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from busy_bitmap import days_touched
+from cache import TTLCache
+from models import Appointment
+
+
+def _aware(value: datetime) -> datetime:
+    # Day keys and appointment times are compared across naive/aware inputs
+    return value.astimezone() if value.tzinfo is None else value
+
+
+class AppointmentCache:
+    def __init__(self, maxsize: int = 2048, day_maxsize: int = 512, ttl: float = 30.0):
+        self.appointments = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Keyed by UTC date, see busy_bitmap
+        self.bitmaps = TTLCache(maxsize=day_maxsize, ttl=ttl)
+        # Keyed by the queried (window_start, window_end), see recurrence
+        self.occurrences = TTLCache(maxsize=day_maxsize, ttl=ttl)
+        # Bumped by every invalidation, under _lock together with the entries it drops
+        self._generation = 0
+        self._lock = threading.Lock()
+        # Newest change version seen through observe()
+        self._version = None
+
+    def generation(self) -> int:
+        """Take before loading from storage; see the module docstring."""
+        return self._generation
+
+    def _fill(self, generation: Optional[int], cache: TTLCache, key, value):
+        # None: the caller just wrote the value itself
+        with self._lock:
+            if generation is None or generation == self._generation:
+                cache.set(key, value)
+
+    def _invalidate(self, drop: Callable[[], None]):
+        with self._lock:
+            self._generation += 1
+            drop()
+
+    def observe(self, version: int) -> bool:
+        """Note the change version a response will carry; True if it was newer and the cache was emptied."""
+        with self._lock:
+            if self._version is not None and version <= self._version:
+                return False
+            self._version = version
+            self._generation += 1
+            self._drop_all()
+            return True
+
+    def get_appointment(self, appointment_id: str) -> Optional[Appointment]:
+        return self.appointments.get(appointment_id)
+
+    def set_appointment(self, appointment: Appointment, generation: Optional[int] = None):
+        self._fill(generation, self.appointments, appointment.id, appointment)
+
+    def get_bitmaps(self, first_day: date, last_day: date) -> Tuple[Dict[date, int], List[date]]:
+        """Cached bitmaps of first_day..last_day, and the days that weren't cached."""
+        bitmaps, missing = {}, []
+        day = first_day
+        while day <= last_day:
+            bits = self.bitmaps.get(day)
+            if bits is None:
+                missing.append(day)
+            else:
+                bitmaps[day] = bits
+            day += timedelta(days=1)
+        return bitmaps, missing
+
+    def set_bitmaps(self, bitmaps: Dict[date, int], generation: int):
+        for day, bits in bitmaps.items():
+            self._fill(generation, self.bitmaps, day, bits)
+
+    def get_occurrences(self, window_start: Optional[datetime],
+                        window_end: datetime) -> Optional[List[Appointment]]:
+        return self.occurrences.get(self.window_key(window_start, window_end))
+
+    def set_occurrences(self, window_start: Optional[datetime], window_end: datetime,
+                        occurrences: List[Appointment], generation: int):
+        self._fill(generation, self.occurrences, self.window_key(window_start, window_end), occurrences)
+
+    @staticmethod
+    def window_key(window_start: Optional[datetime], window_end: datetime) -> Tuple:
+        return _aware(window_start) if window_start else None, _aware(window_end)
+
+    def invalidate_range(self, start_time: Optional[datetime], end_time: Optional[datetime]):
+        """Drop cached bitmaps of the days [start_time, end_time) touches."""
+        if start_time is None or end_time is None:
+            return
+        start_time, end_time = _aware(start_time), _aware(end_time)
+
+        def drop():
+            for day in days_touched(start_time, end_time):
+                self.bitmaps.pop(day)
+
+        self._invalidate(drop)
+
+    def invalidate_appointment(self, appointment_id: str):
+        self._invalidate(lambda: self.appointments.pop(appointment_id))
+
+    def invalidate_days(self):
+        """Drop every cached bitmap, e.g. after an import."""
+        self._invalidate(self.bitmaps.clear)
+
+    def invalidate_occurrences(self):
+        self._invalidate(self.occurrences.clear)
+
+    def _drop_all(self):
+        self.appointments.clear()
+        self.bitmaps.clear()
+        self.occurrences.clear()
+
+    def clear(self):
+        self._invalidate(self._drop_all)
+
+    def stats(self) -> Dict:
+        return {'appointments': self.appointments.stats(), 'bitmaps': self.bitmaps.stats(),
+                'occurrences': self.occurrences.stats()}
@@ -0,0 +1,536 @@
+"""Async (ASGI) server mode.
+
+Serves the same API as main.py from an event loop. The routes here only
+parse requests and render responses: every call into storage or the LLM
+goes through main's services on a worker thread, so the storage backend
+(STORAGE_BACKEND), caches, request coalescing, metrics and profiling are
+exactly those of the WSGI server, while the loop stays free to accept
+more requests as those threads wait on Gemini or the database.
+
+I/O is still blocking, so concurrency is capped: ASGI_WORKER_THREADS is
+the number of calls (in practice, chats waiting on the LLM) one process
+runs at once; further requests queue for a thread. A chat gives its
+database connection back before calling the LLM, so the cap is threads,
+not DB_POOL_MAX. The default of 256 covers a few hundred in-flight chats
+per process; raise it, or run more processes, beyond that. Run with any
+ASGI server, e.g.:
+
+    hypercorn asgi:app --bind 0.0.0.0:5000
+"""
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from functools import partial, wraps
+from datetime import date, datetime, timezone
+from typing import AsyncIterator, Dict
+
+import flask
+from quart import Quart, Response, g, has_app_context, jsonify, make_response, request
+from quart.json.provider import DefaultJSONProvider
+from quart_cors import cors
+
+import main
+from main import AppointmentConflict, AppointmentService, conflict_payload
+from availability import DEFAULT_GRANULARITY
+from bulk_import import parse_ndjson
+from conditional import apply_validators, not_modified, version_etag
+from conversation import session_id_from
+from metrics import CONTENT_TYPE, REQUEST_LATENCY, REQUESTS_IN_FLIGHT
+from models import json_default
+from pagination import ndjson_line, page_size
+from profiling import PROFILE_HEADER
+
+ASGI_WORKER_THREADS = int(os.environ.get('ASGI_WORKER_THREADS', 256))
+
+# Per-request counters main's services keep on Flask's g, copied back onto the request's g
+TIMINGS = ('db_queries', 'db_time', 'llm_time')
+
+
+class AppointmentJSONProvider(DefaultJSONProvider):
+    default = staticmethod(json_default)
+    sort_keys = False
+
+
+app = Quart(__name__)
+app.json = AppointmentJSONProvider(app)
+app = cors(app)
+
+executor = ThreadPoolExecutor(max_workers=ASGI_WORKER_THREADS, thread_name_prefix='asgi-worker')
+
+# The cProfile capture of the current request, if it is being profiled
+_capture: ContextVar = ContextVar('capture', default=None)
+
+_DONE = object()
+
+
+class Worker:
+    """A Flask app context for main's services whose calls run on the worker threads.
+
+    Calls are made one at a time, each in the same ``contextvars`` context,
+    so a generator can be advanced from different threads while it keeps
+    its database connection. Closing the worker pops the app context, which
+    hands that connection back to the pool.
+    """
+
+    def __init__(self):
+        self.context = contextvars.copy_context()
+        self.app_context = main.app.app_context()
+        self.capture = _capture.get()
+        self.pushed = False
+
+    async def run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.context.run, self._run, func, args)
+
+    def _run(self, func, args):
+        if not self.pushed:
+            self.app_context.push()
+            self.pushed = True
+        if self.capture is not None:
+            self.capture.enable()
+        try:
+            return func(*args)
+        finally:
+            if self.capture is not None:
+                self.capture.disable()
+
+    def _close(self):
+        if not self.pushed:
+            return
+        if has_app_context():
+            for key in TIMINGS:
+                setattr(g, key, g.get(key, 0) + flask.g.get(key, 0))
+        self.app_context.pop()
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(executor, self.context.run, self._close)
+
+
+async def call(func, *args):
+    """``func(*args)`` on a worker thread."""
+    worker = Worker()
+    try:
+        return await worker.run(func, *args)
+    finally:
+        await worker.close()
+
+
+async def iterate(func, *args) -> AsyncIterator:
+    """The items of the iterator ``func(*args)``, each produced on a worker thread."""
+    worker = Worker()
+    items = None
+    try:
+        items = await worker.run(lambda: iter(func(*args)))
+        while True:
+            item = await worker.run(next, items, _DONE)
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        if hasattr(items, 'close'):
+            await worker.run(items.close)
+        await worker.close()
+
+
+def blocking_iter(items: AsyncIterator, loop: asyncio.AbstractEventLoop):
+    """Iterate ``items`` from a worker thread, fetching each item on the event loop."""
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(items.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
+
+
+@app.after_serving
+async def stop_workers():
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+@app.before_request
+async def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.in_flight = True
+    REQUESTS_IN_FLIGHT.inc()
+
+
+@app.after_request
+async def record_request_metrics(response):
+    if 'request_started' in g:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - g.request_started,
+                                request.method, route, str(response.status_code))
+    return response
+
+
+@app.teardown_request
+async def finish_request_metrics(exception=None):
+    # Streamed responses (stream_with_context) run teardown twice; count the request once
+    if g.pop('in_flight', False):
+        REQUESTS_IN_FLIGHT.dec()
+
+
+@app.after_request
+async def report_query_stats(response):
+    if not (app.debug or main.DB_QUERY_STATS):
+        return response
+
+    queries = g.get('db_queries', 0)
+    response.headers['X-DB-Queries'] = str(queries)
+    response.headers['X-DB-Time-Ms'] = f"{g.get('db_time', 0.0) * 1000:.2f}"
+    if queries > main.DB_QUERY_WARN_THRESHOLD:
+        print(f"{request.method} {request.path} made {queries} database queries (possible N+1)")
+    return response
+
+
+def conditional_on_appointments(view=None, *, rollover=None):
+    """main.conditional_on_appointments for async views."""
+    if view is None:
+        return partial(conditional_on_appointments, rollover=rollover)
+
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        if request.method != 'GET':
+            return await view(*args, **kwargs)
+
+        try:
+            version, changed_at = await call(AppointmentService.change_version)
+        except Exception as e:
+            print(f"Error reading appointment change version: {e}")
+            return await view(*args, **kwargs)
+
+        rolled_at = rollover(request.args) if rollover else None
+        etag = version_etag(version, rolled_at)
+        if rolled_at and changed_at:
+            changed_at = max(changed_at, rolled_at)
+        if not_modified(request, etag, changed_at):
+            return apply_validators(Response('', status=304), etag, changed_at)
+
+        response = await make_response(await view(*args, **kwargs))
+        if response.status_code == 200:
+            apply_validators(response, etag, changed_at)
+        return response
+
+    return wrapper
+
+
+def profiled(view):
+    """main.profiled for async views.
+
+    The capture covers the calls the request makes on worker threads; the
+    event loop itself is serving other requests meanwhile.
+    """
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        if not main.profiler.wanted(request.headers.get(PROFILE_HEADER)):
+            return await view(*args, **kwargs)
+
+        profile = main.profiler.start()
+        if profile is None:
+            return await view(*args, **kwargs)
+        # Enabled by each worker call instead (see Worker._run)
+        profile.disable()
+        token = _capture.set(profile)
+
+        db_before, llm_before = g.get('db_time', 0.0), g.get('llm_time', 0.0)
+        started = time.perf_counter()
+        try:
+            response = await make_response(await view(*args, **kwargs))
+        finally:
+            _capture.reset(token)
+            wall = time.perf_counter() - started
+            breakdown = {
+                'gemini': g.get('llm_time', 0.0) - llm_before,
+                'database': g.get('db_time', 0.0) - db_before
+            }
+            request_line = f"{request.method} {request.full_path.rstrip('?')}"
+            profile_id = main.profiler.finish(profile, request.endpoint, request_line, wall, breakdown)
+        response.headers['X-Profile-Id'] = profile_id
+        return response
+
+    return wrapper
+
+
+async def request_data() -> Dict:
+    if request.method == 'GET':
+        data = request.args.to_dict()
+        if 'durations' in data:
+            data['durations'] = data['durations'].split(',')
+        return data
+    return await request.get_json()
+
+
+@app.route('/api/chat', methods=['POST'])
+@profiled
+async def chat():
+    try:
+        data = await request.get_json()
+        message = data.get('message', '')
+
+        if not message:
+            return jsonify({'success': False, 'error': 'Message is required'}), 400
+
+        response_data = await call(main.answer_chat, message, session_id_from(data))
+        return jsonify({'success': True, 'data': response_data})
+
+    except Exception as e:
+        print(f"Error in chat endpoint: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Internal server error'
+        }), 500
+
+
+@app.route('/api/chat/stream', methods=['POST'])
+async def chat_stream():
+    data = await request.get_json() or {}
+    message = data.get('message', '')
+
+    if not message:
+        return jsonify({'success': False, 'error': 'Message is required'}), 400
+
+    events = iterate(main.chat_events, message, session_id_from(data), datetime.now(timezone.utc))
+    response = Response(events, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    response.timeout = None
+    return response
+
+
+@app.route('/api/appointments', methods=['GET', 'POST'])
+@profiled
+@conditional_on_appointments(rollover=main.list_rollover)
+async def appointments():
+    if request.method == 'GET':
+        try:
+            start_date = request.args.get('start')
+            end_date = request.args.get('end')
+
+            start_dt = datetime.fromisoformat(start_date) if start_date else None
+            end_dt = datetime.fromisoformat(end_date) if end_date else None
+
+            if request.args.get('format') == 'ndjson':
+                rows = iterate(AppointmentService.stream_appointments, start_dt, end_dt)
+                response = Response((ndjson_line(row) async for row in rows), mimetype='application/x-ndjson')
+                response.timeout = None
+                return response
+
+            limit = page_size(request.args.get('limit'))
+            appointments, next_cursor = await call(AppointmentService.get_appointments_page,
+                                                   start_dt, end_dt, request.args.get('cursor'), limit)
+            return jsonify({'success': True, 'data': appointments, 'nextCursor': next_cursor})
+
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    try:
+        data = await request.get_json()
+        appointment = await call(AppointmentService.create_appointment, data)
+
+        if appointment:
+            return jsonify({'success': True, 'data': appointment}), 201
+        return jsonify({'success': False, 'error': 'Failed to create appointment'}), 400
+
+    except AppointmentConflict as e:
+        return jsonify(conflict_payload(e)), 409
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+async def _ndjson_records(body):
+    """Decode the request body as NDJSON while it is still arriving."""
+    buffer = b''
+    async for chunk in body:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for record in parse_ndjson(lines):
+            yield record
+    for record in parse_ndjson([buffer]):
+        yield record
+
+
+@app.route('/api/appointments/import', methods=['POST'])
+async def import_appointments():
+    try:
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            # The import runs on a worker thread and reads the body from the loop as it goes
+            records = blocking_iter(_ndjson_records(request.body), asyncio.get_running_loop())
+        else:
+            records = await request.get_json()
+            if not isinstance(records, list):
+                return jsonify({'success': False, 'error': 'Expected a JSON array of appointments'}), 400
+
+        report = await call(AppointmentService.bulk_import, records)
+        return jsonify({'success': True, 'data': report})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/availability', methods=['GET', 'POST'])
+@profiled
+@conditional_on_appointments
+async def check_availability():
+    try:
+        data = await request_data()
+        date = datetime.fromisoformat(data['date'])
+        duration = int(data.get('duration', 60))
+        granularity = int(data.get('granularity', DEFAULT_GRANULARITY))
+
+        available_slots = await call(AppointmentService.check_availability, date, duration, granularity)
+        return jsonify({'success': True, 'data': available_slots})
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/availability/range', methods=['GET', 'POST'])
+@conditional_on_appointments
+async def check_availability_range():
+    try:
+        start_date, end_date, durations, granularity = main.availability_window(await request_data())
+
+        error = main.window_error(start_date, end_date)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+
+        days = await call(AppointmentService.check_availability_range, start_date, end_date, durations, granularity)
+        return jsonify({'success': True, 'data': days})
+
+    except KeyError as e:
+        return jsonify({'success': False, 'error': f'{e.args[0]} is required'}), 400
+    except ValueError as e:
+        # Malformed dates, numbers or timeZone
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/availability/common', methods=['GET', 'POST'])
+@conditional_on_appointments
+async def check_common_availability():
+    try:
+        data = await request_data()
+        participants = main.common_participants(data)
+        start_date, end_date, durations, granularity = main.availability_window(data)
+
+        if not participants:
+            return jsonify({'success': False, 'error': 'participants is required'}), 400
+        if len(participants) > main.MAX_COMMON_PARTICIPANTS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {main.MAX_COMMON_PARTICIPANTS} participants are allowed'
+            }), 400
+        error = main.window_error(start_date, end_date)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+
+        days = await call(AppointmentService.check_common_availability, participants, start_date, end_date,
+                          durations, granularity)
+        return jsonify({'success': True, 'data': days})
+
+    except KeyError as e:
+        return jsonify({'success': False, 'error': f'{e.args[0]} is required'}), 400
+    except ValueError as e:
+        # Malformed dates, numbers or timeZone
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/appointments/<appointment_id>', methods=['DELETE', 'PUT'])
+async def appointment_detail(appointment_id):
+    if request.method == 'DELETE':
+        try:
+            if await call(AppointmentService.cancel_appointment, appointment_id):
+                return jsonify({'success': True, 'message': 'Appointment cancelled successfully'})
+            return jsonify({'success': False, 'error': 'Appointment not found'}), 404
+
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    try:
+        data = await request.get_json()
+
+        fields = AppointmentService.update_fields(data)
+        if not fields:
+            return jsonify({'success': False, 'error': 'No fields to update'}), 400
+
+        updated_appointment = await call(AppointmentService.update_appointment, appointment_id, fields)
+        if updated_appointment:
+            return jsonify({'success': True, 'data': updated_appointment})
+        return jsonify({'success': False, 'error': 'Appointment not found'}), 404
+
+    except AppointmentConflict as e:
+        return jsonify(conflict_payload(e)), 409
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/recurring', methods=['GET', 'POST'])
+async def recurring_appointments():
+    if request.method == 'GET':
+        try:
+            return jsonify({'success': True, 'data': await call(AppointmentService.get_series_list)})
+
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    try:
+        data = await request.get_json() or {}
+        series = await call(AppointmentService.create_series, data)
+        return jsonify({'success': True, 'data': series}), 201
+
+    except AppointmentConflict as e:
+        return jsonify(conflict_payload(e)), 409
+    except KeyError as e:
+        return jsonify({'success': False, 'error': f'{e.args[0]} is required'}), 400
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/recurring/<series_id>', methods=['DELETE'])
+async def recurring_detail(series_id):
+    try:
+        if await call(AppointmentService.cancel_series, series_id):
+            return jsonify({'success': True, 'message': 'Recurring appointment cancelled successfully'})
+        return jsonify({'success': False, 'error': 'Recurring appointment not found'}), 404
+
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/recurring/<series_id>/exceptions', methods=['POST'])
+async def recurring_exception(series_id):
+    try:
+        data = await request.get_json() or {}
+        if not data.get('date'):
+            return jsonify({'success': False, 'error': 'date is required'}), 400
+
+        series = await call(AppointmentService.add_series_exception, series_id, date.fromisoformat(data['date']))
+        if series:
+            return jsonify({'success': True, 'data': series})
+        return jsonify({'success': False, 'error': 'Recurring appointment not found'}), 404
+
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    report = await call(main.health_report)
+    return jsonify(dict(report, mode='asgi'))
+
+
+@app.route('/api/metrics', methods=['GET'])
+async def metrics():
+    return Response(main.render_metrics(), content_type=CONTENT_TYPE)
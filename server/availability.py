@@ -0,0 +1,167 @@
+"""Interval-based availability engine.
+
+Busy intervals are sorted and merged once, then free slots are emitted by
+walking the gaps between them, so the cost is O(n log n + slots) instead of
+re-scanning every appointment for every candidate slot.
+
+Days are cut in a real time zone: the request's own, or the server's for
+naive dates. Each day's working hours get that day's UTC offset, so a
+range across a DST change keeps them at 9 AM to 6 PM local time.
+"""
+import heapq
+import os
+from datetime import datetime, time, timedelta, tzinfo
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+Interval = Tuple[datetime, datetime]
+
+# Working hours used when computing free slots (9 AM to 6 PM)
+WORK_START_HOUR = 9
+WORK_END_HOUR = 18
+
+# Distance between consecutive candidate slot starts, in minutes
+DEFAULT_GRANULARITY = 30
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Sort intervals by start and merge any that overlap or touch."""
+    merged: List[Interval] = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def merge_sorted_intervals(streams: Iterable[List[Interval]]) -> List[Interval]:
+    """Merge several lists of intervals, each already sorted by start, into one merged list.
+
+    A k-way heap merge: O(n log k) for n intervals across k lists, instead of
+    sorting everything again.
+    """
+    merged: List[Interval] = []
+    for start, end in heapq.merge(*streams):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def free_slots(busy: List[Interval], window_start: datetime, window_end: datetime,
+               duration: int, granularity: int = DEFAULT_GRANULARITY) -> List[Dict]:
+    """Return the free slots of ``duration`` minutes inside the window.
+
+    ``busy`` must already be sorted and merged (see ``merge_intervals``).
+    Candidate slots start at ``window_start`` and advance by ``granularity``
+    minutes; a slot that hits a busy interval resumes at that interval's end.
+    """
+    length = timedelta(minutes=duration)
+    step = timedelta(minutes=granularity)
+    if length <= timedelta(0) or step <= timedelta(0):
+        return []
+
+    slots = []
+    current_time = window_start
+    i = 0
+    n = len(busy)
+
+    while current_time + length <= window_end:
+        slot_end = current_time + length
+
+        # Skip busy intervals that finished before this candidate slot
+        while i < n and busy[i][1] <= current_time:
+            i += 1
+
+        if i < n and busy[i][0] < slot_end:
+            current_time = busy[i][1]
+            continue
+
+        slots.append({
+            'start': current_time.isoformat(),
+            'end': slot_end.isoformat(),
+            'available': True
+        })
+        current_time += step
+
+    return slots
+
+
+@lru_cache(maxsize=1)
+def server_zone() -> tzinfo:
+    """The server's zone from TZ or /etc/localtime, else its current UTC offset."""
+    name = os.environ.get('TZ', '').lstrip(':')
+    try:
+        if name:
+            return ZoneInfo(name)
+        with open('/etc/localtime', 'rb') as f:
+            return ZoneInfo.from_file(f, key='localtime')
+    except (OSError, ValueError, ZoneInfoNotFoundError):
+        return datetime.now().astimezone().tzinfo
+
+
+def in_zone(value: datetime, zone: Optional[tzinfo] = None) -> datetime:
+    """``value`` in ``zone`` (default: its own, or the server's if naive); naive values are wall-clock there."""
+    zone = zone or value.tzinfo or server_zone()
+    return value.replace(tzinfo=zone) if value.tzinfo is None else value.astimezone(zone)
+
+
+def local_days(first_day: datetime, last_day: datetime) -> List[datetime]:
+    """Midnight of every day from ``first_day`` to ``last_day`` inclusive, in ``first_day``'s zone."""
+    first_day = in_zone(first_day)
+    last_date = in_zone(last_day, first_day.tzinfo).date()
+    days = []
+    day = first_day.date()
+    while day <= last_date:
+        days.append(datetime.combine(day, time(0), tzinfo=first_day.tzinfo))
+        day += timedelta(days=1)
+    return days
+
+
+def working_hours(day: datetime) -> Interval:
+    # Built from the date so each day gets its own offset in the zone
+    zone = in_zone(day).tzinfo
+    return (datetime.combine(day.date(), time(WORK_START_HOUR), tzinfo=zone),
+            datetime.combine(day.date(), time(WORK_END_HOUR), tzinfo=zone))
+
+
+def free_slots_by_day(busy: List[Interval], first_day: datetime, last_day: datetime,
+                      durations: List[int],
+                      granularity: int = DEFAULT_GRANULARITY) -> List[Dict]:
+    """Compute free slots for every day from ``first_day`` to ``last_day`` inclusive.
+
+    ``busy`` must be sorted and merged. Days are visited in order with a single
+    pointer into ``busy``, so each interval is only examined for the days it touches.
+    """
+    results = []
+    i = 0
+    n = len(busy)
+
+    for day in local_days(first_day, last_day):
+        work_start, work_end = working_hours(day)
+
+        while i < n and busy[i][1] <= work_start:
+            i += 1
+        j = i
+        while j < n and busy[j][0] < work_end:
+            j += 1
+        day_busy = busy[i:j]
+
+        results.append({
+            'date': day.date().isoformat(),
+            'slots': {
+                str(duration): free_slots(day_busy, work_start, work_end, duration, granularity)
+                for duration in durations
+            }
+        })
+
+    return results
@@ -0,0 +1,123 @@
+"""Micro-benchmark: interval availability engine and busy bitmaps vs. the original nested loop.
+
+Run from the server directory:
+
+    python benchmarks/availability_bench.py --appointments 100 300 600
+"""
+import argparse
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from availability import free_slots, merge_intervals, working_hours  # noqa: E402
+from busy_bitmap import day_bits, days_touched, free_slots_from_bits  # noqa: E402
+
+
+def legacy_check_availability(existing_appointments, start_of_day, duration):
+    """The original O(slots x appointments) scan, kept for comparison."""
+    work_start = start_of_day.replace(hour=9)
+    work_end = start_of_day.replace(hour=18)
+
+    available_slots = []
+    current_time = work_start
+
+    while current_time + timedelta(minutes=duration) <= work_end:
+        slot_end = current_time + timedelta(minutes=duration)
+
+        is_available = True
+        for apt in existing_appointments:
+            apt_start = datetime.fromisoformat(apt['startTime'].replace('Z', '+00:00'))
+            apt_end = datetime.fromisoformat(apt['endTime'].replace('Z', '+00:00'))
+
+            if (current_time < apt_end and slot_end > apt_start):
+                is_available = False
+                current_time = apt_end
+                break
+
+        if is_available:
+            available_slots.append({
+                'start': current_time.isoformat(),
+                'end': slot_end.isoformat(),
+                'available': True
+            })
+            current_time += timedelta(minutes=30)
+
+    return available_slots
+
+
+def engine_check_availability(existing_appointments, start_of_day, duration):
+    busy = merge_intervals((apt['start_time'], apt['end_time']) for apt in existing_appointments)
+    work_start, work_end = working_hours(start_of_day)
+    return free_slots(busy, work_start, work_end, duration)
+
+
+def day_bitmaps(existing_appointments, start_of_day):
+    """The stored bitmaps a request would read; built outside the timed section."""
+    work_start, work_end = working_hours(start_of_day)
+    intervals = [(apt['start_time'], apt['end_time']) for apt in existing_appointments]
+    return {day: day_bits(intervals, day) for day in days_touched(work_start, work_end)}
+
+
+def bitmap_check_availability(bitmaps, start_of_day, duration):
+    work_start, work_end = working_hours(start_of_day)
+    return free_slots_from_bits(bitmaps, work_start, work_end, duration, 30)
+
+
+def make_day(start_of_day, count, rng):
+    """Short appointments scattered over 24h, mostly outside a few free gaps."""
+    appointments = []
+    for _ in range(count):
+        start = start_of_day + timedelta(minutes=rng.randrange(0, 24 * 60 - 15))
+        end = start + timedelta(minutes=rng.choice((1, 2, 5)))
+        appointments.append({
+            'start_time': start,
+            'end_time': end,
+            'startTime': start.isoformat(),
+            'endTime': end.isoformat(),
+        })
+    return appointments
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--appointments', type=int, nargs='+', default=[50, 200, 500, 1000])
+    parser.add_argument('--duration', type=int, default=15)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # Aware, like the appointment times the server reads back
+    start_of_day = datetime(2024, 1, 15).astimezone()
+
+    # The bitmap column isn't checked against the others: these appointments
+    # aren't on 5-minute boundaries, so their cells round out to whole cells
+    print(f"{'appointments':>12} {'legacy ms':>10} {'engine ms':>10} {'speedup':>8} {'bitmap ms':>10}")
+    for count in args.appointments:
+        day = make_day(start_of_day, count, rng)
+
+        expected = legacy_check_availability(day, start_of_day, args.duration)
+        actual = engine_check_availability(day, start_of_day, args.duration)
+        assert actual == expected, f"engine output differs from legacy for {count} appointments"
+
+        legacy = min(timeit.repeat(
+            lambda: legacy_check_availability(day, start_of_day, args.duration),
+            number=1, repeat=args.repeat))
+        engine = min(timeit.repeat(
+            lambda: engine_check_availability(day, start_of_day, args.duration),
+            number=1, repeat=args.repeat))
+        bitmaps = day_bitmaps(day, start_of_day)
+        bitmap = min(timeit.repeat(
+            lambda: bitmap_check_availability(bitmaps, start_of_day, args.duration),
+            number=1, repeat=args.repeat))
+
+        print(f"{count:>12} {legacy * 1000:>10.2f} {engine * 1000:>10.3f} {legacy / engine:>7.0f}x "
+              f"{bitmap * 1000:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+"""Load test: the Flask API against a local database with a stubbed LLM.
+
+Seeds a dataset, serves main.app in-process on a threaded WSGI server with
+LLM_PROVIDER=local, so chats use the deterministic llm.LocalProvider,
+then drives a weighted mix of chat, listing, availability, update and
+cancel requests from concurrent client threads. Results (throughput, p50/p95/p99 per operation, commit)
+are printed or written as JSON so runs can be compared between commits
+(pass an earlier file with --compare to print the changes).
+
+The target database is emptied and reseeded unless --keep-data is given,
+so point it at a scratch database. --storage selects the backend under
+test (see STORAGE_BACKEND); sqlite uses --sqlite-path and memory needs no
+database at all. Run from the server directory:
+
+    python benchmarks/load_test.py --database-url postgresql://localhost/scheduler_bench \\
+        --appointments 100000 --concurrency 16 --duration 60 --output results.json
+    python benchmarks/load_test.py --storage sqlite --sqlite-path /tmp/scheduler_bench.db
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEFAULT_MIX = 'chat=20,list=25,availability=35,update=10,cancel=10'
+
+# Phrasings the fast-path parser handles locally, and ones that go to the (stub) LLM
+FAST_PATH_MESSAGES = [
+    'list my appointments',
+    "what's on my calendar next week",
+    'am I free tomorrow',
+    'when am I free friday',
+]
+LLM_MESSAGES = [
+    'I need to find some time with {name} about the {topic} {day}',
+    'could we move things around so {name} and I can talk {topic} {day}',
+    'is there room {day} for a longer {topic} session with {name}',
+]
+NAMES = ['Priya', 'Tom', 'Ana', 'Wei', 'Kofi', 'Lena']
+TOPICS = ['roadmap', 'budget', 'hiring plan', 'launch', 'retro']
+DAYS = ['tomorrow', 'later this week', 'next week', 'on monday']
+
+
+def seed(count: int, base_day: datetime):
+    """Replace the stored appointments with ``count`` non-overlapping appointments."""
+    from main import SQLITE_PATH, STORAGE_BACKEND, AppointmentService, db, storage
+
+    if STORAGE_BACKEND == 'postgres':
+        storage.init_schema()
+        with db.connection() as conn:
+            with conn.cursor() as cursor:
+                # appointment_participants references appointments, so a bare
+                # TRUNCATE appointments is rejected; busy_bitmaps goes with them
+                cursor.execute("TRUNCATE appointments, appointment_participants, busy_bitmaps")
+            conn.commit()
+    elif STORAGE_BACKEND == 'sqlite':
+        # Nothing has connected yet, so the file can simply be recreated
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(SQLITE_PATH + suffix):
+                os.remove(SQLITE_PATH + suffix)
+        storage.init_schema()
+
+    def records():
+        rng = random.Random(count)
+        for index in range(count):
+            # 16 appointments a day, 30 minutes apart, between 09:00 and 17:00
+            day, slot = divmod(index, 16)
+            start = base_day + timedelta(days=day, hours=9, minutes=30 * slot)
+            yield {
+                'title': f"{rng.choice(TOPICS).title()} with {rng.choice(NAMES)}",
+                'startTime': start.isoformat(),
+                'endTime': (start + timedelta(minutes=rng.choice((15, 20, 25, 30)))).isoformat(),
+                'attendees': [f"{rng.choice(NAMES).lower()}@example.com"]
+            }
+
+    started = time.perf_counter()
+    report = AppointmentService.bulk_import(records())
+    print(f"Seeded {report['imported']} appointments in {time.perf_counter() - started:.1f}s",
+          file=sys.stderr)
+
+
+def dataset_window():
+    from main import STORAGE_BACKEND, db, storage
+
+    if STORAGE_BACKEND != 'postgres':
+        appointments = storage.list()
+        if not appointments:
+            return None, None, 0, []
+        ids = [appointment.id for appointment in appointments]
+        sample = random.Random(len(ids)).sample(ids, min(len(ids), 20000))
+        return appointments[0].start_time, appointments[-1].start_time, len(ids), sample
+
+    with db.connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT min(start_time) AS first, max(start_time) AS last, count(*) AS total "
+                           "FROM appointments WHERE status = 'scheduled'")
+            row = cursor.fetchone()
+            cursor.execute("SELECT id FROM appointments WHERE status = 'scheduled' "
+                           "ORDER BY random() LIMIT 20000")
+            ids = [r['id'] for r in cursor.fetchall()]
+        conn.rollback()
+    return row['first'], row['last'], row['total'], ids
+
+
+def start_server(port: int):
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from main import app
+
+    class QuietHandler(WSGIRequestHandler):
+        # Keep-alive, so clients measure the API rather than TCP setup
+        protocol_version = 'HTTP/1.1'
+
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', port, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Workload:
+    def __init__(self, first: datetime, last: datetime, ids, mix: str, seed_value: int):
+        self.first = first
+        self.span_days = max((last - first).days, 1)
+        self.ids = ids
+        weights = dict(part.split('=') for part in mix.split(','))
+        self.operations = list(weights)
+        self.weights = [float(weights[name]) for name in self.operations]
+        self.seed_value = seed_value
+
+    def random_day(self, rng) -> datetime:
+        return self.first + timedelta(days=rng.randrange(self.span_days))
+
+    def request(self, operation: str, rng):
+        """Return (method, path, body) for one request of the given operation."""
+        if operation == 'chat':
+            if rng.random() < 0.5:
+                message = rng.choice(FAST_PATH_MESSAGES)
+            else:
+                message = rng.choice(LLM_MESSAGES).format(
+                    name=rng.choice(NAMES), topic=rng.choice(TOPICS), day=rng.choice(DAYS))
+            return 'POST', '/api/chat', {'message': message}
+        if operation == 'list':
+            start = self.random_day(rng)
+            end = start + timedelta(days=rng.choice((1, 7, 30)))
+            return 'GET', f"/api/appointments?start={start.date()}&end={end.date()}&limit=100", None
+        if operation == 'availability':
+            day = self.random_day(rng)
+            return 'GET', f"/api/availability?date={day.date()}&duration={rng.choice((15, 30, 60))}", None
+        appointment_id = rng.choice(self.ids)
+        if operation == 'update':
+            return 'PUT', f"/api/appointments/{appointment_id}", {'title': f"Updated {rng.randrange(10 ** 6)}"}
+        if operation == 'cancel':
+            return 'DELETE', f"/api/appointments/{appointment_id}", None
+        raise ValueError(f"Unknown operation: {operation}")
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed: float):
+    latencies = sorted(latency for _, latency, _ in samples)
+    errors = sum(1 for _, _, status in samples if status >= 500 or status == 0)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+
+def run(workload: Workload, host: str, port: int, concurrency: int, duration: float, warmup: float):
+    samples = []
+    lock = threading.Lock()
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def worker(number: int):
+        rng = random.Random(workload.seed_value * 1000 + number)
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        local = []
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            operation = rng.choices(workload.operations, workload.weights)[0]
+            method, path, body = workload.request(operation, rng)
+            payload = json.dumps(body) if body is not None else None
+            headers = {'Content-Type': 'application/json'} if body is not None else {}
+            request_started = time.perf_counter()
+            try:
+                connection.request(method, path, body=payload, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection(host, port, timeout=60)
+                status = 0
+            finished = time.perf_counter()
+            if request_started >= measure_from:
+                local.append((operation, finished - request_started, status))
+        connection.close()
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    results = {'overall': summarize(samples, duration), 'operations': {}}
+    for operation in workload.operations:
+        results['operations'][operation] = summarize(
+            [sample for sample in samples if sample[0] == operation], duration)
+    return results
+
+
+def compare(results, baseline):
+    """Print per-operation changes against an earlier results file."""
+    print(f"{'operation':<14}{'metric':<16}{'baseline':>12}{'current':>12}{'change':>9}", file=sys.stderr)
+    sections = [('overall', results['overall'], baseline.get('overall', {}))]
+    sections += [(name, stats, baseline.get('operations', {}).get(name, {}))
+                 for name, stats in results['operations'].items()]
+    for name, current, before in sections:
+        for metric in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            if not before.get(metric):
+                continue
+            change = (current[metric] - before[metric]) / before[metric] * 100
+            print(f"{name:<14}{metric:<16}{before[metric]:>12.2f}{current[metric]:>12.2f}{change:>+8.1f}%",
+                  file=sys.stderr)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--storage', choices=('postgres', 'sqlite', 'memory'), default='postgres')
+    parser.add_argument('--database-url', help='Scratch Postgres database; its appointments are replaced')
+    parser.add_argument('--sqlite-path', default='scheduler_bench.db', help='Scratch SQLite file (recreated)')
+    parser.add_argument('--appointments', type=int, default=10000, help='Dataset size to seed')
+    parser.add_argument('--keep-data', action='store_true', help='Reuse the existing rows instead of reseeding')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=5, help='Unmeasured seconds before measuring')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Operation weights, e.g. ' + DEFAULT_MIX)
+    parser.add_argument('--llm-latency', type=float, default=800, help='Local LLM latency in ms')
+    parser.add_argument('--llm-jitter', type=float, default=0, help='Extra random local LLM latency, up to this many ms')
+    parser.add_argument('--llm-error-rate', type=float, default=0, help='Share of LLM calls that fail (0-1)')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Write the JSON results here instead of stdout')
+    parser.add_argument('--compare', help='Earlier results file to print the changes against')
+    args = parser.parse_args()
+
+    if args.storage == 'postgres' and not args.database_url:
+        parser.error('--database-url is required with --storage postgres')
+    if args.storage == 'memory' and args.keep_data:
+        parser.error('--keep-data has nothing to keep with --storage memory')
+    os.environ['STORAGE_BACKEND'] = args.storage
+    os.environ['LLM_PROVIDER'] = 'local'
+    os.environ['SQLITE_PATH'] = os.path.abspath(args.sqlite_path)
+    if args.database_url:
+        os.environ['DATABASE_URL'] = args.database_url
+    os.environ.setdefault('DB_POOL_MAX', str(args.concurrency + 2))
+
+    import main as app_module
+    from llm import LocalProvider
+
+    base_day = datetime(2030, 1, 1, tzinfo=timezone.utc)
+    app_module.llm = LocalProvider(latency=args.llm_latency / 1000, jitter=args.llm_jitter / 1000,
+                                   error_rate=args.llm_error_rate, seed=args.seed, base_date=base_day.date())
+
+    if not args.keep_data:
+        seed(args.appointments, base_day)
+    first, last, total, ids = dataset_window()
+    if not ids:
+        parser.error('The database has no scheduled appointments to exercise')
+
+    server = start_server(args.port)
+    try:
+        workload = Workload(first, last, ids, args.mix, args.seed)
+        results = run(workload, '127.0.0.1', args.port, args.concurrency, args.duration, args.warmup)
+    finally:
+        server.shutdown()
+
+    results.update({
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'config': {
+            'storage': args.storage,
+            'appointments': total,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'warmup_s': args.warmup,
+            'mix': args.mix,
+            'llm_latency_ms': args.llm_latency,
+            'llm_jitter_ms': args.llm_jitter,
+            'llm_error_rate': args.llm_error_rate,
+            'seed': args.seed,
+            'pool_max': app_module.DB_POOL_MAX
+        }
+    })
+
+    if args.compare:
+        with open(args.compare) as handle:
+            compare(results, json.load(handle))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as handle:
+            handle.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Micro-benchmark: row -> JSON via per-row dicts vs. the Appointment model.
+
+Run from the server directory:
+
+    python benchmarks/serialization_bench.py --rows 100 1000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Appointment, dumps  # noqa: E402
+
+
+def legacy_to_dict(row):
+    """The original conversion: copy the row and add camelCase time strings."""
+    appointment = dict(row)
+    attendees = appointment['attendees']
+    if not isinstance(attendees, list):
+        attendees = json.loads(attendees or '[]')
+    appointment['attendees'] = attendees
+    appointment['startTime'] = appointment['start_time'].isoformat()
+    appointment['endTime'] = appointment['end_time'].isoformat()
+    return appointment
+
+
+def legacy_dumps(rows):
+    # Flask's default provider: sorted keys and str() for leftover datetimes
+    return json.dumps({'success': True, 'data': [legacy_to_dict(row) for row in rows]},
+                      default=str, sort_keys=True)
+
+
+def model_dumps(rows):
+    return dumps({'success': True, 'data': [Appointment.from_row(row) for row in rows]})
+
+
+def make_rows(count):
+    start = datetime(2024, 1, 15, 9, tzinfo=timezone.utc)
+    return [{
+        'id': f'{index:036d}',
+        'title': f'Meeting {index}',
+        'description': 'Weekly sync',
+        'start_time': start + timedelta(minutes=30 * index),
+        'end_time': start + timedelta(minutes=30 * index + 25),
+        'attendees': '["alice@example.com", "bob@example.com"]',
+        'location': 'Room 1',
+        'status': 'scheduled',
+        'created_at': start,
+        'updated_at': start
+    } for index in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>6} {'legacy ms':>10} {'model ms':>10} {'bytes':>16} {'speedup':>8}")
+    for count in args.rows:
+        rows = make_rows(count)
+        number = max(1, 10000 // count)
+        legacy = min(timeit.repeat(lambda: legacy_dumps(rows), number=number, repeat=args.repeat)) / number
+        model = min(timeit.repeat(lambda: model_dumps(rows), number=number, repeat=args.repeat)) / number
+        sizes = f"{len(legacy_dumps(rows))}->{len(model_dumps(rows))}"
+        print(f"{count:>6} {legacy * 1000:>10.3f} {model * 1000:>10.3f} {sizes:>16} {legacy / model:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
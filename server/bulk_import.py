@@ -0,0 +1,158 @@
+"""Validation and batching for bulk appointment imports.
+
+Records are validated one at a time as they are read and collected into
+fixed-size batches, so an import of any size only holds one batch in
+memory. Each batch is written with a single multi-row INSERT built from
+column arrays (``unnest``).
+"""
+import json
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+IMPORT_STATUSES = ('scheduled', 'cancelled', 'completed')
+
+# Rows that overlap a scheduled appointment (existing or earlier in the import)
+# are skipped by ON CONFLICT and reported as errors instead of aborting the import
+BULK_INSERT_QUERY = """
+    INSERT INTO appointments (id, title, description, start_time, end_time,
+                              attendees, location, status, created_at)
+    SELECT * FROM unnest(%s::varchar[], %s::varchar[], %s::text[], %s::timestamptz[],
+                         %s::timestamptz[], %s::jsonb[], %s::varchar[], %s::varchar[],
+                         %s::timestamptz[])
+    ON CONFLICT DO NOTHING
+    RETURNING id
+"""
+
+MAX_REPORTED_ERRORS = 1000
+
+
+def parse_ndjson(lines: Iterable) -> Iterator:
+    """Yield one decoded record per non-empty line, or the ValueError it raised."""
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ValueError(f"Invalid JSON: {e}")
+
+
+def _parse_time(record: Dict, field: str) -> datetime:
+    value = record.get(field)
+    if not isinstance(value, str):
+        raise ValueError(f"{field} is required")
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"{field} is not a valid ISO datetime")
+
+
+def build_import_row(record: Dict, created_at: datetime) -> tuple:
+    """Validate one record and return it in BULK_INSERT_QUERY column order."""
+    if not isinstance(record, dict):
+        raise ValueError("Record must be a JSON object")
+
+    title = record.get('title')
+    if not isinstance(title, str) or not title.strip():
+        raise ValueError("title is required")
+    if len(title) > 255:
+        raise ValueError("title must be at most 255 characters")
+
+    start_time = _parse_time(record, 'startTime')
+    end_time = _parse_time(record, 'endTime')
+    if end_time <= start_time:
+        raise ValueError("endTime must be after startTime")
+
+    attendees = record.get('attendees', [])
+    if not isinstance(attendees, list):
+        raise ValueError("attendees must be a list")
+
+    status = record.get('status', 'scheduled')
+    if status not in IMPORT_STATUSES:
+        raise ValueError(f"status must be one of {', '.join(IMPORT_STATUSES)}")
+
+    return (
+        str(uuid.uuid4()),
+        title,
+        record.get('description', ''),
+        start_time,
+        end_time,
+        json.dumps(attendees),
+        record.get('location', ''),
+        status,
+        created_at
+    )
+
+
+class BulkImport:
+    """Tracks one import: validates records, hands out batches and builds the report."""
+
+    def __init__(self, batch_size: int = 1000):
+        self.batch_size = batch_size
+        self.created_at = datetime.now()
+        self.received = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Dict] = []
+        self._batch: List[Tuple[int, tuple]] = []
+
+    def add(self, index: int, record) -> Optional[List[Tuple[int, tuple]]]:
+        """Validate a record; returns a full batch when one is ready to be written."""
+        self.received += 1
+        try:
+            if isinstance(record, Exception):
+                raise record
+            self._batch.append((index, build_import_row(record, self.created_at)))
+        except ValueError as e:
+            self.error(index, str(e))
+            return None
+
+        if len(self._batch) >= self.batch_size:
+            return self.take_batch()
+        return None
+
+    def take_batch(self) -> List[Tuple[int, tuple]]:
+        batch, self._batch = self._batch, []
+        return batch
+
+    def error(self, index: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': index, 'error': message})
+
+    @staticmethod
+    def columns(batch: List[Tuple[int, tuple]]) -> tuple:
+        """Transpose a batch of rows into the per-column arrays BULK_INSERT_QUERY expects."""
+        return tuple(list(column) for column in zip(*(row for _, row in batch)))
+
+    def record_result(self, batch: List[Tuple[int, tuple]], inserted_ids: set):
+        for index, row in batch:
+            if row[0] in inserted_ids:
+                self.imported += 1
+            else:
+                self.error(index, 'Overlaps an existing appointment')
+
+    def report(self) -> Dict:
+        return {
+            'received': self.received,
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': sorted(self.errors, key=lambda error: error['row']),
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+
+def run_import(job: BulkImport, records: Iterable, write: Callable[[List[Tuple[int, tuple]]], set]):
+    """Feed ``records`` through ``job``, handing each full batch to ``write``,
+    which stores it and returns the ids it actually inserted."""
+    for index, record in enumerate(records):
+        batch = job.add(index, record)
+        if batch:
+            job.record_result(batch, write(batch))
+    batch = job.take_batch()
+    if batch:
+        job.record_result(batch, write(batch))
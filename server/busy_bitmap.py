@@ -0,0 +1,184 @@
+"""Per-day busy bitmaps for availability lookups.
+
+Each UTC calendar day is cut into 288 five-minute cells. A day's bitmap
+is an int whose bit ``i`` is set when a scheduled appointment overlaps
+cell ``i``. The storage backends keep one bitmap per day up to date as
+appointments are written: Postgres through triggers, the embedded
+backends in Python. Stored bitmaps are 36 bytes, least significant bit
+first, so Postgres' ``set_bit`` and ``int.from_bytes(..., 'little')``
+agree.
+
+Availability then comes from bit operations instead of appointment rows.
+Consecutive days are concatenated into one int. The cells where a slot of
+a given length fits are found for the whole range at once
+(``fit_mask``), and each day's slots are read off that mask. Cells are
+marked busy if an appointment touches any part of them, so an
+appointment that doesn't start and end on a 5-minute boundary blocks the
+whole cell. Windows, durations and granularities that aren't multiples of
+5 minutes can't be expressed in cells; callers fall back to the interval
+engine in availability.py for those.
+"""
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List
+
+from availability import Interval, local_days, working_hours
+
+CELL_MINUTES = 5
+CELL = timedelta(minutes=CELL_MINUTES)
+CELLS_PER_DAY = 24 * 60 // CELL_MINUTES
+BITMAP_BYTES = CELLS_PER_DAY // 8
+DAY = timedelta(days=1)
+
+
+def day_start(day: date) -> datetime:
+    return datetime.combine(day, time(0), tzinfo=timezone.utc)
+
+
+def utc_date(value: datetime) -> date:
+    # Naive datetimes are server-local, as in availability.working_hours
+    return value.astimezone(timezone.utc).date()
+
+
+def days_touched(start: datetime, end: datetime) -> List[date]:
+    """UTC days that [start, end) overlaps."""
+    if end <= start:
+        return []
+    first, last = utc_date(start), utc_date(end - timedelta(microseconds=1))
+    return [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+
+
+def day_bits(intervals: Iterable[Interval], day: date) -> int:
+    """Bitmap of ``day`` from the busy intervals overlapping it."""
+    origin = day_start(day)
+    bits = 0
+    for start, end in intervals:
+        first = max((start - origin) // CELL, 0)
+        # Ceiling division: a partly covered cell is busy
+        last = min(-((origin - end) // CELL), CELLS_PER_DAY)
+        if last > first:
+            bits |= ((1 << (last - first)) - 1) << first
+    return bits
+
+
+def overlay(bitmaps: Dict[date, int], intervals: Iterable[Interval]) -> Dict[date, int]:
+    """A copy of ``bitmaps`` with ``intervals`` marked busy too, e.g. unstored recurring occurrences."""
+    combined = dict(bitmaps)
+    for start, end in intervals:
+        for day in days_touched(start, end):
+            combined[day] = combined.get(day, 0) | day_bits([(start, end)], day)
+    return combined
+
+
+def to_bytes(bits: int) -> bytes:
+    return bits.to_bytes(BITMAP_BYTES, 'little')
+
+
+def from_bytes(data) -> int:
+    return int.from_bytes(bytes(data), 'little')
+
+
+def cell_aligned(window_start: datetime, *minutes: int) -> bool:
+    """Whether a window start and slot lengths/steps can be expressed in whole cells."""
+    if any(value <= 0 or value % CELL_MINUTES for value in minutes):
+        return False
+    return (window_start - day_start(utc_date(window_start))) % CELL == timedelta(0)
+
+
+def combine(bitmaps: Dict[date, int], first_day: date, last_day: date) -> int:
+    """One bitmap for consecutive days, ``first_day`` in the lowest bits."""
+    combined = 0
+    for offset in range((last_day - first_day).days + 1):
+        bits = bitmaps.get(first_day + timedelta(days=offset), 0)
+        if bits:
+            combined |= bits << (offset * CELLS_PER_DAY)
+    return combined
+
+
+def fit_mask(busy: int, total_cells: int, length: int) -> int:
+    """Cells where ``length`` consecutive free cells start."""
+    fits = ~busy & ((1 << total_cells) - 1)
+    # Doubling: after each pass bit i means cells i..i+covered-1 are free
+    covered = 1
+    while covered < length:
+        shift = min(covered, length - covered)
+        fits &= fits >> shift
+        covered += shift
+    return fits
+
+
+def walk_slots(busy: int, fits: int, window_start: datetime, first_cell: int, end_cell: int,
+               length: int, step: int) -> List[Dict]:
+    """Free slots in cells [first_cell, end_cell), as availability.free_slots would list them.
+
+    ``window_start`` is the time of ``first_cell``. Candidates advance by
+    ``step`` cells; one that hits a busy cell resumes where that busy run ends.
+    """
+    slots = []
+    cell = first_cell
+    while cell + length <= end_cell:
+        if fits >> cell & 1:
+            start = window_start + (cell - first_cell) * CELL
+            slots.append({
+                'start': start.isoformat(),
+                'end': (start + length * CELL).isoformat(),
+                'available': True
+            })
+            cell += step
+            continue
+        # Lowest busy cell at or after this one, then the end of its run
+        ahead = busy >> cell
+        cell += (ahead & -ahead).bit_length() - 1
+        run = busy >> cell
+        cell += ((run + 1) & ~run).bit_length() - 1
+    return slots
+
+
+def free_slots_by_day_from_bits(bitmaps: Dict[date, int], first_day: datetime, last_day: datetime,
+                                durations: List[int], granularity: int) -> List[Dict]:
+    """availability.free_slots_by_day computed from day bitmaps.
+
+    ``bitmaps`` must hold every UTC day the working hours touch (days with
+    nothing booked may be left out) and the working hours must be
+    ``cell_aligned`` with every duration and the granularity.
+    """
+    days = [(day, working_hours(day)) for day in local_days(first_day, last_day)]
+    if not days:
+        return []
+
+    first_utc = utc_date(days[0][1][0])
+    last_utc = utc_date(days[-1][1][1])
+    origin = day_start(first_utc)
+    total_cells = ((last_utc - first_utc).days + 1) * CELLS_PER_DAY
+    busy = combine(bitmaps, first_utc, last_utc)
+    # One fit mask per duration covers every day in the range
+    fits = {duration: fit_mask(busy, total_cells, duration // CELL_MINUTES) for duration in durations}
+    step = granularity // CELL_MINUTES
+
+    results = []
+    for day, (work_start, work_end) in days:
+        first_cell = (work_start - origin) // CELL
+        end_cell = (work_end - origin) // CELL
+        results.append({
+            'date': day.date().isoformat(),
+            'slots': {
+                str(duration): walk_slots(busy, fits[duration], work_start, first_cell, end_cell,
+                                          duration // CELL_MINUTES, step)
+                for duration in durations
+            }
+        })
+    return results
+
+
+def free_slots_from_bits(bitmaps: Dict[date, int], window_start: datetime, window_end: datetime,
+                         duration: int, granularity: int) -> List[Dict]:
+    """availability.free_slots for one ``cell_aligned`` window, computed from day bitmaps."""
+    if window_end <= window_start:
+        return []
+    first_day = utc_date(window_start)
+    origin = day_start(first_day)
+    total_cells = ((utc_date(window_end) - first_day).days + 1) * CELLS_PER_DAY
+    busy = combine(bitmaps, first_day, utc_date(window_end))
+    length = duration // CELL_MINUTES
+    return walk_slots(busy, fit_mask(busy, total_cells, length), window_start,
+                      (window_start - origin) // CELL, (window_end - origin) // CELL,
+                      length, granularity // CELL_MINUTES)
@@ -0,0 +1,45 @@
+"""ETag / Last-Modified validators for appointment reads.
+
+Every write to ``appointments`` bumps a change version (in Postgres the sum
+of the ``appointment_versions`` counters, see database.py), so the version
+alone identifies the current state of every listing and availability
+result. Handlers read it first and answer revalidation requests with 304
+before doing any real work. Reading it before the data matters: a write
+committed in between only makes the response newer than its ETag, which
+costs the client one more 200 later instead of a 304 for stale data. The
+counters record no time, so Postgres responses carry only the ETag, not
+Last-Modified.
+"""
+from datetime import datetime
+from typing import Optional
+
+CHANGE_VERSION_QUERY = """
+    SELECT COALESCE(sum(n), 0)::bigint AS version, NULL::timestamptz AS changed_at
+    FROM appointment_versions
+"""
+
+
+def version_etag(version: int, rolled_at: Optional[datetime] = None) -> str:
+    """``rolled_at`` is the last time the result changed without a write, if it can."""
+    if rolled_at:
+        return f"appointments-{version}-{rolled_at:%Y%m%d}"
+    return f"appointments-{version}"
+
+
+def not_modified(request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """True if the client's cached copy (If-None-Match / If-Modified-Since) is current."""
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified:
+        # HTTP dates have one-second resolution
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+
+def apply_validators(response, etag: str, last_modified: Optional[datetime]):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Cacheable, but the client must revalidate with us every time
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,114 @@
+"""Bounded conversation context for the chat endpoints.
+
+Each chat request with a session id stores two turns (the user's message
+and the agent's reply) through the storage backend; in Postgres that is
+the ``conversation_history`` table, read newest first through its
+(user_id, created_at) index. Only the newest ``max_turns`` are ever read.
+
+The prompt gets as many recent turns verbatim as fit a token budget.
+Older turns survive only in a compact summary carried forward on every
+agent turn: the scheduling details gathered so far and the last intent.
+The details start over once a schedule, update or cancel is carried out.
+Prompt size therefore stays flat however long a conversation runs.
+"""
+import json
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+SESSION_ID_MAX_LENGTH = 36
+
+# Rough token estimate (about four characters per token for English text)
+CHARS_PER_TOKEN = 4
+
+# Intents that finish a request; once one is done its details must not carry into the next request
+COMPLETING_INTENTS = ('schedule', 'update', 'cancel')
+
+
+def session_id_from(data: Dict) -> Optional[str]:
+    """The ``sessionId`` from a chat request body, or None if absent or unusable."""
+    session_id = data.get('sessionId')
+    if isinstance(session_id, str) and 0 < len(session_id.strip()) <= SESSION_ID_MAX_LENGTH:
+        return session_id.strip()
+    return None
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def turn_metadata(turn: Dict) -> Dict:
+    metadata = turn.get('metadata') or {}
+    # JSONB arrives already decoded from psycopg2 but as text from SQLite
+    return json.loads(metadata) if isinstance(metadata, str) else metadata
+
+
+def latest_summary(turns: List[Dict]) -> Dict:
+    """The summary carried by the newest agent turn in ``turns`` (newest first)."""
+    for turn in turns:
+        if turn['sender'] == 'agent':
+            return turn_metadata(turn).get('summary', {})
+    return {}
+
+
+def completed(result: Dict, response_data: Dict) -> bool:
+    """Whether the exchange finished a schedule, update or cancel request."""
+    intent = result.get('intent', 'other')
+    if intent not in COMPLETING_INTENTS or result.get('requires_confirmation'):
+        return False
+    if intent == 'schedule':
+        # Not when details were missing or the time clashed; the user is still working on it
+        return 'data' in response_data and 'conflict' not in response_data
+    return True
+
+
+def next_summary(previous: Dict, result: Dict, response_data: Dict) -> Dict:
+    """Summary after an exchange: the details so far, updated with this turn's, or none once a request is done."""
+    intent = result.get('intent', 'other')
+    if completed(result, response_data):
+        return {'details': {}, 'last_intent': intent}
+    details = dict(previous.get('details', {}))
+    details.update(result.get('extracted_info') or {})
+    return {'details': details, 'last_intent': intent}
+
+
+def build_context(turns: List[Dict], token_budget: int) -> str:
+    """Prompt context from stored turns (newest first): summary plus recent turns within ``token_budget``."""
+    if not turns:
+        return ''
+
+    max_chars = token_budget * CHARS_PER_TOKEN
+    window = []
+    used = 0
+    for turn in turns:
+        speaker = 'User' if turn['sender'] == 'user' else 'Assistant'
+        line = f"{speaker}: {turn['message']}"[:max_chars]
+        cost = estimate_tokens(line)
+        if used + cost > token_budget:
+            break
+        window.append(line)
+        used += cost
+
+    parts = []
+    summary = latest_summary(turns)
+    if summary.get('details'):
+        details = '; '.join(f"{key}: {', '.join(value) if isinstance(value, list) else value}"
+                            for key, value in summary['details'].items())
+        parts.append(f"Known so far (last intent: {summary.get('last_intent', 'other')}): {details}")
+    if window:
+        parts.append('Recent messages, oldest first:\n' + '\n'.join(reversed(window)))
+    return '\n'.join(parts)
+
+
+def exchange_turns(message: str, received_at: datetime, result: Dict, response_data: Dict,
+                   previous_summary: Dict) -> List[Dict]:
+    """The user and agent turns to store for one chat exchange."""
+    return [
+        {'sender': 'user', 'message': message, 'intent': None, 'metadata': {}, 'created_at': received_at},
+        {
+            'sender': 'agent',
+            'message': response_data.get('reply', ''),
+            'intent': result.get('intent', 'other'),
+            'metadata': {'summary': next_summary(previous_summary, result, response_data)},
+            'created_at': datetime.now(timezone.utc)
+        }
+    ]
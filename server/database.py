@@ -27,18 +27,229 @@ def init_database():
                 );
             """)
             
+            # Time range column kept in sync by Postgres (also added to existing tables)
+            cursor.execute("""
+                ALTER TABLE appointments ADD COLUMN IF NOT EXISTS time_range TSTZRANGE
+                GENERATED ALWAYS AS (tstzrange(start_time, end_time, '[)')) STORED;
+            """)
+            
+            # Reject overlapping scheduled appointments atomically; the GiST index
+            # behind the constraint also serves overlap lookups
+            cursor.execute("""
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (
+                        SELECT 1 FROM pg_constraint WHERE conname = 'appointments_no_overlap'
+                    ) THEN
+                        ALTER TABLE appointments ADD CONSTRAINT appointments_no_overlap
+                        EXCLUDE USING gist (time_range WITH &&) WHERE (status = 'scheduled');
+                    END IF;
+                END $$;
+            """)
+            
             # Create index on start_time for better query performance
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_appointments_start_time 
                 ON appointments(start_time);
             """)
             
+            # Keyset pagination over scheduled appointments orders by (start_time, id)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_appointments_scheduled_start_id
+                ON appointments(start_time, id) WHERE status = 'scheduled';
+            """)
+            
             # Create index on status
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_appointments_status 
                 ON appointments(status);
             """)
             
+            # Change version: the sum of a small striped counter table that every write
+            # to appointments bumps; lets GET handlers answer conditional requests without
+            # running their query. Unlike a sequence the counter is MVCC, so a reader
+            # only sees a new version once the rows behind it are committed and visible.
+            # Each transaction bumps one shard once, picked by its id, so concurrent
+            # writers rarely wait on the same row
+            cursor.execute("""
+                DROP TABLE IF EXISTS appointment_changes;
+                DROP SEQUENCE IF EXISTS appointment_version_seq;
+                CREATE TABLE IF NOT EXISTS appointment_versions (
+                    shard INTEGER PRIMARY KEY,
+                    n BIGINT NOT NULL DEFAULT 0
+                );
+                INSERT INTO appointment_versions (shard)
+                SELECT generate_series(0, 15)
+                ON CONFLICT (shard) DO NOTHING;
+                
+                CREATE OR REPLACE FUNCTION bump_appointment_version() RETURNS trigger AS $$
+                BEGIN
+                    IF current_setting('scheduler.version_bumped', true) IS DISTINCT FROM 'on' THEN
+                        UPDATE appointment_versions SET n = n + 1 WHERE shard = txid_current() % 16;
+                        PERFORM set_config('scheduler.version_bumped', 'on', true);
+                    END IF;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql;
+            """)
+            
+            # The bump is deferred to commit so the shard's row lock is held only
+            # while committing, not for the whole writing transaction
+            cursor.execute("""
+                DROP TRIGGER IF EXISTS appointments_version ON appointments;
+                CREATE CONSTRAINT TRIGGER appointments_version
+                AFTER INSERT OR UPDATE OR DELETE ON appointments
+                DEFERRABLE INITIALLY DEFERRED
+                FOR EACH ROW EXECUTE FUNCTION bump_appointment_version();
+                
+                DROP TRIGGER IF EXISTS appointments_version_truncate ON appointments;
+                CREATE TRIGGER appointments_version_truncate
+                AFTER TRUNCATE ON appointments
+                FOR EACH STATEMENT EXECUTE FUNCTION bump_appointment_version();
+            """)
+            
+            # Busy bitmap per UTC day: bit i is set when a scheduled appointment
+            # overlaps the i-th 5-minute cell (see busy_bitmap.py)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS busy_bitmaps (
+                    day DATE PRIMARY KEY,
+                    bits BYTEA NOT NULL
+                );
+            """)
+            
+            # Recompute one day from the appointments overlapping it. The day's row is
+            # locked first, so concurrent writers to the same day take turns and each
+            # sees the others' committed appointments
+            cursor.execute("""
+                CREATE OR REPLACE FUNCTION rebuild_busy_bitmap(target DATE) RETURNS void AS $$
+                DECLARE
+                    day_start TIMESTAMPTZ := target::timestamp AT TIME ZONE 'UTC';
+                    busy BYTEA := decode(repeat('00', 36), 'hex');
+                    apt RECORD;
+                BEGIN
+                    INSERT INTO busy_bitmaps (day, bits) VALUES (target, busy) ON CONFLICT DO NOTHING;
+                    PERFORM 1 FROM busy_bitmaps WHERE day = target FOR UPDATE;
+                
+                    FOR apt IN
+                        SELECT start_time, end_time FROM appointments
+                        WHERE status = 'scheduled'
+                        AND time_range && tstzrange(day_start, day_start + interval '1 day', '[)')
+                    LOOP
+                        FOR cell IN
+                            greatest(floor(extract(epoch FROM apt.start_time - day_start) / 300)::int, 0) ..
+                            least(ceil(extract(epoch FROM apt.end_time - day_start) / 300)::int, 288) - 1
+                        LOOP
+                            busy := set_bit(busy, cell, 1);
+                        END LOOP;
+                    END LOOP;
+                
+                    UPDATE busy_bitmaps SET bits = busy WHERE day = target;
+                END;
+                $$ LANGUAGE plpgsql;
+                
+                CREATE OR REPLACE FUNCTION rebuild_all_busy_bitmaps() RETURNS integer AS $$
+                DECLARE
+                    target DATE;
+                    rebuilt integer := 0;
+                BEGIN
+                    DELETE FROM busy_bitmaps;
+                    FOR target IN
+                        SELECT DISTINCT generate_series(
+                            (start_time AT TIME ZONE 'UTC')::date,
+                            ((end_time - interval '1 microsecond') AT TIME ZONE 'UTC')::date,
+                            interval '1 day')::date AS day
+                        FROM appointments WHERE status = 'scheduled' AND end_time > start_time
+                        ORDER BY day
+                    LOOP
+                        PERFORM rebuild_busy_bitmap(target);
+                        rebuilt := rebuilt + 1;
+                    END LOOP;
+                    RETURN rebuilt;
+                END;
+                $$ LANGUAGE plpgsql;
+            """)
+            
+            # Statement-level triggers recompute each touched day once per statement,
+            # in date order so multi-day writes lock days consistently
+            cursor.execute("""
+                CREATE OR REPLACE FUNCTION refresh_busy_bitmaps() RETURNS trigger AS $$
+                BEGIN
+                    PERFORM rebuild_busy_bitmap(day) FROM (
+                        SELECT DISTINCT generate_series(
+                            (start_time AT TIME ZONE 'UTC')::date,
+                            ((end_time - interval '1 microsecond') AT TIME ZONE 'UTC')::date,
+                            interval '1 day')::date AS day
+                        FROM changed_rows WHERE end_time > start_time
+                        ORDER BY day
+                    ) days;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql;
+                
+                CREATE OR REPLACE FUNCTION refresh_busy_bitmaps_on_update() RETURNS trigger AS $$
+                BEGIN
+                    -- Only rows whose times or status changed affect any bitmap
+                    PERFORM rebuild_busy_bitmap(day) FROM (
+                        SELECT DISTINCT generate_series(
+                            (start_time AT TIME ZONE 'UTC')::date,
+                            ((end_time - interval '1 microsecond') AT TIME ZONE 'UTC')::date,
+                            interval '1 day')::date AS day
+                        FROM (
+                            SELECT old_rows.start_time, old_rows.end_time
+                            FROM old_rows JOIN new_rows USING (id)
+                            WHERE (old_rows.start_time, old_rows.end_time, old_rows.status)
+                                IS DISTINCT FROM (new_rows.start_time, new_rows.end_time, new_rows.status)
+                            UNION ALL
+                            SELECT new_rows.start_time, new_rows.end_time
+                            FROM old_rows JOIN new_rows USING (id)
+                            WHERE (old_rows.start_time, old_rows.end_time, old_rows.status)
+                                IS DISTINCT FROM (new_rows.start_time, new_rows.end_time, new_rows.status)
+                        ) changed_rows
+                        WHERE end_time > start_time
+                        ORDER BY day
+                    ) days;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql;
+                
+                CREATE OR REPLACE FUNCTION clear_busy_bitmaps() RETURNS trigger AS $$
+                BEGIN
+                    DELETE FROM busy_bitmaps;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql;
+                
+                DROP TRIGGER IF EXISTS appointments_bitmaps_insert ON appointments;
+                CREATE TRIGGER appointments_bitmaps_insert
+                AFTER INSERT ON appointments REFERENCING NEW TABLE AS changed_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION refresh_busy_bitmaps();
+                
+                DROP TRIGGER IF EXISTS appointments_bitmaps_update ON appointments;
+                CREATE TRIGGER appointments_bitmaps_update
+                AFTER UPDATE ON appointments REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION refresh_busy_bitmaps_on_update();
+                
+                DROP TRIGGER IF EXISTS appointments_bitmaps_delete ON appointments;
+                CREATE TRIGGER appointments_bitmaps_delete
+                AFTER DELETE ON appointments REFERENCING OLD TABLE AS changed_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION refresh_busy_bitmaps();
+                
+                DROP TRIGGER IF EXISTS appointments_bitmaps_truncate ON appointments;
+                CREATE TRIGGER appointments_bitmaps_truncate
+                AFTER TRUNCATE ON appointments
+                FOR EACH STATEMENT EXECUTE FUNCTION clear_busy_bitmaps();
+            """)
+            
+            # Existing databases get their bitmaps built once
+            cursor.execute("""
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (SELECT 1 FROM busy_bitmaps) THEN
+                        PERFORM rebuild_all_busy_bitmaps();
+                    END IF;
+                END $$;
+            """)
+            
             # Create users table (for future user management)
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS users (
@@ -65,6 +276,12 @@ def init_database():
                 );
             """)
             
+            # Chat context reads a session's newest turns
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_conversation_history_user_created
+                ON conversation_history(user_id, created_at);
+            """)
+            
             # Create appointment_participants table for many-to-many relationship
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS appointment_participants (
@@ -77,6 +294,107 @@ def init_database():
                 );
             """)
             
+            # Common-availability search looks participants up by email
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_appointment_participants_email
+                ON appointment_participants(email, appointment_id);
+                
+                CREATE INDEX IF NOT EXISTS idx_appointment_participants_appointment
+                ON appointment_participants(appointment_id);
+            """)
+            
+            # Participants mirror each appointment's attendees (trimmed and lower-cased,
+            # as models.participant_keys); deletes cascade from appointments
+            cursor.execute("""
+                CREATE OR REPLACE FUNCTION insert_appointment_participants() RETURNS trigger AS $$
+                BEGIN
+                    INSERT INTO appointment_participants (appointment_id, email)
+                    SELECT DISTINCT changed_rows.id, lower(trim(attendee))
+                    FROM changed_rows, jsonb_array_elements_text(
+                        CASE WHEN jsonb_typeof(changed_rows.attendees) = 'array'
+                             THEN changed_rows.attendees ELSE '[]'::jsonb END) AS attendee
+                    WHERE trim(attendee) <> '';
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql;
+                
+                CREATE OR REPLACE FUNCTION update_appointment_participants() RETURNS trigger AS $$
+                BEGIN
+                    -- Only rows whose attendees changed are resynced
+                    DELETE FROM appointment_participants
+                    WHERE appointment_id IN (
+                        SELECT id FROM old_rows JOIN new_rows USING (id)
+                        WHERE old_rows.attendees IS DISTINCT FROM new_rows.attendees
+                    );
+                    INSERT INTO appointment_participants (appointment_id, email)
+                    SELECT DISTINCT new_rows.id, lower(trim(attendee))
+                    FROM old_rows JOIN new_rows USING (id), jsonb_array_elements_text(
+                        CASE WHEN jsonb_typeof(new_rows.attendees) = 'array'
+                             THEN new_rows.attendees ELSE '[]'::jsonb END) AS attendee
+                    WHERE old_rows.attendees IS DISTINCT FROM new_rows.attendees
+                    AND trim(attendee) <> '';
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql;
+                
+                DROP TRIGGER IF EXISTS appointments_participants_insert ON appointments;
+                CREATE TRIGGER appointments_participants_insert
+                AFTER INSERT ON appointments REFERENCING NEW TABLE AS changed_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION insert_appointment_participants();
+                
+                DROP TRIGGER IF EXISTS appointments_participants_update ON appointments;
+                CREATE TRIGGER appointments_participants_update
+                AFTER UPDATE ON appointments REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION update_appointment_participants();
+            """)
+            
+            # Databases created before participants were tracked get them once
+            cursor.execute("""
+                INSERT INTO appointment_participants (appointment_id, email)
+                SELECT DISTINCT appointments.id, lower(trim(attendee))
+                FROM appointments, jsonb_array_elements_text(
+                    CASE WHEN jsonb_typeof(appointments.attendees) = 'array'
+                         THEN appointments.attendees ELSE '[]'::jsonb END) AS attendee
+                WHERE trim(attendee) <> ''
+                AND NOT EXISTS (SELECT 1 FROM appointment_participants);
+            """)
+            
+            # Recurring series are stored once; occurrences are expanded on read (see
+            # recurrence.py). until is the start of the last occurrence, NULL if the
+            # series never ends. Writes bump the same change version as appointments
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS recurring_appointments (
+                    id VARCHAR(36) PRIMARY KEY,
+                    title VARCHAR(255) NOT NULL,
+                    description TEXT,
+                    start_time TIMESTAMP WITH TIME ZONE NOT NULL,
+                    end_time TIMESTAMP WITH TIME ZONE NOT NULL,
+                    rrule TEXT NOT NULL,
+                    time_zone VARCHAR(64) NOT NULL,
+                    exdates JSONB DEFAULT '[]',
+                    until TIMESTAMP WITH TIME ZONE,
+                    attendees JSONB DEFAULT '[]',
+                    location VARCHAR(255),
+                    status VARCHAR(20) DEFAULT 'active',
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                );
+                
+                CREATE INDEX IF NOT EXISTS idx_recurring_appointments_active_start
+                ON recurring_appointments(start_time) WHERE status = 'active';
+                
+                DROP TRIGGER IF EXISTS recurring_appointments_version ON recurring_appointments;
+                CREATE CONSTRAINT TRIGGER recurring_appointments_version
+                AFTER INSERT OR UPDATE OR DELETE ON recurring_appointments
+                DEFERRABLE INITIALLY DEFERRED
+                FOR EACH ROW EXECUTE FUNCTION bump_appointment_version();
+                
+                DROP TRIGGER IF EXISTS recurring_appointments_version_truncate ON recurring_appointments;
+                CREATE TRIGGER recurring_appointments_version_truncate
+                AFTER TRUNCATE ON recurring_appointments
+                FOR EACH STATEMENT EXECUTE FUNCTION bump_appointment_version();
+            """)
+            
             conn.commit()
             print("✅ Database initialized successfully!")
             
@@ -0,0 +1,187 @@
+"""Deterministic parser for simple scheduling commands.
+
+Recognizes a small grammar of common requests ("list my appointments",
+"am I free Friday?", "schedule a sync with Ann tomorrow at 2pm for 30
+minutes") and produces the same structure as the Gemini intent response.
+Anything that does not match the grammar completely returns ``None`` and
+should be sent to the LLM.
+"""
+import re
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+_DAY = (r'(?:today|tomorrow|(?:next |this )?(?:' + '|'.join(WEEKDAYS) + r')'
+        r'|\d{4}-\d{2}-\d{2})')
+_TIME = r'(?:noon|midnight|\d{1,2}(?::\d{2})?\s*(?:am|pm)|\d{1,2}:\d{2})'
+_DURATION = r'(?P<amount>\d+(?:\.\d+)?|an|a|one|half an?)\s*(?P<unit>minutes?|mins?|hours?|hrs?|h)'
+
+_PERIOD = r'(?P<period>next week|this week|today|tomorrow|upcoming|coming up)'
+
+LIST_PATTERNS = [
+    re.compile(r"^(?:please )?(?:list|show|show me|get|display) (?:all )?(?:of )?my "
+               r"(?:appointments|meetings|calendar|schedule)(?: (?:for )?(?:the )?" + _PERIOD + r")?$",
+               re.IGNORECASE),
+    re.compile(r"^what(?:'s| is) (?:on )?my (?:calendar|schedule|agenda)"
+               r"(?: (?:for |look like )?(?:the )?" + _PERIOD + r")?$", re.IGNORECASE),
+    re.compile(r"^(?:what|which) (?:appointments|meetings) do i have"
+               r"(?: (?:for |on )?(?:the )?" + _PERIOD + r")?$", re.IGNORECASE),
+]
+
+AVAILABILITY_PATTERNS = [
+    re.compile(r'^am i (?:free|available) (?:on )?(?P<day>' + _DAY + r')'
+               r'(?: at (?P<time>' + _TIME + r'))?(?: for ' + _DURATION + r')?$', re.IGNORECASE),
+    re.compile(r'^(?:what(?:\'s| is) my availability|when am i free|'
+               r'(?:do i have )?any (?:free|open) (?:slots|time)) (?:on |for )?(?P<day>' + _DAY + r')$', re.IGNORECASE),
+]
+
+SCHEDULE_PATTERN = re.compile(
+    r'^(?:please )?(?:schedule|book|set up|add|create) (?:an? |my )?(?P<title>.+?)'
+    r'(?: with (?P<with>[\w@.\- ]+?(?: and [\w@.\-]+)*))?'
+    r' (?:on )?(?P<day>' + _DAY + r') at (?P<time>' + _TIME + r')'
+    r'(?: for ' + _DURATION + r')?$',
+    re.IGNORECASE
+)
+
+
+def _normalize(message: str) -> str:
+    # Case is kept so titles and names survive; patterns match case-insensitively
+    normalized = re.sub(r'\s+', ' ', message.strip())
+    return normalized.rstrip('.!?')
+
+
+def parse_day(text: str, today: date) -> Optional[date]:
+    text = text.lower()
+    if text == 'today':
+        return today
+    if text == 'tomorrow':
+        return today + timedelta(days=1)
+    if re.fullmatch(r'\d{4}-\d{2}-\d{2}', text):
+        try:
+            return date.fromisoformat(text)
+        except ValueError:
+            return None
+
+    qualifier, _, name = text.rpartition(' ')
+    weekday = WEEKDAYS.index(name)
+    days_ahead = (weekday - today.weekday()) % 7
+    if qualifier == 'next':
+        # "next friday" always means the following week's occurrence
+        days_ahead = days_ahead + 7 if days_ahead else 7
+    return today + timedelta(days=days_ahead)
+
+
+def parse_time(text: str) -> Optional[str]:
+    """Return the time as HH:MM (24h)."""
+    text = text.replace(' ', '').lower()
+    if text == 'noon':
+        return '12:00'
+    if text == 'midnight':
+        return '00:00'
+
+    match = re.fullmatch(r'(\d{1,2})(?::(\d{2}))?(am|pm)?', text)
+    if not match:
+        return None
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        if not 1 <= hour <= 12:
+            return None
+        hour = hour % 12 + (12 if meridiem == 'pm' else 0)
+    if hour > 23 or minute > 59:
+        return None
+    return f"{hour:02d}:{minute:02d}"
+
+
+def parse_duration(amount: Optional[str], unit: Optional[str]) -> Optional[int]:
+    """Duration in minutes, defaulting to 60; None if it is under a minute."""
+    if not amount:
+        return 60
+    amount, unit = amount.lower(), unit.lower()
+    if amount.startswith('half'):
+        value = 0.5
+    elif amount in ('a', 'an', 'one'):
+        value = 1
+    else:
+        value = float(amount)
+    if unit.startswith('h'):
+        value *= 60
+    return int(value) if value >= 1 else None
+
+
+def _split_attendees(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    names = re.split(r',\s*|\s+and\s+', text)
+    return [name.strip() for name in names if name.strip()]
+
+
+def _response(intent: str, reply: str, extracted_info: Dict, action: str) -> Dict:
+    return {
+        'intent': intent,
+        'reply': reply,
+        'extracted_info': extracted_info,
+        'action_needed': action,
+        'requires_confirmation': False,
+    }
+
+
+def parse_intent(message: str, today: date) -> Optional[Dict]:
+    """Parse ``message`` if it fully matches a known command, else return ``None``."""
+    text = _normalize(message)
+
+    for pattern in LIST_PATTERNS:
+        match = pattern.match(text)
+        if not match:
+            continue
+        # A single day lists just that day; anything else means the next 7 days
+        period = (match.group('period') or '').lower()
+        extracted_info = {'date': parse_day(period, today).isoformat()} if period in ('today', 'tomorrow') else {}
+        return _response('list_appointments', "Here's what's on your calendar.",
+                         extracted_info, 'list_appointments')
+
+    for pattern in AVAILABILITY_PATTERNS:
+        match = pattern.match(text)
+        if not match:
+            continue
+        day = parse_day(match.group('day'), today)
+        if day is None:
+            return None
+        extracted_info = {'date': day.isoformat()}
+        groups = match.groupdict()
+        if groups.get('time'):
+            time = parse_time(groups['time'])
+            if time is None:
+                return None
+            extracted_info['time'] = time
+        duration = parse_duration(groups.get('amount'), groups.get('unit'))
+        if duration is None:
+            return None
+        extracted_info['duration'] = duration
+        return _response('check_availability', "Let me check your availability.",
+                         extracted_info, 'check_availability')
+
+    match = SCHEDULE_PATTERN.match(text)
+    if match:
+        day = parse_day(match.group('day'), today)
+        time = parse_time(match.group('time'))
+        duration = parse_duration(match.group('amount'), match.group('unit'))
+        if day is None or time is None or duration is None:
+            return None
+        title = match.group('title').strip()
+        attendees = _split_attendees(match.group('with'))
+        if title.lower() in ('meeting', 'appointment', 'call'):
+            title = title.capitalize()
+            if attendees:
+                title = f"{title} with {', '.join(attendees)}"
+        extracted_info = {
+            'title': title,
+            'date': day.isoformat(),
+            'time': time,
+            'duration': duration,
+            'attendees': attendees,
+            'location': '',
+        }
+        return _response('schedule', f"Scheduling {title} for you.", extracted_info, 'schedule')
+
+    return None
@@ -0,0 +1,165 @@
+"""The intent response expected from the LLM, and tolerant parsing of it.
+
+``INTENT_SCHEMA`` is handed to the model's structured-output (JSON) mode
+where the provider supports it, and ``PROMPT_TEMPLATE`` is built once at
+import. Replies are still parsed defensively: bare JSON, JSON inside a
+markdown fence and JSON surrounded by prose are all accepted, and the
+object is checked against the schema (and normalized) before it is used
+or cached.
+"""
+import json
+import re
+from typing import Dict, Tuple
+
+INTENTS = ('schedule', 'check_availability', 'list_appointments', 'update', 'cancel', 'other')
+
+INFO_FIELDS = ('title', 'date', 'time', 'duration', 'location')
+
+INTENT_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'intent': {'type': 'string', 'enum': list(INTENTS)},
+        'reply': {'type': 'string'},
+        'extracted_info': {
+            'type': 'object',
+            'properties': {
+                'title': {'type': 'string'},
+                'date': {'type': 'string', 'description': 'YYYY-MM-DD'},
+                'time': {'type': 'string', 'description': 'HH:MM, 24-hour'},
+                'duration': {'type': 'string', 'description': 'minutes'},
+                'attendees': {'type': 'array', 'items': {'type': 'string'}},
+                'location': {'type': 'string'}
+            }
+        },
+        'action_needed': {'type': 'string'},
+        'requires_confirmation': {'type': 'boolean'}
+    },
+    'required': ['intent', 'reply']
+}
+
+PROMPT_TEMPLATE = (
+    "You are an appointment scheduling assistant. Extract the scheduling intent from the user's message.\n"
+    "Today's date is {today}.\n"
+    "{context}"
+    'User message: "{message}"\n'
+    "Respond with one JSON object: intent (" + '|'.join(INTENTS) + "), reply (a short, friendly "
+    "answer to the user; ask for anything missing), extracted_info (only what the message gives: "
+    "title, date as YYYY-MM-DD, time as HH:MM, duration in minutes, attendees, location), "
+    "action_needed, requires_confirmation.\n"
+    'Examples: "Schedule a meeting with John tomorrow at 2 PM" -> schedule; '
+    '"Am I free Friday at 3 PM?" -> check_availability; '
+    '"What\'s on my calendar next week?" -> list_appointments; '
+    '"Cancel my 10 AM meeting" -> cancel.'
+)
+
+_FENCE = re.compile(r'```(?:json)?\s*(.*?)```', re.DOTALL | re.IGNORECASE)
+_decoder = json.JSONDecoder()
+
+
+class IntentParseError(ValueError):
+    """The response held no usable intent; ``reason`` is 'invalid_json' or 'schema'."""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+CONTEXT_TEMPLATE = ("Conversation so far (use it to resolve references such as \"it\", \"that meeting\" "
+                    "or \"instead\"):\n{context}\n")
+
+
+def build_prompt(message: str, today: str, context: str = '') -> str:
+    context = CONTEXT_TEMPLATE.format(context=context) if context else ''
+    return PROMPT_TEMPLATE.format(today=today, context=context, message=message)
+
+
+def extract_json(text: str) -> Tuple[object, bool]:
+    """The JSON value in ``text`` and whether it had to be dug out of surrounding text."""
+    text = text.strip()
+    try:
+        return json.loads(text), False
+    except ValueError:
+        pass
+
+    for fenced in _FENCE.findall(text):
+        try:
+            return json.loads(fenced.strip()), True
+        except ValueError:
+            pass
+
+    # Otherwise the first object in the text that has an intent, or failing that any object
+    found = None
+    start = text.find('{')
+    while start >= 0:
+        try:
+            value, end = _decoder.raw_decode(text, start)
+        except ValueError:
+            start = text.find('{', start + 1)
+            continue
+        if isinstance(value, dict):
+            if 'intent' in value:
+                return value, True
+            if found is None:
+                found = value
+        start = text.find('{', end)
+
+    if found is None:
+        raise IntentParseError('invalid_json', 'No JSON object in response')
+    return found, True
+
+
+def validate_intent(value: object) -> Dict:
+    """Check ``value`` against ``INTENT_SCHEMA`` and return it normalized."""
+    if not isinstance(value, dict):
+        raise IntentParseError('schema', 'Response is not a JSON object')
+
+    intent = value.get('intent')
+    if not isinstance(intent, str) or intent.strip().lower() not in INTENTS:
+        raise IntentParseError('schema', f"Unknown intent: {intent!r}")
+    intent = intent.strip().lower()
+
+    reply = value.get('reply')
+    if not isinstance(reply, str) or not reply.strip():
+        raise IntentParseError('schema', 'Missing reply')
+
+    info = value.get('extracted_info') or {}
+    if not isinstance(info, dict):
+        raise IntentParseError('schema', 'extracted_info is not an object')
+
+    # Drop empty placeholders so "key in extracted_info" means the user gave it
+    extracted_info = {}
+    for field in INFO_FIELDS:
+        field_value = info.get(field)
+        if isinstance(field_value, (int, float)) and not isinstance(field_value, bool):
+            field_value = str(field_value)
+        if isinstance(field_value, str) and field_value.strip():
+            extracted_info[field] = field_value.strip()
+    attendees = info.get('attendees')
+    if isinstance(attendees, str):
+        attendees = [attendees]
+    if isinstance(attendees, list):
+        attendees = [attendee.strip() for attendee in attendees if isinstance(attendee, str) and attendee.strip()]
+        if attendees:
+            extracted_info['attendees'] = attendees
+
+    action_needed = value.get('action_needed')
+    requires_confirmation = value.get('requires_confirmation', False)
+    if isinstance(requires_confirmation, str):
+        requires_confirmation = requires_confirmation.strip().lower() == 'true'
+
+    return {
+        'intent': intent,
+        'reply': reply,
+        'extracted_info': extracted_info,
+        'action_needed': action_needed if isinstance(action_needed, str) and action_needed else intent,
+        'requires_confirmation': bool(requires_confirmation)
+    }
+
+
+def parse_intent_response(text: str) -> Tuple[Dict, str]:
+    """Validated intent from a model response, with outcome 'ok' or 'repaired'.
+
+    Raises ``IntentParseError`` if the response can't be used.
+    """
+    value, repaired = extract_json(text)
+    return validate_intent(value), 'repaired' if repaired else 'ok'
@@ -0,0 +1,175 @@
+"""LLM providers behind GeminiAIService.
+
+A provider turns the intent-extraction prompt into response text, whole or
+as a stream of chunks.
+
+- ``GeminiProvider``: Google Gemini, the production provider
+- ``LocalProvider``: a deterministic stand-in with no network access. It
+  answers every prompt with a well-formed intent for the quoted message
+  after a configurable latency, and can fail a share of calls, so the chat
+  pipeline can be run offline and benchmarked apart from the LLM.
+"""
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from typing import Dict, Iterator, List, Optional
+
+import google.generativeai as genai
+
+
+class LLMError(Exception):
+    """Raised when a provider cannot produce a response."""
+
+
+class LLMProvider:
+    name = ''
+
+    def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        return {'provider': self.name}
+
+
+class GeminiProvider(LLMProvider):
+    """Gemini, in structured-output (JSON) mode when ``response_schema`` is given.
+
+    Models without JSON mode reject the request; the provider then drops back
+    to prompt-only JSON for the rest of the process.
+    """
+
+    name = 'gemini'
+
+    def __init__(self, api_key: Optional[str], model_name: str = 'gemini-1.5-flash',
+                 response_schema: Optional[Dict] = None):
+        self.model_name = model_name
+        self.json_mode = response_schema is not None
+        self.model = None
+        if api_key:
+            genai.configure(api_key=api_key)
+            generation_config = None
+            if self.json_mode:
+                generation_config = {'response_mime_type': 'application/json', 'response_schema': response_schema}
+            self.model = genai.GenerativeModel(model_name, generation_config=generation_config)
+
+    def _model(self):
+        if self.model is None:
+            raise LLMError('GEMINI_API_KEY is not set')
+        return self.model
+
+    def _json_mode_rejected(self, error: Exception) -> bool:
+        """Switch JSON mode off if ``error`` is the model refusing it."""
+        message = str(error)
+        if not self.json_mode or not any(term in message for term in ('response_mime_type', 'response_schema',
+                                                                      'JSON mode')):
+            return False
+        print(f"{self.model_name} does not support JSON mode ({error}); using prompt-only JSON")
+        self.json_mode = False
+        self.model = genai.GenerativeModel(self.model_name)
+        return True
+
+    def generate(self, prompt: str) -> str:
+        try:
+            return self._model().generate_content(prompt).text
+        except Exception as e:
+            if not self._json_mode_rejected(e):
+                raise
+            return self._model().generate_content(prompt).text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        try:
+            response = self._model().generate_content(prompt, stream=True)
+        except Exception as e:
+            if not self._json_mode_rejected(e):
+                raise
+            response = self._model().generate_content(prompt, stream=True)
+        for chunk in response:
+            yield chunk.text
+
+    def stats(self) -> Dict:
+        return {'provider': self.name, 'model': self.model_name, 'configured': self.model is not None,
+                'json_mode': self.json_mode}
+
+
+class LocalProvider(LLMProvider):
+    """Deterministic replies after ``latency`` (+ up to ``jitter``) seconds.
+
+    The reply depends only on the user message and the reference date: a
+    ``check_availability`` intent for a day 0-27 days after ``base_date``
+    (default: the prompt's "today"). ``error_rate`` of calls raise
+    ``LLMError`` instead; jitter and failures come from a generator seeded
+    with ``seed``, so a run can be repeated. Streams return the reply in
+    ``chunk_size`` character pieces spread over the latency.
+    """
+
+    name = 'local'
+
+    MESSAGE = re.compile(r'User message: "(.*)"')
+    TODAY = re.compile(r"Today's date is (\d{4}-\d{2}-\d{2})")
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 seed: int = 0, chunk_size: int = 40, base_date: Optional[date] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.chunk_size = max(chunk_size, 1)
+        self.base_date = base_date
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    def reply(self, prompt: str) -> str:
+        match = self.MESSAGE.search(prompt)
+        message = match.group(1) if match else ''
+        base_date = self.base_date
+        if base_date is None:
+            today = self.TODAY.search(prompt)
+            base_date = date.fromisoformat(today.group(1)) if today else date.today()
+
+        day = base_date + timedelta(days=zlib.crc32(message.encode()) % 28)
+        return json.dumps({
+            'intent': 'check_availability',
+            'reply': f"Let me check {day:%A, %B %d} for you.",
+            'extracted_info': {'date': day.isoformat(), 'duration': '30'},
+            'action_needed': 'check_availability',
+            'requires_confirmation': False
+        })
+
+    def _draw(self) -> float:
+        """Count the call, raise if it was picked to fail, and return its latency."""
+        with self._lock:
+            self.calls += 1
+            failed = self.error_rate > 0 and self._random.random() < self.error_rate
+            if failed:
+                self.failures += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if failed:
+            raise LLMError('Injected local provider failure')
+        return delay
+
+    def _chunks(self, text: str) -> List[str]:
+        return [text[start:start + self.chunk_size] for start in range(0, len(text), self.chunk_size)]
+
+    def generate(self, prompt: str) -> str:
+        time.sleep(self._draw())
+        return self.reply(prompt)
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        delay = self._draw()
+        chunks = self._chunks(self.reply(prompt))
+        for chunk in chunks:
+            time.sleep(delay / len(chunks))
+            yield chunk
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'provider': self.name, 'latency_ms': self.latency * 1000, 'jitter_ms': self.jitter * 1000,
+                    'error_rate': self.error_rate, 'calls': self.calls, 'failures': self.failures}
@@ -1,247 +1,1078 @@
 import os
-import json
+import hashlib
+import re
+import copy
+import time
 import uuid
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+import heapq
+import threading
+from contextlib import contextmanager, nullcontext
+from functools import partial, wraps
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-from flask import Flask, request, jsonify, g
+from flask import Flask, Response, request, jsonify, g, has_app_context, make_response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import psycopg2
 from psycopg2.extras import RealDictCursor
-import google.generativeai as genai
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from appointment_cache import AppointmentCache
+from availability import (DEFAULT_GRANULARITY, free_slots, free_slots_by_day, in_zone, local_days,
+                          merge_intervals, merge_sorted_intervals, working_hours)
+from bulk_import import BulkImport, parse_ndjson
+from busy_bitmap import cell_aligned, free_slots_by_day_from_bits, free_slots_from_bits, overlay, utc_date
+from cache import TTLCache
+from conversation import build_context, exchange_turns, latest_summary, session_id_from
+from conditional import apply_validators, not_modified, version_etag
+from intent_parser import parse_intent
+from intent_schema import INTENT_SCHEMA, IntentParseError, build_prompt, parse_intent_response
+from metrics import (COALESCED_CALLS, CONTENT_TYPE, DB_POOL_CONNECTIONS, DB_QUERY_ERRORS, DB_QUERY_LATENCY, INTENT_RESOLUTIONS,
+                     LLM_ERRORS, LLM_FIRST_CHUNK, LLM_LATENCY, LLM_RESPONSE_PARSE, REQUEST_LATENCY, REQUESTS_IN_FLIGHT,
+                     registry, statement_type)
+from models import Appointment, RecurringAppointment, json_default, participant_keys
+from pagination import decode_cursor, encode_cursor, ndjson_line, page_size
+from pool import ConnectionPool
+from profiling import PROFILE_HEADER, RequestProfiler
+from recurrence import (RecurrenceError, by_participant, clash_window_end, expand, first_overlap, list_window, listed,
+                        merge_listed, occurrences, offset_name, resolve_time_zone, series_end, series_until, sort_key)
+from singleflight import SingleFlight
+from storage import AppointmentConflict, AppointmentStorage, MemoryStorage, PostgresStorage, SQLiteStorage
+from llm import GeminiProvider, LLMProvider, LocalProvider
+from streaming import ReplyExtractor, sse_event
+
+class AppointmentJSONProvider(DefaultJSONProvider):
+    # Appointments and datetimes are rendered by the shared models.json_default hook
+    default = staticmethod(json_default)
+    sort_keys = False
+
 app = Flask(__name__)
+app.json = AppointmentJSONProvider(app)
 CORS(app)
 
 # Configuration
 DATABASE_URL = os.environ.get('DATABASE_URL', 'postgresql://localhost/scheduler_db')
 GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+GEMINI_MODEL = os.environ.get('GEMINI_MODEL', 'gemini-1.5-flash')
+GEMINI_JSON_MODE = os.environ.get('GEMINI_JSON_MODE', 'true').lower() in ('1', 'true', 'yes')
+LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'gemini').lower()
+LOCAL_LLM_LATENCY_MS = float(os.environ.get('LOCAL_LLM_LATENCY_MS', 0))
+LOCAL_LLM_JITTER_MS = float(os.environ.get('LOCAL_LLM_JITTER_MS', 0))
+LOCAL_LLM_ERROR_RATE = float(os.environ.get('LOCAL_LLM_ERROR_RATE', 0))
+LOCAL_LLM_SEED = int(os.environ.get('LOCAL_LLM_SEED', 0))
 GOOGLE_CALENDAR_CREDENTIALS = os.environ.get('GOOGLE_CALENDAR_CREDENTIALS')
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'postgres').lower()
+SQLITE_PATH = os.environ.get('SQLITE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scheduler.db'))
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_QUERY_STATS = os.environ.get('DB_QUERY_STATS', '').lower() in ('1', 'true', 'yes')
+DB_QUERY_WARN_THRESHOLD = int(os.environ.get('DB_QUERY_WARN_THRESHOLD', 10))
+MAX_AVAILABILITY_RANGE_DAYS = int(os.environ.get('MAX_AVAILABILITY_RANGE_DAYS', 62))
+MAX_COMMON_PARTICIPANTS = int(os.environ.get('MAX_COMMON_PARTICIPANTS', 50))
+RECURRENCE_HORIZON_DAYS = int(os.environ.get('RECURRENCE_HORIZON_DAYS', 90))
+# Stands in for "no end" in range queries
+FAR_FUTURE = datetime(9999, 1, 1, tzinfo=timezone.utc)
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+APPOINTMENT_CACHE_SIZE = int(os.environ.get('APPOINTMENT_CACHE_SIZE', 2048))
+APPOINTMENT_CACHE_DAYS = int(os.environ.get('APPOINTMENT_CACHE_DAYS', 512))
+APPOINTMENT_CACHE_TTL = float(os.environ.get('APPOINTMENT_CACHE_TTL', 30))
+INTENT_CACHE_SIZE = int(os.environ.get('INTENT_CACHE_SIZE', 1024))
+INTENT_CACHE_TTL = float(os.environ.get('INTENT_CACHE_TTL', 300))
+CONTEXT_MAX_TURNS = int(os.environ.get('CONTEXT_MAX_TURNS', 20))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get('CONTEXT_TOKEN_BUDGET', 400))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN', '')
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 50))
+
+# Configure the LLM used for intent extraction
+def create_llm_provider(provider: str) -> LLMProvider:
+    if provider == 'gemini':
+        if not GEMINI_API_KEY:
+            print("GEMINI_API_KEY is not set; chat requests will fail (set LLM_PROVIDER=local to run offline)")
+        return GeminiProvider(GEMINI_API_KEY, GEMINI_MODEL, INTENT_SCHEMA if GEMINI_JSON_MODE else None)
+    if provider == 'local':
+        return LocalProvider(latency=LOCAL_LLM_LATENCY_MS / 1000, jitter=LOCAL_LLM_JITTER_MS / 1000,
+                             error_rate=LOCAL_LLM_ERROR_RATE, seed=LOCAL_LLM_SEED)
+    raise ValueError(f"Unknown LLM_PROVIDER: {provider}")
 
-# Configure Gemini AI
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel('gemini-pro')
+llm = create_llm_provider(LLM_PROVIDER)
 
 class DatabaseManager:
     def __init__(self):
-        self.connection = None
+        self._pool = None
+        self._pool_lock = threading.Lock()
+    
+    @property
+    def pool(self) -> ConnectionPool:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ConnectionPool(
+                        DATABASE_URL,
+                        minconn=DB_POOL_MIN,
+                        maxconn=DB_POOL_MAX,
+                        timeout=DB_POOL_TIMEOUT,
+                        cursor_factory=RealDictCursor
+                    )
+        return self._pool
     
     def connect(self):
-        if not self.connection or self.connection.closed:
-            self.connection = psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
-        return self.connection
+        """Return the connection checked out for the current request."""
+        if 'db_conn' not in g:
+            g.db_conn = self.pool.getconn()
+        return g.db_conn
+    
+    def release(self):
+        if not has_app_context():
+            return
+        conn = g.pop('db_conn', None)
+        if conn is not None:
+            self.pool.putconn(conn)
+    
+    @contextmanager
+    def connection(self):
+        if has_app_context():
+            yield self.connect()
+            return
+        
+        # Outside a request (scripts, background jobs) borrow a connection for this call only
+        conn = self.pool.getconn()
+        try:
+            yield conn
+        finally:
+            self.pool.putconn(conn)
+    
+    @staticmethod
+    def record_query(elapsed: float, operation: str):
+        """Count one database round trip against the current request and in the metrics."""
+        DB_QUERY_LATENCY.observe(elapsed, operation)
+        if has_app_context():
+            g.db_queries = g.get('db_queries', 0) + 1
+            g.db_time = g.get('db_time', 0.0) + elapsed
     
     def execute_query(self, query: str, params: tuple = ()):
-        conn = self.connect()
-        with conn.cursor() as cursor:
-            cursor.execute(query, params)
-            if query.strip().upper().startswith('SELECT'):
-                return cursor.fetchall()
-            conn.commit()
-            return cursor.rowcount
+        """Run one statement. Returns the rows for SELECTs and for writes with
+        RETURNING, otherwise the affected row count."""
+        with self.connection() as conn:
+            started = time.perf_counter()
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(query, params)
+                    if query.strip().upper().startswith('SELECT'):
+                        return cursor.fetchall()
+                    rows = cursor.fetchall() if cursor.description is not None else None
+                    conn.commit()
+                    return cursor.rowcount if rows is None else rows
+            except Exception:
+                DB_QUERY_ERRORS.inc(statement_type(query))
+                # Don't leave the connection in an aborted transaction
+                conn.rollback()
+                raise
+            finally:
+                self.record_query(time.perf_counter() - started, statement_type(query))
+    
+    def stream_query(self, query: str, params: tuple = (), itersize: int = 1000) -> Iterator[Dict]:
+        """Yield rows through a server-side cursor, fetching ``itersize`` rows at a time."""
+        with self.connection() as conn:
+            try:
+                with conn.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+                    cursor.itersize = itersize
+                    cursor.execute(query, params)
+                    for row in cursor:
+                        yield row
+            finally:
+                # Read-only; ends the transaction the named cursor lived in
+                conn.rollback()
+    
+    def stats(self) -> Dict:
+        if self._pool is None:
+            return {'initialized': False}
+        return dict(self._pool.stats(), initialized=True)
 
 db = DatabaseManager()
 
+# Read-through cache for get_appointment, busy bitmaps and recurring occurrences; every write path
+# below invalidates the entries it affects
+appointment_cache = AppointmentCache(
+    maxsize=APPOINTMENT_CACHE_SIZE,
+    day_maxsize=APPOINTMENT_CACHE_DAYS,
+    ttl=APPOINTMENT_CACHE_TTL
+)
+
+# Identical concurrent list and availability reads share one computation
+inflight = SingleFlight(COALESCED_CALLS)
+
+# Opt-in per-request profiling (see profiled below); off unless a token or sample rate is set
+profiler = RequestProfiler(
+    PROFILE_DIR,
+    sample_rate=PROFILE_SAMPLE_RATE,
+    admin_token=PROFILE_ADMIN_TOKEN,
+    max_files=PROFILE_MAX_FILES
+)
+
+@app.teardown_appcontext
+def release_db_connection(exception=None):
+    db.release()
+
+@app.before_request
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.in_flight = True
+    REQUESTS_IN_FLIGHT.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    if 'request_started' in g:
+        # Unmatched paths share one label so scanners can't blow up the series count
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - g.request_started,
+                                request.method, route, str(response.status_code))
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exception=None):
+    # Streamed responses (stream_with_context) run teardown twice; count the request once
+    if g.pop('in_flight', False):
+        REQUESTS_IN_FLIGHT.dec()
+
+@app.after_request
+def report_query_stats(response):
+    """In debug mode, report the request's database round trips and time spent in them."""
+    if not (app.debug or DB_QUERY_STATS):
+        return response
+    
+    queries = g.get('db_queries', 0)
+    response.headers['X-DB-Queries'] = str(queries)
+    response.headers['X-DB-Time-Ms'] = f"{g.get('db_time', 0.0) * 1000:.2f}"
+    if queries > DB_QUERY_WARN_THRESHOLD:
+        print(f"{request.method} {request.path} made {queries} database queries (possible N+1)")
+    return response
+
+def conflict_payload(error: AppointmentConflict) -> Dict:
+    return {'success': False, 'error': str(error), 'conflict': error.conflict}
+
+def create_storage(backend: str) -> AppointmentStorage:
+    if backend == 'postgres':
+        return PostgresStorage(db)
+    if backend == 'sqlite':
+        return SQLiteStorage(SQLITE_PATH, on_query=db.record_query)
+    if backend == 'memory':
+        return MemoryStorage()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+storage = create_storage(STORAGE_BACKEND)
+
 class AppointmentService:
     @staticmethod
-    def create_appointment(data: Dict) -> Dict:
+    def new_appointment(data: Dict) -> Appointment:
+        return Appointment(
+            id=str(uuid.uuid4()),
+            title=data.get('title', ''),
+            description=data.get('description', ''),
+            start_time=datetime.fromisoformat(data['startTime'].replace('Z', '+00:00')),
+            end_time=datetime.fromisoformat(data['endTime'].replace('Z', '+00:00')),
+            attendees=data.get('attendees', []),
+            location=data.get('location', ''),
+            status='scheduled',
+            created_at=datetime.now()
+        )
+    
+    @staticmethod
+    def update_fields(data: Dict) -> Dict:
+        """Column values for the fields present in an update request; empty if there are none."""
+        fields = {field: data[field] for field in ('title', 'description', 'location', 'attendees')
+                  if field in data}
+        
+        if 'startTime' in data:
+            fields['start_time'] = datetime.fromisoformat(data['startTime'].replace('Z', '+00:00'))
+        
+        if 'endTime' in data:
+            fields['end_time'] = datetime.fromisoformat(data['endTime'].replace('Z', '+00:00'))
+        
+        if fields:
+            fields['updated_at'] = datetime.now()
+        return fields
+    
+    @staticmethod
+    def change_version() -> Tuple[int, Optional[datetime]]:
+        version, changed_at = storage.change_version()
+        # Responses are validated with this database-wide version, so nothing this process
+        # cached or started computing before another process's write may be served under it
+        if appointment_cache.observe(version):
+            inflight.forget()
+        return version, changed_at
+    
+    @staticmethod
+    def find_conflict(start_time: datetime, end_time: datetime, exclude_id: str = '') -> Optional[Appointment]:
+        return storage.find_conflict(start_time, end_time, exclude_id)
+    
+    @staticmethod
+    def find_occurrence_conflict(start_time: datetime, end_time: datetime) -> Optional[Appointment]:
+        """The earliest recurring occurrence overlapping [start_time, end_time), if any."""
+        return next(expand(storage.list_recurring(start_time, end_time), start_time, end_time), None)
+    
+    @staticmethod
+    def create_appointment(data: Dict) -> Optional[Appointment]:
         try:
-            appointment_id = str(uuid.uuid4())
-            query = """
-                INSERT INTO appointments (id, title, description, start_time, end_time, 
-                                       attendees, location, status, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """
-            
-            start_time = datetime.fromisoformat(data['startTime'].replace('Z', '+00:00'))
-            end_time = datetime.fromisoformat(data['endTime'].replace('Z', '+00:00'))
-            
-            params = (
-                appointment_id,
-                data.get('title', ''),
-                data.get('description', ''),
-                start_time,
-                end_time,
-                json.dumps(data.get('attendees', [])),
-                data.get('location', ''),
-                'scheduled',
-                datetime.now()
-            )
+            new = AppointmentService.new_appointment(data)
+            # Occurrences aren't rows, so the storage overlap checks can't see them; the
+            # guard keeps a series from being added between this check and the insert
+            with storage.series_guard():
+                conflict = AppointmentService.find_occurrence_conflict(new.start_time, new.end_time)
+                if conflict:
+                    raise AppointmentConflict(conflict)
+                appointment = storage.insert(new)
             
-            db.execute_query(query, params)
-            
-            # Get the created appointment
-            return AppointmentService.get_appointment(appointment_id)
+            inflight.forget()
+            appointment_cache.invalidate_range(appointment.start_time, appointment.end_time)
+            appointment_cache.set_appointment(appointment)
+            return appointment
             
+        except AppointmentConflict:
+            raise
         except Exception as e:
             print(f"Error creating appointment: {e}")
             return None
     
+    @staticmethod
+    def update_appointment(appointment_id: str, fields: Dict) -> Optional[Appointment]:
+        # The old times say which cached bitmaps the move frees up
+        previous = AppointmentService.get_appointment(appointment_id)
+        moves = previous is not None and ('start_time' in fields or 'end_time' in fields)
+        with storage.series_guard() if moves else nullcontext():
+            if moves:
+                moved = previous.replace(**fields)
+                conflict = AppointmentService.find_occurrence_conflict(moved.start_time, moved.end_time)
+                if conflict:
+                    raise AppointmentConflict(conflict)
+            appointment = storage.update(appointment_id, fields)
+        if appointment:
+            inflight.forget()
+            # Drop the old version and the days it was on, then the days it moved to
+            appointment_cache.invalidate_appointment(appointment_id)
+            if previous:
+                appointment_cache.invalidate_range(previous.start_time, previous.end_time)
+            appointment_cache.invalidate_range(appointment.start_time, appointment.end_time)
+            appointment_cache.set_appointment(appointment)
+        return appointment
+    
+    @staticmethod
+    def cancel_appointment(appointment_id: str) -> bool:
+        previous = AppointmentService.get_appointment(appointment_id)
+        cancelled = storage.cancel(appointment_id)
+        if cancelled:
+            inflight.forget()
+            appointment_cache.invalidate_appointment(appointment_id)
+            if previous:
+                appointment_cache.invalidate_range(previous.start_time, previous.end_time)
+        return cancelled
+    
+    @staticmethod
+    def bulk_import(records: Iterable) -> Dict:
+        """Validate and insert records in batches inside a single transaction."""
+        job = BulkImport(IMPORT_BATCH_SIZE)
+        storage.bulk_import(job, records)
+        
+        # Imports can touch any number of days
+        inflight.forget()
+        appointment_cache.invalidate_days()
+        return job.report()
+    
     @staticmethod
     def get_appointments(start_date: Optional[datetime] = None, 
-                        end_date: Optional[datetime] = None) -> List[Dict]:
-        try:
-            query = "SELECT * FROM appointments WHERE status = 'scheduled'"
-            params = []
-            
-            if start_date:
-                query += " AND start_time >= %s"
-                params.append(start_date)
-                
-            if end_date:
-                query += " AND end_time <= %s"
-                params.append(end_date)
-            
-            query += " ORDER BY start_time ASC"
-            
-            results = db.execute_query(query, tuple(params))
-            
-            appointments = []
-            for row in results:
-                appointment = dict(row)
-                appointment['attendees'] = json.loads(appointment['attendees'] or '[]')
-                appointment['startTime'] = appointment['start_time'].isoformat()
-                appointment['endTime'] = appointment['end_time'].isoformat()
-                appointments.append(appointment)
-                
-            return appointments
-            
-        except Exception as e:
-            print(f"Error fetching appointments: {e}")
-            return []
+                        end_date: Optional[datetime] = None,
+                        after: Optional[Tuple[datetime, str]] = None,
+                        limit: Optional[int] = None) -> List[Appointment]:
+        key = ('list', start_date, end_date, after, limit)
+        return inflight.do(key, lambda: AppointmentService._get_appointments(start_date, end_date, after, limit))
+    
+    @staticmethod
+    def _get_appointments(start_date: Optional[datetime], end_date: Optional[datetime],
+                          after: Optional[Tuple[datetime, str]], limit: Optional[int]) -> List[Appointment]:
+        appointments = storage.list(start_date, end_date, after, limit)
+        
+        # Occurrences in the listed window, merged in at their (start_time, id) position
+        window_start, window_end = list_window(start_date, end_date, RECURRENCE_HORIZON_DAYS)
+        occurrence_list = list(listed(AppointmentService.get_occurrences(window_start, window_end),
+                                      start_date, end_date, after))
+        return merge_listed(appointments, occurrence_list, limit) if occurrence_list else appointments
+    
+    @staticmethod
+    def get_appointments_page(start_date: Optional[datetime], end_date: Optional[datetime],
+                              cursor: Optional[str], limit: int) -> Tuple[List[Appointment], Optional[str]]:
+        """One page of appointments plus the cursor for the next page (None on the last page)."""
+        after = decode_cursor(cursor) if cursor else None
+        # Fetch one extra row to learn whether another page exists
+        appointments = AppointmentService.get_appointments(start_date, end_date, after, limit + 1)
+        if len(appointments) > limit:
+            appointments = appointments[:limit]
+            return appointments, encode_cursor(appointments[-1])
+        return appointments, None
     
     @staticmethod
-    def get_appointment(appointment_id: str) -> Optional[Dict]:
+    def stream_appointments(start_date: Optional[datetime] = None,
+                            end_date: Optional[datetime] = None) -> Iterator[Appointment]:
+        window_start, window_end = list_window(start_date, end_date, RECURRENCE_HORIZON_DAYS)
+        series_list = storage.list_recurring(window_start, window_end)
+        if not series_list:
+            return storage.stream(start_date, end_date)
+        # Expanded lazily alongside the rows rather than collected first
+        occurrence_stream = listed(expand(series_list, window_start, window_end), start_date, end_date)
+        return heapq.merge(storage.stream(start_date, end_date), occurrence_stream, key=sort_key)
+    
+    @staticmethod
+    def get_appointment(appointment_id: str) -> Optional[Appointment]:
+        cached = appointment_cache.get_appointment(appointment_id)
+        if cached is not None:
+            return cached
+        
         try:
-            query = "SELECT * FROM appointments WHERE id = %s"
-            results = db.execute_query(query, (appointment_id,))
-            
-            if results:
-                appointment = dict(results[0])
-                appointment['attendees'] = json.loads(appointment['attendees'] or '[]')
-                appointment['startTime'] = appointment['start_time'].isoformat()
-                appointment['endTime'] = appointment['end_time'].isoformat()
-                return appointment
-            
-            return None
+            generation = appointment_cache.generation()
+            appointment = storage.get(appointment_id)
+            if appointment:
+                appointment_cache.set_appointment(appointment, generation)
+            return appointment
             
         except Exception as e:
             print(f"Error fetching appointment: {e}")
             return None
     
     @staticmethod
-    def check_availability(target_date: datetime, duration: int) -> List[Dict]:
+    def get_occurrences(window_start: Optional[datetime], window_end: datetime) -> List[Appointment]:
+        """Occurrences of every active series overlapping the window, in (start_time, id) order."""
+        cached = appointment_cache.get_occurrences(window_start, window_end)
+        if cached is not None:
+            return cached
+        
+        generation = appointment_cache.generation()
+        occurrence_list = list(expand(storage.list_recurring(window_start, window_end), window_start, window_end))
+        appointment_cache.set_occurrences(window_start, window_end, occurrence_list, generation)
+        return occurrence_list
+    
+    @staticmethod
+    def get_busy_bitmaps(first_day: date, last_day: date) -> Dict[date, int]:
+        """Busy bitmaps of the UTC days first_day..last_day, reading only the uncached ones."""
+        bitmaps, missing = appointment_cache.get_bitmaps(first_day, last_day)
+        if missing:
+            generation = appointment_cache.generation()
+            loaded = storage.busy_bitmaps(missing[0], missing[-1])
+            fetched = {day: loaded.get(day, 0) for day in missing}
+            appointment_cache.set_bitmaps(fetched, generation)
+            bitmaps.update(fetched)
+        return bitmaps
+    
+    @staticmethod
+    def check_availability(target_date: datetime, duration: int,
+                           granularity: int = DEFAULT_GRANULARITY) -> List[Dict]:
+        start_of_day = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        key = ('availability', start_of_day, duration, granularity)
+        return inflight.do(key, lambda: AppointmentService._check_availability(start_of_day, duration, granularity))
+    
+    @staticmethod
+    def _check_availability(start_of_day: datetime, duration: int, granularity: int) -> List[Dict]:
+        work_start, work_end = working_hours(start_of_day)
+        
+        # Whole 5-minute cells: answer from the day's busy bitmap
+        occurrence_list = AppointmentService.get_occurrences(work_start, work_end)
+        if cell_aligned(work_start, duration, granularity):
+            bitmaps = AppointmentService.get_busy_bitmaps(utc_date(work_start), utc_date(work_end))
+            # Occurrences aren't in the stored bitmaps; mark them on a copy
+            bitmaps = overlay(bitmaps, ((apt.start_time, apt.end_time) for apt in occurrence_list))
+            return free_slots_from_bits(bitmaps, work_start, work_end, duration, granularity)
+        
+        # Everything overlapping working hours, as the bitmaps count it (a day listing
+        # would miss appointments that cross midnight)
+        busy = merge_intervals(storage.busy_intervals(work_start, work_end) +
+                               [(apt.start_time, apt.end_time) for apt in occurrence_list])
+        
+        return free_slots(busy, work_start, work_end, duration, granularity)
+    
+    @staticmethod
+    def check_availability_range(start_date: datetime, end_date: datetime, durations: List[int],
+                                 granularity: int = DEFAULT_GRANULARITY) -> List[Dict]:
+        """Free slots for every day in [start_date, end_date], grouped by day."""
+        key = ('availability_range', start_date, end_date, tuple(durations), granularity)
+        return inflight.do(key, lambda: AppointmentService._check_availability_range(
+            start_date, end_date, durations, granularity))
+    
+    @staticmethod
+    def _check_availability_range(start_date: datetime, end_date: datetime, durations: List[int],
+                                  granularity: int) -> List[Dict]:
+        days = local_days(start_date, end_date)
+        window_start, last_day = days[0], days[-1]
+        window_end = last_day + timedelta(days=1)
+        first_day, _ = working_hours(window_start)
+        
+        # Whole 5-minute cells: one bitmap spanning every day in the range
+        occurrence_intervals = [(apt.start_time, apt.end_time)
+                                for apt in AppointmentService.get_occurrences(window_start, window_end)]
+        if cell_aligned(first_day, *durations, granularity):
+            _, last_work_end = working_hours(last_day)
+            bitmaps = AppointmentService.get_busy_bitmaps(utc_date(first_day), utc_date(last_work_end))
+            bitmaps = overlay(bitmaps, occurrence_intervals)
+            return free_slots_by_day_from_bits(bitmaps, window_start, last_day, durations, granularity)
+        
+        # One query for the whole window instead of one per day
+        busy = merge_intervals(storage.busy_intervals(window_start, window_end) + occurrence_intervals)
+        
+        return free_slots_by_day(busy, window_start, window_end - timedelta(days=1),
+                                 durations, granularity)
+
+    @staticmethod
+    def check_common_availability(participants: List[str], start_date: datetime, end_date: datetime,
+                                  durations: List[int], granularity: int = DEFAULT_GRANULARITY) -> List[Dict]:
+        """Slots in [start_date, end_date] when none of ``participants`` attends an appointment, grouped by day."""
+        key = ('common_availability', tuple(participants), start_date, end_date, tuple(durations), granularity)
+        return inflight.do(key, lambda: AppointmentService._check_common_availability(
+            participants, start_date, end_date, durations, granularity))
+    
+    @staticmethod
+    def _check_common_availability(participants: List[str], start_date: datetime, end_date: datetime,
+                                   durations: List[int], granularity: int) -> List[Dict]:
+        days = local_days(start_date, end_date)
+        window_start, window_end = days[0], days[-1] + timedelta(days=1)
+        
+        # Each participant's intervals come back sorted; a k-way merge combines them
+        stored = storage.participant_busy_intervals(participants, window_start, window_end)
+        recurring = by_participant(AppointmentService.get_occurrences(window_start, window_end),
+                                   participant_keys(participants))
+        busy = merge_sorted_intervals(list(stored.values()) + list(recurring.values()))
+        
+        return free_slots_by_day(busy, window_start, window_end - timedelta(days=1),
+                                 durations, granularity)
+    
+    @staticmethod
+    def new_series(data: Dict) -> RecurringAppointment:
+        """A series from a create request; raises RecurrenceError for an unusable rule."""
+        start_time = datetime.fromisoformat(data['startTime'].replace('Z', '+00:00'))
+        end_time = datetime.fromisoformat(data['endTime'].replace('Z', '+00:00'))
+        # Naive times are server-local, as for appointments
+        start_time = start_time if start_time.tzinfo else start_time.astimezone()
+        end_time = end_time if end_time.tzinfo else end_time.astimezone()
+        if end_time <= start_time:
+            raise RecurrenceError('endTime must be after startTime')
+        # Without a zone, occurrences repeat at the first start's UTC offset
+        time_zone = data.get('timeZone') or offset_name(start_time)
+        resolve_time_zone(time_zone)
+        
+        series = RecurringAppointment(
+            id=str(uuid.uuid4()),
+            title=data.get('title', ''),
+            description=data.get('description', ''),
+            start_time=start_time,
+            end_time=end_time,
+            rrule=data.get('rrule', ''),
+            time_zone=time_zone,
+            exdates=[date.fromisoformat(day) for day in data.get('exdates', [])],
+            attendees=data.get('attendees', []),
+            location=data.get('location', ''),
+            created_at=datetime.now()
+        )
+        return series.replace(until=series_until(series))
+    
+    @staticmethod
+    def series_conflict(series: RecurringAppointment) -> Optional[Appointment]:
+        """The earliest appointment or occurrence clashing with any occurrence of the series."""
+        window_start = series.start_time
+        window_end = series_end(series)
+        
+        # An endless series is only checked up to the last stored appointment
+        stored = storage.busy_intervals(window_start, window_end or FAR_FUTURE)
+        clashes = [first_overlap(stored, occurrences(series, window_start, window_end))]
+        for other in storage.list_recurring(window_start, window_end):
+            other_end = clash_window_end(series, other)
+            others = merge_intervals((apt.start_time, apt.end_time)
+                                     for apt in occurrences(other, window_start, other_end))
+            clashes.append(first_overlap(others, occurrences(series, window_start, other_end)))
+        
+        clash = min((clash for clash in clashes if clash), key=sort_key, default=None)
+        if clash is None:
+            return None
+        return (storage.find_conflict(clash.start_time, clash.end_time) or
+                AppointmentService.find_occurrence_conflict(clash.start_time, clash.end_time))
+    
+    @staticmethod
+    def create_series(data: Dict) -> RecurringAppointment:
+        series = AppointmentService.new_series(data)
+        # Exclusive: no appointment or other series is written between the check and the insert
+        with storage.series_guard(exclusive=True):
+            conflict = AppointmentService.series_conflict(series)
+            if conflict:
+                raise AppointmentConflict(conflict)
+            series = storage.insert_recurring(series)
+        
+        AppointmentService.forget_occurrences()
+        return series
+    
+    @staticmethod
+    def get_series_list() -> List[RecurringAppointment]:
+        return storage.list_recurring()
+    
+    @staticmethod
+    def add_series_exception(series_id: str, day: date) -> Optional[RecurringAppointment]:
+        """Skip the series' occurrence on ``day`` (a date in the series' time zone)."""
+        series = storage.get_recurring(series_id)
+        if series is None:
+            return None
+        if day in series.exdates:
+            return series
+        
+        series = storage.update_recurring(series_id, {'exdates': sorted(series.exdates + [day]),
+                                                      'updated_at': datetime.now()})
+        AppointmentService.forget_occurrences()
+        return series
+    
+    @staticmethod
+    def cancel_series(series_id: str) -> bool:
+        series = storage.update_recurring(series_id, {'status': 'cancelled', 'updated_at': datetime.now()})
+        if series:
+            AppointmentService.forget_occurrences()
+        return series is not None
+    
+    @staticmethod
+    def forget_occurrences():
+        # A series can reach any window, so every expansion is dropped
+        inflight.forget()
+        appointment_cache.invalidate_occurrences()
+
+class GeminiAIService:
+    # Parsed intents keyed by (normalized message, today's date) so relative
+    # dates like "tomorrow" are never served from a previous day
+    intent_cache = TTLCache(maxsize=INTENT_CACHE_SIZE, ttl=INTENT_CACHE_TTL)
+    
+    @staticmethod
+    def normalize_message(message: str) -> str:
+        normalized = re.sub(r'\s+', ' ', message.strip().lower())
+        return normalized.rstrip('.!?')
+    
+    # How each message was resolved: local fast-path parser, intent cache or LLM call
+    resolution_counts = {'fast_path': 0, 'cache': 0, 'llm': 0}
+    _counts_lock = threading.Lock()
+    
+    @staticmethod
+    def _count(resolution: str):
+        with GeminiAIService._counts_lock:
+            GeminiAIService.resolution_counts[resolution] += 1
+        INTENT_RESOLUTIONS.inc(resolution)
+    
+    @staticmethod
+    def _record_call(method: str, elapsed: float):
+        LLM_LATENCY.observe(elapsed, method)
+        if has_app_context():
+            g.llm_time = g.get('llm_time', 0.0) + elapsed
+    
+    @staticmethod
+    def resolution_stats() -> Dict:
+        with GeminiAIService._counts_lock:
+            counts = dict(GeminiAIService.resolution_counts)
+        total = sum(counts.values())
+        counts['total'] = total
+        counts['fast_path_ratio'] = round(counts['fast_path'] / total, 4) if total else 0.0
+        return counts
+    
+    @staticmethod
+    def recent_turns(session_id: Optional[str]) -> List[Dict]:
+        """The session's newest turns (newest first); empty without a session."""
+        if not session_id:
+            return []
         try:
-            # Get existing appointments for the day
-            start_of_day = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
-            end_of_day = start_of_day + timedelta(days=1)
-            
-            existing_appointments = AppointmentService.get_appointments(start_of_day, end_of_day)
-            
-            # Define working hours (9 AM to 6 PM)
-            work_start = start_of_day.replace(hour=9)
-            work_end = start_of_day.replace(hour=18)
-            
-            # Generate available slots
-            available_slots = []
-            current_time = work_start
-            
-            while current_time + timedelta(minutes=duration) <= work_end:
-                slot_end = current_time + timedelta(minutes=duration)
-                
-                # Check if this slot conflicts with existing appointments
-                is_available = True
-                for apt in existing_appointments:
-                    apt_start = datetime.fromisoformat(apt['startTime'].replace('Z', '+00:00'))
-                    apt_end = datetime.fromisoformat(apt['endTime'].replace('Z', '+00:00'))
-                    
-                    # Check for overlap
-                    if (current_time < apt_end and slot_end > apt_start):
-                        is_available = False
-                        current_time = apt_end  # Skip to after this appointment
-                        break
-                
-                if is_available:
-                    available_slots.append({
-                        'start': current_time.isoformat(),
-                        'end': slot_end.isoformat(),
-                        'available': True
-                    })
-                    current_time += timedelta(minutes=30)  # 30-minute intervals
-                
-            return available_slots
-            
+            return storage.recent_turns(session_id, CONTEXT_MAX_TURNS)
         except Exception as e:
-            print(f"Error checking availability: {e}")
+            print(f"Error loading conversation history: {e}")
             return []
-
-class GeminiAIService:
+    
     @staticmethod
-    def process_message(message: str) -> Dict:
+    def remember(session_id: Optional[str], message: str, received_at: datetime, ai_response: Dict,
+                 response_data: Dict, previous_turns: List[Dict]):
+        """Store one exchange; memory is best effort and never fails the chat."""
+        if not session_id:
+            return
         try:
-            # Define the prompt for appointment scheduling
-            prompt = f"""
-            You are a helpful appointment scheduling assistant. Analyze the following user message and extract relevant information for appointment scheduling.
-
-            User message: "{message}"
-
-            Please respond in JSON format with the following structure:
-            {{
-                "intent": "schedule|check_availability|list_appointments|update|cancel|other",
-                "reply": "A friendly response to the user",
-                "extracted_info": {{
-                    "title": "meeting title if mentioned",
-                    "date": "date in ISO format if extractable",
-                    "time": "time if mentioned",
-                    "duration": "duration in minutes (default 60)",
-                    "attendees": ["list of attendees if mentioned"],
-                    "location": "location if mentioned"
-                }},
-                "action_needed": "What action should be taken",
-                "requires_confirmation": true/false
-            }}
-
-            Examples:
-            - "Schedule a meeting with John tomorrow at 2 PM" -> intent: "schedule"
-            - "Am I free Friday at 3 PM?" -> intent: "check_availability"  
-            - "What's on my calendar next week?" -> intent: "list_appointments"
-            - "Cancel my 10 AM meeting" -> intent: "cancel"
-
-            Be conversational and helpful. If information is missing, ask for clarification.
-            """
-
-            response = model.generate_content(prompt)
-            
-            try:
-                # Try to parse as JSON
-                result = json.loads(response.text)
-                return result
-            except json.JSONDecodeError:
-                # If not valid JSON, return a basic response
-                return {
-                    "intent": "other",
-                    "reply": response.text,
-                    "extracted_info": {},
-                    "action_needed": "respond",
-                    "requires_confirmation": False
-                }
-                
+            turns = exchange_turns(message, received_at, ai_response, response_data,
+                                   latest_summary(previous_turns))
+            storage.add_turns(session_id, turns)
         except Exception as e:
-            print(f"Error processing message with Gemini: {e}")
+            print(f"Error saving conversation history: {e}")
+    
+    @staticmethod
+    def _resolve_locally(message: str, context: str = ''):
+        """Try the fast-path parser and intent cache.
+
+        Returns ``(result, cache_key)``; ``result`` is ``None`` when the LLM is needed.
+        The fast path ignores ``context`` (its commands are self-contained); cached
+        answers are only reused within the same context.
+        """
+        now = datetime.now()
+        
+        # Simple commands are answered locally without an LLM round trip
+        parsed = parse_intent(message, now.date())
+        if parsed is not None:
+            GeminiAIService._count('fast_path')
+            return parsed, None
+        
+        context_key = hashlib.blake2b(context.encode(), digest_size=8).hexdigest() if context else ''
+        cache_key = (GeminiAIService.normalize_message(message), now.date().isoformat(), context_key)
+        cached = GeminiAIService.intent_cache.get(cache_key)
+        if cached is not None:
+            GeminiAIService._count('cache')
+            return copy.deepcopy(cached), cache_key
+        
+        GeminiAIService._count('llm')
+        return None, cache_key
+    
+    @staticmethod
+    def build_prompt(message: str, today: str, context: str = '') -> str:
+        return build_prompt(message, today, context)
+    
+    @staticmethod
+    def _parse_response(text: str, cache_key) -> Dict:
+        try:
+            result, outcome = parse_intent_response(text)
+        except IntentParseError as e:
+            LLM_RESPONSE_PARSE.inc(e.reason)
+            print(f"Unusable intent response from {llm.name}: {e}")
+            if e.reason == 'schema' or not text.strip():
+                return GeminiAIService._error_response()
+            # Not JSON at all: the model answered in prose, so pass that on
             return {
                 "intent": "other",
-                "reply": "I'm sorry, I'm having trouble understanding your request right now. Could you please try again?",
+                "reply": text,
                 "extracted_info": {},
-                "action_needed": "retry",
+                "action_needed": "respond",
                 "requires_confirmation": False
             }
+        
+        LLM_RESPONSE_PARSE.inc(outcome)
+        GeminiAIService.intent_cache.set(cache_key, copy.deepcopy(result))
+        return result
+    
+    @staticmethod
+    def _error_response() -> Dict:
+        return {
+            "intent": "other",
+            "reply": "I'm sorry, I'm having trouble understanding your request right now. Could you please try again?",
+            "extracted_info": {},
+            "action_needed": "retry",
+            "requires_confirmation": False
+        }
+    
+    @staticmethod
+    def process_message(message: str, context: str = '') -> Dict:
+        result, cache_key = GeminiAIService._resolve_locally(message, context)
+        if result is not None:
+            return result
+        
+        try:
+            prompt = GeminiAIService.build_prompt(message, cache_key[1], context)
+            # Don't hold a pooled connection while waiting on the LLM; later queries check out another
+            db.release()
+            started = time.perf_counter()
+            text = llm.generate(prompt)
+            GeminiAIService._record_call('generate', time.perf_counter() - started)
+            return GeminiAIService._parse_response(text, cache_key)
+                
+        except Exception as e:
+            LLM_ERRORS.inc('generate')
+            print(f"Error processing message with {llm.name}: {e}")
+            return GeminiAIService._error_response()
+    
+    @staticmethod
+    def stream_message(message: str, context: str = '') -> Iterator[Tuple[str, object]]:
+        """Like ``process_message`` but yields ``('delta', text)`` as the reply is
+        generated, followed by one ``('result', parsed_response)``."""
+        result, cache_key = GeminiAIService._resolve_locally(message, context)
+        if result is not None:
+            yield 'delta', result.get('reply', '')
+            yield 'result', result
+            return
+        
+        extractor = ReplyExtractor()
+        chunks = []
+        try:
+            prompt = GeminiAIService.build_prompt(message, cache_key[1], context)
+            # Don't hold a pooled connection while waiting on the LLM; later queries check out another
+            db.release()
+            started = time.perf_counter()
+            for text in llm.stream(prompt):
+                if not chunks:
+                    LLM_FIRST_CHUNK.observe(time.perf_counter() - started)
+                chunks.append(text)
+                delta = extractor.feed(text)
+                if delta:
+                    yield 'delta', delta
+            GeminiAIService._record_call('stream', time.perf_counter() - started)
+            
+            result = GeminiAIService._parse_response(''.join(chunks), cache_key)
+            
+        except Exception as e:
+            LLM_ERRORS.inc('stream')
+            print(f"Error streaming message from {llm.name}: {e}")
+            result = GeminiAIService._error_response()
+        
+        if not extractor.reply:
+            # Model didn't produce a JSON reply field (or failed); send the whole reply now
+            yield 'delta', result.get('reply', '')
+        yield 'result', result
+
+def appointment_from_intent(extracted_info: Dict) -> Optional[Dict]:
+    """Appointment payload for a 'schedule' intent, or None if date/time are missing."""
+    if not all(key in extracted_info for key in ['date', 'time']):
+        return None
+    
+    appointment_data = {
+        'title': extracted_info.get('title', 'New Appointment'),
+        'startTime': f"{extracted_info['date']}T{extracted_info['time']}:00",
+        'endTime': f"{extracted_info['date']}T{extracted_info['time']}:00",  # Will add duration
+        'attendees': extracted_info.get('attendees', []),
+        'location': extracted_info.get('location', '')
+    }
+    
+    # Add duration to end time
+    start_time = datetime.fromisoformat(appointment_data['startTime'])
+    duration = int(extracted_info.get('duration', 60))
+    end_time = start_time + timedelta(minutes=duration)
+    appointment_data['endTime'] = end_time.isoformat()
+    return appointment_data
+
+def schedule_reply(appointment_data: Dict, created_appointment: Optional[Appointment]) -> str:
+    if not created_appointment:
+        return "I had trouble creating that appointment. Please try again."
+    start_time = datetime.fromisoformat(appointment_data['startTime'])
+    return f"Great! I've scheduled your appointment: {appointment_data['title']} on {start_time.strftime('%B %d, %Y at %I:%M %p')}."
+
+def availability_reply(target_date: datetime, available_slots: List[Dict]) -> str:
+    if available_slots:
+        return f"I found {len(available_slots)} available time slots on {target_date.strftime('%B %d, %Y')}."
+    return f"I don't see any available slots on {target_date.strftime('%B %d, %Y')}. Would you like to try a different date?"
+
+def conflict_reply(conflict: Optional[Appointment]) -> str:
+    if not conflict:
+        return "That time overlaps another appointment. Would you like to pick a different time?"
+    start_time = conflict.start_time
+    return (f"That time overlaps {conflict.title} on {start_time.strftime('%B %d, %Y at %I:%M %p')}. "
+            "Would you like to pick a different time?")
+
+def list_reply(appointments: List[Appointment], target_date: Optional[datetime] = None) -> str:
+    period = f"on {target_date.strftime('%B %d, %Y')}" if target_date else 'in the next week'
+    if appointments:
+        count = len(appointments)
+        return f"You have {count} appointment{'s' if count != 1 else ''} {period}."
+    return f"You don't have any appointments scheduled {period}."
+
+def execute_intent(ai_response: Dict) -> Dict:
+    """Carry out the action for a parsed intent and build the chat response data."""
+    # Handle different intents
+    intent = ai_response.get('intent', 'other')
+    extracted_info = ai_response.get('extracted_info', {})
+    
+    response_data = {
+        'reply': ai_response.get('reply', 'I understand your request.'),
+        'action': intent
+    }
+    
+    # Execute actions based on intent
+    if intent == 'schedule':
+        appointment_data = appointment_from_intent(extracted_info)
+        if appointment_data:
+            try:
+                created_appointment = AppointmentService.create_appointment(appointment_data)
+            except AppointmentConflict as e:
+                response_data['conflict'] = e.conflict
+                response_data['reply'] = conflict_reply(e.conflict)
+                return response_data
+            if created_appointment:
+                response_data['data'] = created_appointment
+            response_data['reply'] = schedule_reply(appointment_data, created_appointment)
+    
+    elif intent == 'check_availability':
+        if 'date' in extracted_info:
+            target_date = datetime.fromisoformat(extracted_info['date'])
+            duration = int(extracted_info.get('duration', 60))
+            available_slots = AppointmentService.check_availability(target_date, duration)
+            
+            response_data['data'] = available_slots
+            response_data['reply'] = availability_reply(target_date, available_slots)
+    
+    elif intent == 'list_appointments':
+        target_date = None
+        if 'date' in extracted_info:
+            # One day ("list my appointments tomorrow")
+            target_date = datetime.fromisoformat(extracted_info['date'])
+            start_date = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
+            end_date = start_date + timedelta(days=1)
+        else:
+            # Default to next 7 days; whole minutes so concurrent requests share one query
+            start_date = datetime.now().replace(second=0, microsecond=0)
+            end_date = start_date + timedelta(days=7)
+        
+        appointments = AppointmentService.get_appointments(start_date, end_date)
+        response_data['data'] = appointments
+        response_data['reply'] = list_reply(appointments, target_date)
+    
+    return response_data
+
+def answer_chat(message: str, session_id: Optional[str]) -> Dict:
+    """Resolve a chat message against the session's earlier turns, act on it and remember the exchange."""
+    received_at = datetime.now(timezone.utc)
+    turns = GeminiAIService.recent_turns(session_id)
+    
+    ai_response = GeminiAIService.process_message(message, build_context(turns, CONTEXT_TOKEN_BUDGET))
+    response_data = execute_intent(ai_response)
+    GeminiAIService.remember(session_id, message, received_at, ai_response, response_data, turns)
+    return response_data
+
+def chat_events(message: str, session_id: Optional[str], received_at: datetime) -> Iterator[str]:
+    """The SSE events of a streamed chat reply: ``delta``s of reply text, then ``done`` (or ``error``)."""
+    try:
+        turns = GeminiAIService.recent_turns(session_id)
+        context = build_context(turns, CONTEXT_TOKEN_BUDGET)
+        for kind, payload in GeminiAIService.stream_message(message, context):
+            if kind == 'delta':
+                yield sse_event('delta', {'text': payload})
+            else:
+                response_data = execute_intent(payload)
+                GeminiAIService.remember(session_id, message, received_at, payload, response_data, turns)
+                yield sse_event('done', {'success': True, 'data': response_data})
+    except Exception as e:
+        print(f"Error in chat stream: {e}")
+        yield sse_event('error', {'success': False, 'error': 'Internal server error'})
+
+def availability_window(data: Dict) -> Tuple[datetime, datetime, List[int], int]:
+    """start, end, durations and granularity of a range or common availability request.
+    
+    Both ends come back aware in one zone: ``timeZone`` if given, else start's, else the server's.
+    """
+    zone = resolve_time_zone(data['timeZone']) if data.get('timeZone') else None
+    start_date = in_zone(datetime.fromisoformat(data['start']), zone)
+    end_date = in_zone(datetime.fromisoformat(data.get('end', data['start'])), start_date.tzinfo)
+    durations = data.get('durations') or [data.get('duration', 60)]
+    durations = [int(duration) for duration in durations]
+    granularity = int(data.get('granularity', DEFAULT_GRANULARITY))
+    return start_date, end_date, durations, granularity
+
+def window_error(start_date: datetime, end_date: datetime) -> Optional[str]:
+    """Why [start_date, end_date] can't be searched, or None if it can."""
+    if end_date < start_date:
+        return 'end must not be before start'
+    if (end_date.date() - start_date.date()).days >= MAX_AVAILABILITY_RANGE_DAYS:
+        return f'Range is limited to {MAX_AVAILABILITY_RANGE_DAYS} days'
+    return None
+
+def common_participants(data: Dict) -> List[str]:
+    participants = data.get('participants') or []
+    if isinstance(participants, str):
+        participants = participants.split(',')
+    return participant_keys(participants)
+
+def health_report() -> Dict:
+    return {
+        'status': 'healthy',
+        'timestamp': datetime.now().isoformat(),
+        'database': storage.stats(),
+        'appointment_cache': appointment_cache.stats(),
+        'coalescing': inflight.stats(),
+        'llm': llm.stats(),
+        'intent_cache': GeminiAIService.intent_cache.stats(),
+        'intent_resolution': GeminiAIService.resolution_stats()
+    }
+
+def render_metrics() -> str:
+    pool = db.stats()
+    if pool.get('initialized'):
+        for state in ('idle', 'in_use', 'waiting'):
+            DB_POOL_CONNECTIONS.set(pool[state], state)
+    return registry.render()
+
+def list_rollover(args) -> Optional[datetime]:
+    """Last UTC midnight for lists without an end: their recurrence horizon (see
+    list_window) moves on then, changing the result without any write."""
+    if args.get('end'):
+        return None
+    return datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+def conditional_on_appointments(view=None, *, rollover=None):
+    """Serve GET requests with ETag/Last-Modified from the appointment change
+    counter, answering 304 before the view runs when the client is current.
+
+    ``rollover(request.args)`` says when the view's result last changed
+    without a write (None if it only changes with writes); that time is
+    folded into both validators.
+
+    Only 200s are validated, so the services behind these views raise on
+    storage errors instead of returning an empty fallback that clients would
+    then keep revalidating as current."""
+    if view is None:
+        return partial(conditional_on_appointments, rollover=rollover)
+    
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'GET':
+            return view(*args, **kwargs)
+        
+        try:
+            version, changed_at = AppointmentService.change_version()
+        except Exception as e:
+            print(f"Error reading appointment change version: {e}")
+            return view(*args, **kwargs)
+        
+        rolled_at = rollover(request.args) if rollover else None
+        etag = version_etag(version, rolled_at)
+        if rolled_at and changed_at:
+            changed_at = max(changed_at, rolled_at)
+        if not_modified(request, etag, changed_at):
+            return apply_validators(Response(status=304), etag, changed_at)
+        
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            apply_validators(response, etag, changed_at)
+        return response
+    
+    return wrapper
+
+def profiled(view):
+    """Run the view under cProfile when the admin header or the sampling rate asks for it."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not profiler.wanted(request.headers.get(PROFILE_HEADER)):
+            return view(*args, **kwargs)
+        
+        profile = profiler.start()
+        if profile is None:
+            return view(*args, **kwargs)
+        
+        db_before, llm_before = g.get('db_time', 0.0), g.get('llm_time', 0.0)
+        started = time.perf_counter()
+        try:
+            response = make_response(view(*args, **kwargs))
+        finally:
+            wall = time.perf_counter() - started
+            breakdown = {
+                'gemini': g.get('llm_time', 0.0) - llm_before,
+                'database': g.get('db_time', 0.0) - db_before
+            }
+            request_line = f"{request.method} {request.full_path.rstrip('?')}"
+            profile_id = profiler.finish(profile, request.endpoint, request_line, wall, breakdown)
+        response.headers['X-Profile-Id'] = profile_id
+        return response
+    
+    return wrapper
+
+def request_data() -> Dict:
+    """Request parameters: the query string for GET, the JSON body otherwise."""
+    if request.method == 'GET':
+        data = request.args.to_dict()
+        if 'durations' in data:
+            data['durations'] = data['durations'].split(',')
+        return data
+    return request.get_json()
 
 @app.route('/api/chat', methods=['POST'])
+@profiled
 def chat():
     try:
         data = request.get_json()
@@ -250,68 +1081,8 @@ def chat():
         if not message:
             return jsonify({'success': False, 'error': 'Message is required'}), 400
         
-        # Process with Gemini AI
-        ai_response = GeminiAIService.process_message(message)
-        
-        # Handle different intents
-        intent = ai_response.get('intent', 'other')
-        extracted_info = ai_response.get('extracted_info', {})
-        
-        response_data = {
-            'reply': ai_response.get('reply', 'I understand your request.'),
-            'action': intent
-        }
-        
-        # Execute actions based on intent
-        if intent == 'schedule':
-            if all(key in extracted_info for key in ['date', 'time']):
-                # Try to create appointment
-                appointment_data = {
-                    'title': extracted_info.get('title', 'New Appointment'),
-                    'startTime': f"{extracted_info['date']}T{extracted_info['time']}:00",
-                    'endTime': f"{extracted_info['date']}T{extracted_info['time']}:00",  # Will add duration
-                    'attendees': extracted_info.get('attendees', []),
-                    'location': extracted_info.get('location', '')
-                }
-                
-                # Add duration to end time
-                start_time = datetime.fromisoformat(appointment_data['startTime'])
-                duration = int(extracted_info.get('duration', 60))
-                end_time = start_time + timedelta(minutes=duration)
-                appointment_data['endTime'] = end_time.isoformat()
-                
-                created_appointment = AppointmentService.create_appointment(appointment_data)
-                if created_appointment:
-                    response_data['data'] = created_appointment
-                    response_data['reply'] = f"Great! I've scheduled your appointment: {appointment_data['title']} on {start_time.strftime('%B %d, %Y at %I:%M %p')}."
-                else:
-                    response_data['reply'] = "I had trouble creating that appointment. Please try again."
-        
-        elif intent == 'check_availability':
-            if 'date' in extracted_info:
-                target_date = datetime.fromisoformat(extracted_info['date'])
-                duration = int(extracted_info.get('duration', 60))
-                available_slots = AppointmentService.check_availability(target_date, duration)
-                
-                response_data['data'] = available_slots
-                if available_slots:
-                    response_data['reply'] = f"I found {len(available_slots)} available time slots on {target_date.strftime('%B %d, %Y')}."
-                else:
-                    response_data['reply'] = f"I don't see any available slots on {target_date.strftime('%B %d, %Y')}. Would you like to try a different date?"
-        
-        elif intent == 'list_appointments':
-            # Default to next 7 days
-            start_date = datetime.now()
-            end_date = start_date + timedelta(days=7)
-            
-            appointments = AppointmentService.get_appointments(start_date, end_date)
-            response_data['data'] = appointments
-            
-            if appointments:
-                count = len(appointments)
-                response_data['reply'] = f"You have {count} appointment{'s' if count != 1 else ''} coming up in the next week."
-            else:
-                response_data['reply'] = "You don't have any appointments scheduled for the next week."
+        # Earlier turns of the session let follow-ups like "make it 3pm instead" resolve
+        response_data = answer_chat(message, session_id_from(data))
         
         return jsonify({'success': True, 'data': response_data})
         
@@ -322,7 +1093,28 @@ def chat():
             'error': 'Internal server error'
         }), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Server-Sent Events variant of /api/chat.
+
+    Emits ``delta`` events with reply text as it is generated, then a single
+    ``done`` event carrying the same payload /api/chat would return.
+    """
+    data = request.get_json() or {}
+    message = data.get('message', '')
+    
+    if not message:
+        return jsonify({'success': False, 'error': 'Message is required'}), 400
+    
+    events = chat_events(message, session_id_from(data), datetime.now(timezone.utc))
+    return Response(stream_with_context(events), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @app.route('/api/appointments', methods=['GET', 'POST'])
+@profiled
+@conditional_on_appointments(rollover=list_rollover)
 def appointments():
     if request.method == 'GET':
         try:
@@ -332,9 +1124,20 @@ def appointments():
             start_dt = datetime.fromisoformat(start_date) if start_date else None
             end_dt = datetime.fromisoformat(end_date) if end_date else None
             
-            appointments = AppointmentService.get_appointments(start_dt, end_dt)
-            return jsonify({'success': True, 'data': appointments})
+            if request.args.get('format') == 'ndjson':
+                # Export: rows are written as they come off a server-side cursor
+                rows = AppointmentService.stream_appointments(start_dt, end_dt)
+                return Response(stream_with_context(ndjson_line(row) for row in rows),
+                                mimetype='application/x-ndjson')
             
+            limit = page_size(request.args.get('limit'))
+            appointments, next_cursor = AppointmentService.get_appointments_page(
+                start_dt, end_dt, request.args.get('cursor'), limit
+            )
+            return jsonify({'success': True, 'data': appointments, 'nextCursor': next_cursor})
+            
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
     
@@ -348,30 +1151,102 @@ def appointments():
             else:
                 return jsonify({'success': False, 'error': 'Failed to create appointment'}), 400
                 
+        except AppointmentConflict as e:
+            return jsonify(conflict_payload(e)), 409
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/availability', methods=['POST'])
+@app.route('/api/appointments/import', methods=['POST'])
+def import_appointments():
+    """Bulk import from a JSON array or an NDJSON stream (one appointment per line)."""
+    try:
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            # Read line by line so large imports are never held in memory whole
+            records = parse_ndjson(request.stream)
+        else:
+            records = request.get_json()
+            if not isinstance(records, list):
+                return jsonify({'success': False, 'error': 'Expected a JSON array of appointments'}), 400
+        
+        report = AppointmentService.bulk_import(records)
+        return jsonify({'success': True, 'data': report})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/availability', methods=['GET', 'POST'])
+@profiled
+@conditional_on_appointments
 def check_availability():
     try:
-        data = request.get_json()
+        data = request_data()
         date = datetime.fromisoformat(data['date'])
-        duration = data.get('duration', 60)
+        duration = int(data.get('duration', 60))
+        granularity = int(data.get('granularity', DEFAULT_GRANULARITY))
         
-        available_slots = AppointmentService.check_availability(date, duration)
+        available_slots = AppointmentService.check_availability(date, duration, granularity)
         return jsonify({'success': True, 'data': available_slots})
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/availability/range', methods=['GET', 'POST'])
+@conditional_on_appointments
+def check_availability_range():
+    try:
+        start_date, end_date, durations, granularity = availability_window(request_data())
+        
+        error = window_error(start_date, end_date)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        
+        days = AppointmentService.check_availability_range(start_date, end_date, durations, granularity)
+        return jsonify({'success': True, 'data': days})
+        
+    except KeyError as e:
+        return jsonify({'success': False, 'error': f'{e.args[0]} is required'}), 400
+    except ValueError as e:
+        # Malformed dates, numbers or timeZone
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/availability/common', methods=['GET', 'POST'])
+@conditional_on_appointments
+def check_common_availability():
+    try:
+        data = request_data()
+        participants = common_participants(data)
+        start_date, end_date, durations, granularity = availability_window(data)
+        
+        if not participants:
+            return jsonify({'success': False, 'error': 'participants is required'}), 400
+        if len(participants) > MAX_COMMON_PARTICIPANTS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {MAX_COMMON_PARTICIPANTS} participants are allowed'
+            }), 400
+        error = window_error(start_date, end_date)
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
+        
+        days = AppointmentService.check_common_availability(participants, start_date, end_date,
+                                                            durations, granularity)
+        return jsonify({'success': True, 'data': days})
+        
+    except KeyError as e:
+        return jsonify({'success': False, 'error': f'{e.args[0]} is required'}), 400
+    except ValueError as e:
+        # Malformed dates, numbers or timeZone
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/appointments/<appointment_id>', methods=['DELETE', 'PUT'])
 def appointment_detail(appointment_id):
     if request.method == 'DELETE':
         try:
-            query = "UPDATE appointments SET status = 'cancelled' WHERE id = %s"
-            rows_affected = db.execute_query(query, (appointment_id,))
-            
-            if rows_affected > 0:
+            if AppointmentService.cancel_appointment(appointment_id):
                 return jsonify({'success': True, 'message': 'Appointment cancelled successfully'})
             else:
                 return jsonify({'success': False, 'error': 'Appointment not found'}), 404
@@ -383,54 +1258,93 @@ def appointment_detail(appointment_id):
         try:
             data = request.get_json()
             
-            # Build update query dynamically
-            update_fields = []
-            params = []
-            
-            for field in ['title', 'description', 'location']:
-                if field in data:
-                    update_fields.append(f"{field} = %s")
-                    params.append(data[field])
-            
-            if 'startTime' in data:
-                update_fields.append("start_time = %s")
-                params.append(datetime.fromisoformat(data['startTime']))
-            
-            if 'endTime' in data:
-                update_fields.append("end_time = %s")
-                params.append(datetime.fromisoformat(data['endTime']))
-            
-            if 'attendees' in data:
-                update_fields.append("attendees = %s")
-                params.append(json.dumps(data['attendees']))
-            
-            if not update_fields:
+            fields = AppointmentService.update_fields(data)
+            if not fields:
                 return jsonify({'success': False, 'error': 'No fields to update'}), 400
             
-            update_fields.append("updated_at = %s")
-            params.append(datetime.now())
-            params.append(appointment_id)
-            
-            query = f"UPDATE appointments SET {', '.join(update_fields)} WHERE id = %s"
-            rows_affected = db.execute_query(query, tuple(params))
-            
-            if rows_affected > 0:
-                updated_appointment = AppointmentService.get_appointment(appointment_id)
+            updated_appointment = AppointmentService.update_appointment(appointment_id, fields)
+            if updated_appointment:
                 return jsonify({'success': True, 'data': updated_appointment})
             else:
                 return jsonify({'success': False, 'error': 'Appointment not found'}), 404
                 
+        except AppointmentConflict as e:
+            return jsonify(conflict_payload(e)), 409
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/recurring', methods=['GET', 'POST'])
+def recurring_appointments():
+    if request.method == 'GET':
+        try:
+            return jsonify({'success': True, 'data': AppointmentService.get_series_list()})
+            
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
+    
+    try:
+        data = request.get_json() or {}
+        series = AppointmentService.create_series(data)
+        return jsonify({'success': True, 'data': series}), 201
+        
+    except AppointmentConflict as e:
+        return jsonify(conflict_payload(e)), 409
+    except KeyError as e:
+        return jsonify({'success': False, 'error': f'{e.args[0]} is required'}), 400
+    except ValueError as e:
+        # RecurrenceError included
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/recurring/<series_id>', methods=['DELETE'])
+def recurring_detail(series_id):
+    try:
+        if AppointmentService.cancel_series(series_id):
+            return jsonify({'success': True, 'message': 'Recurring appointment cancelled successfully'})
+        else:
+            return jsonify({'success': False, 'error': 'Recurring appointment not found'}), 404
+            
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/recurring/<series_id>/exceptions', methods=['POST'])
+def recurring_exception(series_id):
+    """Skip one occurrence: {"date": "YYYY-MM-DD"}, in the series' time zone."""
+    try:
+        data = request.get_json() or {}
+        if not data.get('date'):
+            return jsonify({'success': False, 'error': 'date is required'}), 400
+        
+        series = AppointmentService.add_series_exception(series_id, date.fromisoformat(data['date']))
+        if series:
+            return jsonify({'success': True, 'data': series})
+        else:
+            return jsonify({'success': False, 'error': 'Recurring appointment not found'}), 404
+            
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+    return jsonify(health_report())
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+@app.cli.command('rebuild-bitmaps')
+def rebuild_bitmaps_command():
+    """Recompute every day's busy bitmap from the appointments (flask --app main rebuild-bitmaps)."""
+    days = storage.rebuild_busy_bitmaps()
+    appointment_cache.invalidate_days()
+    print(f"Rebuilt busy bitmaps for {days} days ({storage.name})")
 
 if __name__ == '__main__':
     # Initialize database
-    from database import init_database
-    init_database()
+    storage.init_schema()
     
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
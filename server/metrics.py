@@ -0,0 +1,170 @@
+"""Minimal in-process metrics rendered in the Prometheus text format.
+
+Each update is a dict lookup and a few additions under one short lock
+(about a microsecond), so hot paths can be instrumented freely. Label values are
+passed positionally in the order the metric declared its label names.
+"""
+import threading
+from bisect import bisect_left
+from typing import Dict, List, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+                for labels, value in items]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels):
+        # Counts are kept per bucket and made cumulative when rendered
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, ([*counts], total, count))
+                           for labels, (counts, total, count) in self._values.items())
+
+        lines = []
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels(self.labelnames + ('le',), labels + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(total)}")
+            lines.append(f"{self.name}_count{label_text} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        return '\n'.join(metric.render() for metric in self._metrics) + '\n'
+
+
+registry = Registry()
+
+REQUESTS_IN_FLIGHT = registry.gauge(
+    'http_requests_in_flight', 'Requests currently being handled')
+REQUEST_LATENCY = registry.histogram(
+    'http_request_duration_seconds', 'Time to produce a response, by route and status',
+    ('method', 'route', 'status'))
+DB_QUERY_LATENCY = registry.histogram(
+    'db_query_duration_seconds', 'Database round trip time, by statement type', ('operation',))
+DB_QUERY_ERRORS = registry.counter(
+    'db_query_errors_total', 'Database statements that raised, by statement type', ('operation',))
+LLM_LATENCY = registry.histogram(
+    'gemini_request_duration_seconds', 'Gemini call time (full response), by call type', ('method',),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0, 32.0))
+LLM_FIRST_CHUNK = registry.histogram(
+    'gemini_first_chunk_seconds', 'Time until a streamed Gemini call returns its first chunk',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0))
+LLM_ERRORS = registry.counter(
+    'gemini_request_errors_total', 'Gemini calls that raised, by call type', ('method',))
+LLM_RESPONSE_PARSE = registry.counter(
+    'llm_response_parse_total', 'LLM intent responses by parse outcome: ok, repaired (JSON dug out of '
+    'surrounding text), invalid_json or schema (both unusable)', ('outcome',))
+INTENT_RESOLUTIONS = registry.counter(
+    'intent_resolutions_total', 'Chat messages by how their intent was resolved', ('resolution',))
+COALESCED_CALLS = registry.counter(
+    'coalesced_calls_total', 'Service reads by operation and outcome: executed, or shared the result of '
+    'an identical call already in flight', ('operation', 'outcome'))
+DB_POOL_CONNECTIONS = registry.gauge(
+    'db_pool_connections', 'Pool connections idle or in use, and callers waiting for one', ('state',))
+
+
+def statement_type(query: str) -> str:
+    """Lower-cased leading keyword of a SQL statement, used as a low-cardinality label."""
+    head = query.lstrip()[:16].split(None, 1)
+    return head[0].lower() if head else 'unknown'
@@ -0,0 +1,183 @@
+"""Typed in-memory representation of an appointment and of a recurring series.
+
+Rows are converted once, as they come back from the database, and keep
+their times as datetimes so availability and cache invalidation use them
+directly. ``json_default`` is the single encoder hook shared by JSON
+responses, the NDJSON export and the chat stream; it renders an
+appointment straight to its API shape.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+from uuid import UUID
+
+
+class Appointment:
+    __slots__ = ('id', 'title', 'description', 'start_time', 'end_time', 'attendees',
+                 'location', 'status', 'created_at', 'updated_at', 'recurrence_id')
+
+    def __init__(self, id: str, title: str, start_time: datetime, end_time: datetime,
+                 description: Optional[str] = None, attendees: Optional[List[str]] = None,
+                 location: Optional[str] = None, status: str = 'scheduled',
+                 created_at: Optional[datetime] = None, updated_at: Optional[datetime] = None,
+                 recurrence_id: Optional[str] = None):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.start_time = start_time
+        self.end_time = end_time
+        self.attendees = attendees if attendees is not None else []
+        self.location = location
+        self.status = status
+        self.created_at = created_at
+        self.updated_at = updated_at
+        # Set on occurrences expanded from a recurring series (see recurrence.py)
+        self.recurrence_id = recurrence_id
+
+    @classmethod
+    def from_row(cls, row: Mapping) -> 'Appointment':
+        attendees = row['attendees']
+        # JSONB arrives already decoded from psycopg2 but as text from SQLite
+        if not isinstance(attendees, list):
+            attendees = json.loads(attendees or '[]')
+        return cls(
+            id=row['id'],
+            title=row['title'],
+            description=row['description'],
+            start_time=row['start_time'],
+            end_time=row['end_time'],
+            attendees=attendees,
+            location=row['location'],
+            status=row['status'],
+            created_at=row['created_at'],
+            updated_at=row['updated_at']
+        )
+
+    def replace(self, **changes) -> 'Appointment':
+        """Copy with some fields changed; instances are shared by caches, so never mutate one."""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return Appointment(**values)
+
+    def as_json(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'startTime': self.start_time.isoformat(),
+            'endTime': self.end_time.isoformat(),
+            'attendees': self.attendees,
+            'location': self.location,
+            'status': self.status,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'updatedAt': self.updated_at.isoformat() if self.updated_at else None,
+            'recurrenceId': self.recurrence_id
+        }
+
+    def __repr__(self) -> str:
+        return f"Appointment(id={self.id!r}, title={self.title!r}, start_time={self.start_time!r})"
+
+
+class RecurringAppointment:
+    """A series stored once: its first occurrence, the rule and the skipped dates."""
+
+    __slots__ = ('id', 'title', 'description', 'start_time', 'end_time', 'rrule', 'time_zone',
+                 'exdates', 'until', 'attendees', 'location', 'status', 'created_at', 'updated_at')
+
+    def __init__(self, id: str, title: str, start_time: datetime, end_time: datetime, rrule: str,
+                 time_zone: str, exdates: Optional[List[date]] = None, until: Optional[datetime] = None,
+                 description: Optional[str] = None, attendees: Optional[List[str]] = None,
+                 location: Optional[str] = None, status: str = 'active',
+                 created_at: Optional[datetime] = None, updated_at: Optional[datetime] = None):
+        self.id = id
+        self.title = title
+        self.description = description
+        self.start_time = start_time
+        self.end_time = end_time
+        self.rrule = rrule
+        self.time_zone = time_zone
+        self.exdates = exdates if exdates is not None else []
+        # Start of the last occurrence (COUNT resolved); None if the series never ends
+        self.until = until
+        self.attendees = attendees if attendees is not None else []
+        self.location = location
+        self.status = status
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+    @classmethod
+    def from_row(cls, row: Mapping) -> 'RecurringAppointment':
+        attendees, exdates = row['attendees'], row['exdates']
+        if not isinstance(attendees, list):
+            attendees = json.loads(attendees or '[]')
+        if not isinstance(exdates, list):
+            exdates = json.loads(exdates or '[]')
+        return cls(
+            id=row['id'],
+            title=row['title'],
+            description=row['description'],
+            start_time=row['start_time'],
+            end_time=row['end_time'],
+            rrule=row['rrule'],
+            time_zone=row['time_zone'],
+            exdates=[date.fromisoformat(day) for day in exdates],
+            until=row['until'],
+            attendees=attendees,
+            location=row['location'],
+            status=row['status'],
+            created_at=row['created_at'],
+            updated_at=row['updated_at']
+        )
+
+    def replace(self, **changes) -> 'RecurringAppointment':
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        return RecurringAppointment(**values)
+
+    def as_json(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'startTime': self.start_time.isoformat(),
+            'endTime': self.end_time.isoformat(),
+            'rrule': self.rrule,
+            'timeZone': self.time_zone,
+            'exdates': [day.isoformat() for day in self.exdates],
+            'until': self.until.isoformat() if self.until else None,
+            'attendees': self.attendees,
+            'location': self.location,
+            'status': self.status,
+            'createdAt': self.created_at.isoformat() if self.created_at else None,
+            'updatedAt': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self) -> str:
+        return f"RecurringAppointment(id={self.id!r}, title={self.title!r}, rrule={self.rrule!r})"
+
+
+def participant_keys(attendees: Iterable) -> List[str]:
+    """Attendees as stored in appointment_participants: trimmed, lower-cased and without repeats."""
+    keys = []
+    for attendee in attendees:
+        if isinstance(attendee, str) and attendee.strip():
+            key = attendee.strip().lower()
+            if key not in keys:
+                keys.append(key)
+    return keys
+
+
+def json_default(value: Any) -> Any:
+    if isinstance(value, (Appointment, RecurringAppointment)):
+        return value.as_json()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    # As Flask's own encoder renders them (e.g. Postgres numeric aggregates)
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> str:
+    return json.dumps(value, default=json_default, separators=(',', ':'))
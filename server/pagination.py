@@ -0,0 +1,44 @@
+"""Keyset pagination and NDJSON export helpers for appointment listings.
+
+Pages are ordered by (start_time, id) and the cursor is the sort key of
+the last row returned, so every page is an index range scan no matter
+how deep the client pages.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from models import Appointment, dumps
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+Cursor = Tuple[datetime, str]
+
+
+def encode_cursor(appointment: Appointment) -> str:
+    key = [appointment.start_time.isoformat(), appointment.id]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str) -> Cursor:
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        start_time, appointment_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(start_time), str(appointment_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def page_size(value: Optional[str]) -> int:
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    size = int(value)
+    if size < 1:
+        raise ValueError('limit must be positive')
+    return min(size, MAX_PAGE_SIZE)
+
+
+def ndjson_line(appointment: Appointment) -> str:
+    return dumps(appointment) + '\n'
@@ -0,0 +1,188 @@
+import threading
+import time
+from typing import Dict, List, Optional
+
+import psycopg2
+import psycopg2.extensions as _ext
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class ConnectionPool:
+    """Thread-safe, blocking psycopg2 connection pool.
+
+    Unlike ``psycopg2.pool.ThreadedConnectionPool`` this pool waits for a
+    connection to be returned instead of failing when exhausted, keeps up to
+    ``maxconn`` connections open, validates connections on checkout and
+    records usage statistics for sizing.
+    """
+
+    def __init__(self, dsn: str, minconn: int = 1, maxconn: int = 10,
+                 timeout: float = 30.0, ping_after: float = 30.0, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("Invalid pool size: require 0 <= minconn <= maxconn and maxconn >= 1")
+
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle: List[tuple] = []  # (connection, last_used_monotonic)
+        self._in_use = set()
+        # Slots held by connections being opened or pinged outside the lock
+        self._pending = 0
+        self._closed = False
+
+        # Statistics
+        self._waiting = 0
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+        for _ in range(minconn):
+            self._idle.append((self._new_connection(), time.monotonic()))
+
+    def _new_connection(self):
+        return psycopg2.connect(self.dsn, **self._connect_kwargs)
+
+    @staticmethod
+    def _is_usable(conn) -> bool:
+        return not conn.closed and conn.info.transaction_status != _ext.TRANSACTION_STATUS_UNKNOWN
+
+    @staticmethod
+    def _ping(conn) -> bool:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        self._discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self, timeout: Optional[float] = None):
+        """Check out a healthy connection, waiting up to ``timeout`` seconds."""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    if not self._is_usable(conn):
+                        self._discard(conn)
+                        continue
+                    # Only ping connections that sat idle long enough to have been dropped,
+                    # and outside the lock like opening one
+                    if time.monotonic() - last_used >= self.ping_after:
+                        self._pending += 1
+                        self._cond.release()
+                        try:
+                            healthy = self._ping(conn)
+                        finally:
+                            self._cond.acquire()
+                            self._pending -= 1
+                        if not healthy or self._closed:
+                            self._discard(conn)
+                            self._cond.notify()
+                            continue
+                    self._in_use.add(conn)
+                    break
+
+                if len(self._in_use) + self._pending < self.maxconn:
+                    # Open outside the lock so other threads are not blocked on the network
+                    self._pending += 1
+                    self._cond.release()
+                    try:
+                        conn = self._new_connection()
+                    finally:
+                        self._cond.acquire()
+                        self._pending -= 1
+                        # If opening failed the slot is free again for a waiter
+                        self._cond.notify()
+                    self._in_use.add(conn)
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"No database connection available after {timeout:.1f}s "
+                        f"(max {self.maxconn} connections)"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            waited = time.monotonic() - started
+            self._checkouts += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+            return conn
+
+    def putconn(self, conn, discard: bool = False):
+        """Return a connection to the pool, resetting any open transaction."""
+        # Roll back before taking the lock: the connection still counts as in use,
+        # so its slot stays reserved while the rollback waits on the network
+        if not (discard or conn.closed):
+            status = conn.info.transaction_status
+            if status == _ext.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != _ext.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        with self._cond:
+            self._in_use.discard(conn)
+            if discard or self._closed or conn.closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            for conn, _ in self._idle:
+                self._discard(conn)
+            self._idle.clear()
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                'min_size': self.minconn,
+                'max_size': self.maxconn,
+                'size': len(self._idle) + len(self._in_use),
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'waiting': self._waiting,
+                'checkouts': checkouts,
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+                'avg_wait_ms': round(self._total_wait / checkouts * 1000, 3) if checkouts else 0.0,
+                'max_wait_ms': round(self._max_wait * 1000, 3),
+                'total_wait_ms': round(self._total_wait * 1000, 3),
+            }
@@ -0,0 +1,97 @@
+"""Opt-in cProfile capture for individual requests.
+
+A request is profiled when it carries the admin token in the profiling
+header or is picked by the sampling rate. Each capture writes two files
+to the profile directory: ``<id>.prof`` (raw stats for pstats/snakeviz)
+and ``<id>.txt`` (wall-clock split across Gemini, database and Python,
+followed by the top functions by cumulative time). Only the newest
+``max_files`` captures are kept.
+
+Only one request is profiled at a time; others run normally meanwhile.
+"""
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, Optional
+
+PROFILE_HEADER = 'X-Profile'
+TOP_FUNCTIONS = 40
+
+
+class RequestProfiler:
+    def __init__(self, directory: str, sample_rate: float = 0.0, admin_token: str = '',
+                 max_files: int = 50):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+        self.max_files = max_files
+        self._active = threading.Lock()
+
+    def wanted(self, header_value: Optional[str]) -> bool:
+        if self.admin_token and header_value and hmac.compare_digest(header_value, self.admin_token):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """Start profiling the calling thread, or return None if another capture is running."""
+        if not self._active.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except Exception:
+            self._active.release()
+            raise
+        return profile
+
+    def finish(self, profile: cProfile.Profile, name: str, request_line: str,
+               wall: float, breakdown: Dict[str, float]) -> str:
+        """Stop the capture, write its files and return the profile id."""
+        profile.disable()
+        self._active.release()
+
+        profile_id = f"{datetime.now():%Y%m%dT%H%M%S.%f}-{name}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, profile_id)
+        profile.dump_stats(base + '.prof')
+        with open(base + '.txt', 'w') as report:
+            report.write(self.report(profile, request_line, wall, breakdown))
+        self.rotate()
+        return profile_id
+
+    @staticmethod
+    def report(profile: cProfile.Profile, request_line: str, wall: float,
+               breakdown: Dict[str, float]) -> str:
+        parts = dict(breakdown)
+        parts['python'] = max(wall - sum(breakdown.values()), 0.0)
+
+        lines = [request_line, f"wall: {wall * 1000:.1f} ms"]
+        for part, seconds in parts.items():
+            share = seconds / wall * 100 if wall else 0.0
+            lines.append(f"  {part:<10}{seconds * 1000:>10.1f} ms {share:>6.1f}%")
+
+        stats_text = io.StringIO()
+        pstats.Stats(profile, stream=stats_text).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+        return '\n'.join(lines) + '\n\n' + stats_text.getvalue()
+
+    def rotate(self):
+        """Delete the oldest captures beyond ``max_files``."""
+        captures = {}
+        for entry in os.scandir(self.directory):
+            stem, extension = os.path.splitext(entry.name)
+            if extension in ('.prof', '.txt'):
+                captures.setdefault(stem, []).append(entry.path)
+
+        # Ids start with a timestamp, so they sort oldest first
+        for stem in sorted(captures)[:-self.max_files or None]:
+            for path in captures[stem]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
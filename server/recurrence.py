@@ -0,0 +1,363 @@
+"""Recurring appointments: a rule stored once, occurrences expanded on read.
+
+A series is its first occurrence plus an RRULE-style recurrence:
+``FREQ`` (DAILY, WEEKLY or MONTHLY), ``INTERVAL``, ``BYDAY`` (MO..SU),
+``BYMONTHDAY`` (1..31, or -1 for the last day of the month), ``COUNT``
+and ``UNTIL``, e.g. ``FREQ=WEEKLY;BYDAY=MO,WE,FR``. Exceptions are the
+dates of skipped occurrences, as EXDATE would list them.
+
+Occurrences keep the first one's wall-clock time and length in the
+series' time zone (an IANA name, or the UTC offset of the first start),
+so a 9:00 standup stays at 9:00 across daylight-saving changes.
+
+Occurrences are never stored. ``occurrences`` is a generator that jumps
+straight to the first period that can reach the queried window and stops
+at its end, so expanding a window costs the same however long the series
+has been running.
+"""
+import heapq
+import re
+from math import lcm
+from itertools import islice
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from models import Appointment, RecurringAppointment, participant_keys
+
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY')
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+# Guards against rules that can never produce an occurrence (e.g. the 30th of every February)
+MAX_EMPTY_PERIODS = 1000
+MAX_COUNT = 10000
+
+# The Gregorian calendar, weekdays included, repeats every 400 years
+GREGORIAN_CYCLE_DAYS = 146097
+# Shortest span two endless series are compared over: every daylight-saving change of a year
+MIN_CLASH_SPAN = timedelta(days=371)
+
+_OFFSET = re.compile(r'^(?:UTC)?([+-])(\d{2}):?(\d{2})$')
+
+
+class RecurrenceError(ValueError):
+    """Raised for a recurrence rule, time zone or exception this module can't use."""
+
+
+class Recurrence:
+    __slots__ = ('freq', 'interval', 'count', 'until', 'byday', 'bymonthday')
+
+    def __init__(self, freq: str, interval: int = 1, count: Optional[int] = None,
+                 until: Optional[datetime] = None, byday: Tuple[int, ...] = (),
+                 bymonthday: Tuple[int, ...] = ()):
+        self.freq = freq
+        self.interval = interval
+        self.count = count
+        self.until = until
+        self.byday = byday
+        self.bymonthday = bymonthday
+
+    @classmethod
+    def parse(cls, text: str) -> 'Recurrence':
+        parts = {}
+        for part in text.strip().upper().removeprefix('RRULE:').split(';'):
+            if not part:
+                continue
+            name, _, value = part.partition('=')
+            if not value:
+                raise RecurrenceError(f"Malformed recurrence part: {part!r}")
+            parts[name] = value
+
+        freq = parts.pop('FREQ', None)
+        if freq not in FREQUENCIES:
+            raise RecurrenceError(f"FREQ must be one of {', '.join(FREQUENCIES)}")
+        try:
+            interval = int(parts.pop('INTERVAL', 1))
+            count = int(parts.pop('COUNT')) if 'COUNT' in parts else None
+            byday = tuple(sorted({WEEKDAYS.index(day) for day in parts.pop('BYDAY').split(',')})) \
+                if 'BYDAY' in parts else ()
+            bymonthday = tuple(sorted({int(day) for day in parts.pop('BYMONTHDAY').split(',')})) \
+                if 'BYMONTHDAY' in parts else ()
+        except ValueError:
+            raise RecurrenceError('INTERVAL, COUNT, BYDAY or BYMONTHDAY is malformed') from None
+        until = _parse_until(parts.pop('UNTIL')) if 'UNTIL' in parts else None
+
+        if parts:
+            raise RecurrenceError(f"Unsupported recurrence parts: {', '.join(sorted(parts))}")
+        if interval < 1:
+            raise RecurrenceError('INTERVAL must be at least 1')
+        if count is not None and not 1 <= count <= MAX_COUNT:
+            raise RecurrenceError(f"COUNT must be between 1 and {MAX_COUNT}")
+        if count is not None and until is not None:
+            raise RecurrenceError('COUNT and UNTIL cannot both be given')
+        if any(day == 0 or not -31 <= day <= 31 for day in bymonthday):
+            raise RecurrenceError('BYMONTHDAY values must be 1..31 or -31..-1')
+        if bymonthday and freq != 'MONTHLY':
+            raise RecurrenceError('BYMONTHDAY is only supported with FREQ=MONTHLY')
+        if byday and freq == 'MONTHLY':
+            raise RecurrenceError('BYDAY is only supported with FREQ=DAILY or FREQ=WEEKLY')
+        return cls(freq, interval, count, until, byday, bymonthday)
+
+
+def _parse_until(value: str) -> datetime:
+    # UNTIL=20261231 (inclusive day) or UNTIL=20261231T170000Z
+    try:
+        if 'T' in value:
+            return datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S').replace(tzinfo=timezone.utc)
+        return datetime.combine(datetime.strptime(value, '%Y%m%d').date(), time.max, tzinfo=timezone.utc)
+    except ValueError:
+        raise RecurrenceError(f"Malformed UNTIL: {value}") from None
+
+
+def resolve_time_zone(name: str) -> tzinfo:
+    """An IANA zone ("Europe/Berlin") or a fixed offset ("+03:00", "UTC")."""
+    if name.upper() in ('UTC', 'Z'):
+        return timezone.utc
+    match = _OFFSET.match(name)
+    if match:
+        sign, hours, minutes = match.groups()
+        offset = timedelta(hours=int(hours), minutes=int(minutes))
+        return timezone(-offset if sign == '-' else offset)
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise RecurrenceError(f"Unknown time zone: {name}") from None
+
+
+def offset_name(value: datetime) -> str:
+    """The UTC offset of ``value`` as a time zone name, e.g. "+03:00"."""
+    offset = value.utcoffset() or timedelta(0)
+    sign = '-' if offset < timedelta(0) else '+'
+    minutes = abs(int(offset.total_seconds())) // 60
+    return f"{sign}{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _aware(value: datetime) -> datetime:
+    # Naive datetimes are server-local, as everywhere else
+    return value.astimezone() if value.tzinfo is None else value
+
+
+def _month_days(year: int, month: int) -> int:
+    following = date(year + month // 12, month % 12 + 1, 1)
+    return (following - timedelta(days=1)).day
+
+
+def _period_dates(rule: Recurrence, first: date, period: int) -> List[date]:
+    if rule.freq == 'DAILY':
+        day = first + timedelta(days=period * rule.interval)
+        return [day] if not rule.byday or day.weekday() in rule.byday else []
+    if rule.freq == 'WEEKLY':
+        week = first - timedelta(days=first.weekday()) + timedelta(weeks=period * rule.interval)
+        return [week + timedelta(days=weekday) for weekday in (rule.byday or (first.weekday(),))]
+    month = first.month - 1 + period * rule.interval
+    year, month = first.year + month // 12, month % 12 + 1
+    length = _month_days(year, month)
+    days = sorted({day if day > 0 else length + day + 1 for day in (rule.bymonthday or (first.day,))
+                   if abs(day) <= length})
+    return [date(year, month, day) for day in days]
+
+
+def _candidate_dates(rule: Recurrence, first: date, from_period: int) -> Iterator[date]:
+    """Dates the rule allows, in order, starting with period ``from_period``.
+
+    Stops after MAX_EMPTY_PERIODS consecutive periods without a date.
+    """
+    period = from_period
+    empty = 0
+    while empty < MAX_EMPTY_PERIODS:
+        try:
+            dates = _period_dates(rule, first, period)
+        except (OverflowError, ValueError):
+            # Past date.max: an endless series queried without a window end
+            return
+
+        # The first period can hold dates before the series starts
+        dates = [day for day in dates if day >= first]
+        empty = 0 if dates else empty + 1
+        yield from dates
+        period += 1
+
+
+def _first_period(rule: Recurrence, first: date, target: date) -> int:
+    """The earliest period that can hold ``target``."""
+    if target <= first:
+        return 0
+    if rule.freq == 'DAILY':
+        return (target - first).days // rule.interval
+    if rule.freq == 'WEEKLY':
+        week = first - timedelta(days=first.weekday())
+        return (target - week).days // (7 * rule.interval)
+    return ((target.year - first.year) * 12 + target.month - first.month) // rule.interval
+
+
+def occurrence_starts(series: RecurringAppointment, window_start: Optional[datetime] = None,
+                      window_end: Optional[datetime] = None) -> Iterator[datetime]:
+    """Starts of the series' occurrences that overlap [window_start, window_end), in order.
+
+    Exceptions are skipped. Without a window end the generator only stops
+    where the rule does.
+    """
+    rule = Recurrence.parse(series.rrule)
+    zone = resolve_time_zone(series.time_zone)
+    first_start = series.start_time.astimezone(zone)
+    length = series.end_time - series.start_time
+    first = first_start.date()
+    until = series.until
+
+    period = 0
+    if window_start is not None:
+        window_start = _aware(window_start)
+        # An occurrence overlaps the window if it starts after window_start - length
+        period = _first_period(rule, first, (window_start - length).astimezone(zone).date())
+    window_end = _aware(window_end) if window_end is not None else None
+    exdates = set(series.exdates)
+
+    for day in _candidate_dates(rule, first, period):
+        start = datetime.combine(day, first_start.timetz()).replace(tzinfo=zone)
+        if (until is not None and start > until) or (window_end is not None and start >= window_end):
+            return
+        if day in exdates or (window_start is not None and start + length <= window_start):
+            continue
+        yield start
+
+
+def series_until(series: RecurringAppointment) -> Optional[datetime]:
+    """Start of the last occurrence the rule allows (COUNT resolved), None if it never ends."""
+    rule = Recurrence.parse(series.rrule)
+    if rule.count is None:
+        return rule.until
+    # Exceptions don't give back occurrences, so count with none applied
+    last = None
+    for index, start in enumerate(occurrence_starts(series.replace(exdates=[], until=None))):
+        last = start
+        if index + 1 == rule.count:
+            break
+    return last
+
+
+def series_end(series: RecurringAppointment) -> Optional[datetime]:
+    """End of the series' last occurrence, None if it never ends."""
+    return series.until + (series.end_time - series.start_time) if series.until else None
+
+
+def _cycle_days(rule: Recurrence) -> int:
+    """Days after which the rule's dates repeat, shifted by that many days."""
+    if rule.freq == 'DAILY':
+        return lcm(rule.interval, 7) if rule.byday else rule.interval
+    if rule.freq == 'WEEKLY':
+        return 7 * rule.interval
+    return lcm(rule.interval, 4800) // 4800 * GREGORIAN_CYCLE_DAYS
+
+
+def clash_window_end(series: RecurringAppointment, other: RecurringAppointment) -> datetime:
+    """Time by which the two series' occurrences have clashed, if they ever do.
+
+    Two endless series fall into a joint cycle once both have started and
+    their last exceptions are past, so one cycle from there covers them.
+    Occurrences keep local wall-clock times, so the span is never shorter
+    than a year of daylight-saving changes.
+    """
+    ends = [end for end in (series_end(series), series_end(other)) if end]
+    if ends:
+        return min(ends)
+
+    settled = max(series.start_time, other.start_time)
+    exdates = series.exdates + other.exdates
+    if exdates:
+        # A day's margin either side of UTC for the series' time zone
+        settled = max(settled, datetime.combine(max(exdates) + timedelta(days=2), time(), tzinfo=timezone.utc))
+    cycle = timedelta(days=lcm(_cycle_days(Recurrence.parse(series.rrule)),
+                               _cycle_days(Recurrence.parse(other.rrule))))
+    length = max(series.end_time - series.start_time, other.end_time - other.start_time)
+    return settled + max(cycle, MIN_CLASH_SPAN) + length
+
+
+def occurrence(series: RecurringAppointment, start: datetime) -> Appointment:
+    return Appointment(
+        id=f"{series.id}:{start.date().isoformat()}",
+        title=series.title,
+        description=series.description,
+        start_time=start,
+        end_time=start + (series.end_time - series.start_time),
+        attendees=series.attendees,
+        location=series.location,
+        status='scheduled',
+        created_at=series.created_at,
+        updated_at=series.updated_at,
+        recurrence_id=series.id
+    )
+
+
+def occurrences(series: RecurringAppointment, window_start: Optional[datetime] = None,
+                window_end: Optional[datetime] = None) -> Iterator[Appointment]:
+    for start in occurrence_starts(series, window_start, window_end):
+        yield occurrence(series, start)
+
+
+def sort_key(appointment: Appointment) -> Tuple[datetime, str]:
+    return appointment.start_time, appointment.id
+
+
+def expand(series_list: List[RecurringAppointment], window_start: Optional[datetime],
+           window_end: Optional[datetime]) -> Iterator[Appointment]:
+    """Occurrences of several series overlapping the window, merged in (start_time, id) order."""
+    return heapq.merge(*(occurrences(series, window_start, window_end) for series in series_list),
+                       key=sort_key)
+
+
+def by_participant(occurrence_list: List[Appointment], participants: List[str]) -> Dict[str, List]:
+    """(start, end) of the occurrences each participant key attends, in start order."""
+    intervals = {key: [] for key in participants}
+    for item in occurrence_list:
+        for key in participant_keys(item.attendees):
+            if key in intervals:
+                intervals[key].append((item.start_time, item.end_time))
+    return intervals
+
+
+def list_window(start_date: Optional[datetime], end_date: Optional[datetime],
+                horizon_days: int) -> Tuple[Optional[datetime], datetime]:
+    """Window to expand for a list query; lists without an end stop ``horizon_days`` after today (UTC)."""
+    if end_date:
+        return start_date, end_date
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return start_date, today + timedelta(days=horizon_days)
+
+
+def listed(occurrence_list: Iterable[Appointment], start_date: Optional[datetime] = None,
+           end_date: Optional[datetime] = None,
+           after: Optional[Tuple[datetime, str]] = None) -> Iterator[Appointment]:
+    """The occurrences a list query would return: starting at or after start_date,
+    ending by end_date and after the cursor, as storage.list filters rows."""
+    start_date = _aware(start_date) if start_date else None
+    end_date = _aware(end_date) if end_date else None
+    after = (_aware(after[0]), after[1]) if after else None
+    for item in occurrence_list:
+        if start_date and item.start_time < start_date:
+            continue
+        if end_date and item.end_time > end_date:
+            continue
+        if after and sort_key(item) <= after:
+            continue
+        yield item
+
+
+def merge_listed(appointments: Iterable[Appointment], occurrence_list: Iterable[Appointment],
+                 limit: Optional[int] = None) -> List[Appointment]:
+    """Stored appointments and occurrences, both in (start_time, id) order, as one page."""
+    merged = heapq.merge(appointments, occurrence_list, key=sort_key)
+    return list(islice(merged, limit)) if limit else list(merged)
+
+
+def first_overlap(intervals: List[Tuple[datetime, datetime]],
+                  occurrence_list: Iterable[Appointment]) -> Optional[Appointment]:
+    """The first occurrence overlapping one of ``intervals`` (sorted and merged), if any."""
+    index = 0
+    for item in occurrence_list:
+        while index < len(intervals) and intervals[index][1] <= item.start_time:
+            index += 1
+        if index == len(intervals):
+            return None
+        if intervals[index][0] < item.end_time:
+            return item
+    return None
@@ -0,0 +1,81 @@
+"""Coalescing of identical concurrent reads ("single flight").
+
+When several callers ask for the same key at once, only the first runs
+the computation; the others wait for it and share its result (or its
+exception). Nothing is kept once the call finishes, so this complements
+the read-through caches rather than replacing them: it removes duplicate
+work during bursts such as every client asking for today's availability
+at the top of the hour.
+
+Keys are tuples whose first element names the operation; counts of
+executed and shared calls are kept per operation. Shared results are
+handed to every caller, so they must be treated as read-only.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    def __init__(self, counter=None):
+        # counter: optional metrics.Counter labelled (operation, outcome)
+        self.counter = counter
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._counts_lock = threading.Lock()
+
+    def do(self, key: Tuple, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            self._count(key[0], 'shared')
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+            self._count(key[0], 'executed')
+        return call.result
+
+    def forget(self):
+        """Make calls already in flight unjoinable, e.g. after a write they may not reflect."""
+        with self._lock:
+            self._calls.clear()
+
+    def _count(self, operation: str, outcome: str):
+        with self._counts_lock:
+            counts = self._counts.setdefault(operation, {'executed': 0, 'shared': 0})
+            counts[outcome] += 1
+        if self.counter is not None:
+            self.counter.inc(operation, outcome)
+
+    def stats(self) -> Dict:
+        with self._counts_lock:
+            stats = {}
+            for operation, counts in self._counts.items():
+                calls = counts['executed'] + counts['shared']
+                stats[operation] = dict(counts, shared_ratio=round(counts['shared'] / calls, 4) if calls else 0.0)
+            return stats
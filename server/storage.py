@@ -0,0 +1,1218 @@
+"""Storage backends behind AppointmentService.
+
+``PostgresStorage`` is the production backend; main only chooses and
+constructs a backend from ``STORAGE_BACKEND``. The two embedded backends
+have the same behaviour, including the rule that scheduled appointments
+never overlap and the change version used for ETags and the per-day busy
+bitmaps (see busy_bitmap.py). They also store recurring series, whose
+occurrences are expanded on read (see recurrence.py) and never written as
+appointment rows:
+
+- ``SQLiteStorage``: one database file, for single-node deployments
+- ``MemoryStorage``: process-local, for tests and hermetic benchmarks
+
+Every backend takes and returns ``models.Appointment`` objects. Scheduled
+appointments never overlap, so sorted by start time their end times are
+sorted too; the embedded backends use that to answer overlap checks with
+two index lookups instead of a range scan.
+"""
+import json
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from bulk_import import BULK_INSERT_QUERY, BulkImport, run_import
+from busy_bitmap import DAY, day_bits, day_start, days_touched, from_bytes, to_bytes
+from conditional import CHANGE_VERSION_QUERY
+from metrics import statement_type
+from models import Appointment, RecurringAppointment, participant_keys
+
+Interval = Tuple[datetime, datetime]
+
+MEMORY_SESSION_TURNS = 100
+
+# Advisory lock taken by PostgresStorage.series_guard; any constant unique to this app
+SERIES_LOCK_KEY = 0x5CED
+
+
+class AppointmentConflict(Exception):
+    """Raised when a write would overlap an existing scheduled appointment."""
+
+    def __init__(self, conflict: Optional[Appointment]):
+        super().__init__('Appointment conflicts with an existing appointment')
+        self.conflict = conflict
+
+
+class SharedLock:
+    """Any number of shared holders or one exclusive holder; waiting exclusive
+    holders go ahead of new shared ones so they can't be starved."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._shared = 0
+        self._exclusive = False
+        self._waiting = 0
+
+    @contextmanager
+    def hold(self, exclusive: bool = False):
+        with self._cond:
+            if exclusive:
+                self._waiting += 1
+                self._cond.wait_for(lambda: not self._exclusive and not self._shared)
+                self._waiting -= 1
+                self._exclusive = True
+            else:
+                self._cond.wait_for(lambda: not self._exclusive and not self._waiting)
+                self._shared += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                if exclusive:
+                    self._exclusive = False
+                else:
+                    self._shared -= 1
+                self._cond.notify_all()
+
+
+def _aware(value: datetime) -> datetime:
+    # Naive datetimes are local time, as Postgres reads them for timestamptz
+    return value.astimezone() if value.tzinfo is None else value
+
+
+def _series_in_window(series: RecurringAppointment, start: Optional[datetime], end: Optional[datetime]) -> bool:
+    if end and series.start_time >= _aware(end):
+        return False
+    # The last occurrence ends a series length after it starts
+    return not (start and series.until and
+                series.until + (series.end_time - series.start_time) <= _aware(start))
+
+
+def _from_import_row(row: tuple) -> Appointment:
+    """Appointment from a row in bulk_import.BULK_INSERT_QUERY column order."""
+    appointment_id, title, description, start_time, end_time, attendees, location, status, created_at = row
+    return Appointment(id=appointment_id, title=title, description=description, start_time=_aware(start_time),
+                       end_time=_aware(end_time), attendees=json.loads(attendees), location=location,
+                       status=status, created_at=_aware(created_at))
+
+
+class AppointmentStorage:
+    name = ''
+
+    def init_schema(self):
+        """Create tables and indexes if they don't exist."""
+
+    def change_version(self) -> Tuple[int, Optional[datetime]]:
+        """The change version and, if the backend records it, when it last changed."""
+        raise NotImplementedError
+
+    def get(self, appointment_id: str) -> Optional[Appointment]:
+        raise NotImplementedError
+
+    def list(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+             after: Optional[Tuple[datetime, str]] = None, limit: Optional[int] = None) -> List[Appointment]:
+        """Scheduled appointments within [start_date, end_date], ordered by (start_time, id)."""
+        raise NotImplementedError
+
+    def stream(self, start_date: Optional[datetime] = None,
+               end_date: Optional[datetime] = None) -> Iterator[Appointment]:
+        return iter(self.list(start_date, end_date))
+
+    def busy_intervals(self, start: datetime, end: datetime) -> List[Interval]:
+        """(start, end) of scheduled appointments overlapping [start, end), ordered by start."""
+        raise NotImplementedError
+
+    def find_conflict(self, start_time: datetime, end_time: datetime,
+                      exclude_id: str = '') -> Optional[Appointment]:
+        """The earliest scheduled appointment overlapping [start_time, end_time), if any."""
+        raise NotImplementedError
+
+    def insert(self, appointment: Appointment) -> Appointment:
+        """Store a new appointment; raises AppointmentConflict if it would overlap."""
+        raise NotImplementedError
+
+    def update(self, appointment_id: str, fields: Dict) -> Optional[Appointment]:
+        """Apply column changes; None if the appointment doesn't exist."""
+        raise NotImplementedError
+
+    def cancel(self, appointment_id: str) -> bool:
+        raise NotImplementedError
+
+    def bulk_import(self, job: BulkImport, records: Iterable):
+        """Write every valid record of ``job`` in one transaction, skipping overlaps."""
+        raise NotImplementedError
+
+    def participant_busy_intervals(self, participants: List[str], start: datetime,
+                                   end: datetime) -> Dict[str, List[Interval]]:
+        """Per participant key (see models.participant_keys), the (start, end) of scheduled
+        appointments they attend overlapping [start, end), ordered by start."""
+        raise NotImplementedError
+
+    def busy_bitmaps(self, first_day: date, last_day: date) -> Dict[date, int]:
+        """Busy bitmaps of the UTC days first_day..last_day; days with nothing booked may be missing."""
+        raise NotImplementedError
+
+    def rebuild_busy_bitmaps(self) -> int:
+        """Recompute every bitmap from the appointments; returns the number of days with bookings."""
+        raise NotImplementedError
+
+    def series_guard(self, exclusive: bool = False):
+        """Context manager held across checking a write against recurring series and making it.
+
+        Occurrences aren't rows, so no constraint catches an appointment and a
+        series clashing. Appointment writes hold the guard shared and only wait
+        for series writes, which hold it exclusively.
+        """
+        raise NotImplementedError
+
+    def insert_recurring(self, series: RecurringAppointment) -> RecurringAppointment:
+        raise NotImplementedError
+
+    def get_recurring(self, series_id: str) -> Optional[RecurringAppointment]:
+        raise NotImplementedError
+
+    def list_recurring(self, start: Optional[datetime] = None,
+                       end: Optional[datetime] = None) -> List[RecurringAppointment]:
+        """Active series that can have occurrences overlapping [start, end), ordered by first start."""
+        raise NotImplementedError
+
+    def update_recurring(self, series_id: str, fields: Dict) -> Optional[RecurringAppointment]:
+        """Apply changes (e.g. exdates, status); None if the series doesn't exist."""
+        raise NotImplementedError
+
+    def recent_turns(self, session_id: str, limit: int) -> List[Dict]:
+        """The newest ``limit`` conversation turns of a session, newest first."""
+        raise NotImplementedError
+
+    def add_turns(self, session_id: str, turns: List[Dict]):
+        """Append turns (sender, message, intent, metadata, created_at) to a session."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        return {'backend': self.name}
+
+
+def is_exclusion_violation(error: Exception) -> bool:
+    # SQLSTATE 23P01, exposed by psycopg2 as pgcode
+    return getattr(error, 'pgcode', None) == '23P01'
+
+
+class PostgresStorage(AppointmentStorage):
+    """Production backend: pooled psycopg2 connections, with overlaps rejected by
+    the appointments_no_overlap constraint. ``database`` is main's DatabaseManager."""
+
+    name = 'postgres'
+
+    GET_QUERY = "SELECT * FROM appointments WHERE id = %s"
+
+    INSERT_QUERY = """
+        INSERT INTO appointments (id, title, description, start_time, end_time, 
+                               attendees, location, status, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING *
+    """
+
+    RANGE_BUSY_QUERY = """
+        SELECT start_time, end_time FROM appointments
+        WHERE status = 'scheduled' AND start_time < %s AND end_time > %s
+        ORDER BY start_time ASC
+    """
+
+    CANCEL_QUERY = "UPDATE appointments SET status = 'cancelled' WHERE id = %s"
+
+    # appointment_participants is kept in sync with attendees by triggers (see database.py)
+    PARTICIPANT_BUSY_QUERY = """
+        SELECT p.email, a.start_time, a.end_time
+        FROM appointment_participants p JOIN appointments a ON a.id = p.appointment_id
+        WHERE p.email = ANY(%s) AND a.status = 'scheduled' AND a.start_time < %s AND a.end_time > %s
+        ORDER BY p.email, a.start_time
+    """
+
+    # Maintained by the appointments_bitmaps_* triggers (see database.py)
+    BUSY_BITMAPS_QUERY = "SELECT day, bits FROM busy_bitmaps WHERE day BETWEEN %s AND %s"
+
+    REBUILD_BITMAPS_QUERY = "SELECT rebuild_all_busy_bitmaps() AS days"
+
+    # Recurring series are stored once; occurrences are expanded on read (see recurrence.py)
+    INSERT_RECURRING_QUERY = """
+        INSERT INTO recurring_appointments (id, title, description, start_time, end_time, rrule, time_zone,
+                                            exdates, until, attendees, location, status, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING *
+    """
+
+    GET_RECURRING_QUERY = "SELECT * FROM recurring_appointments WHERE id = %s"
+
+    # Newest first, from idx_conversation_history_user_created
+    RECENT_TURNS_QUERY = """
+        SELECT sender, message, intent, metadata, created_at FROM conversation_history
+        WHERE user_id = %s
+        ORDER BY created_at DESC
+        LIMIT %s
+    """
+
+    # Answered from the GiST index behind the appointments_no_overlap constraint
+    CONFLICT_QUERY = """
+        SELECT * FROM appointments
+        WHERE status = 'scheduled' AND id <> %s AND time_range && tstzrange(%s, %s, '[)')
+        ORDER BY start_time ASC
+        LIMIT 1
+    """
+
+    def __init__(self, database):
+        self.db = database
+
+    @staticmethod
+    def insert_params(appointment: Appointment) -> tuple:
+        return (
+            appointment.id,
+            appointment.title,
+            appointment.description,
+            appointment.start_time,
+            appointment.end_time,
+            json.dumps(appointment.attendees),
+            appointment.location,
+            appointment.status,
+            appointment.created_at
+        )
+
+    @staticmethod
+    def build_list_query(start_date: Optional[datetime] = None,
+                         end_date: Optional[datetime] = None,
+                         after: Optional[Tuple[datetime, str]] = None,
+                         limit: Optional[int] = None) -> Tuple[str, tuple]:
+        query = "SELECT * FROM appointments WHERE status = 'scheduled'"
+        params = []
+
+        if start_date:
+            query += " AND start_time >= %s"
+            params.append(start_date)
+
+        if end_date:
+            query += " AND end_time <= %s"
+            params.append(end_date)
+
+        if after:
+            # Keyset pagination: continue strictly after the last (start_time, id) seen
+            query += " AND (start_time, id) > (%s, %s)"
+            params.extend(after)
+
+        query += " ORDER BY start_time ASC, id ASC"
+
+        if limit:
+            query += " LIMIT %s"
+            params.append(limit)
+
+        return query, tuple(params)
+
+    @staticmethod
+    def build_update(appointment_id: str, fields: Dict) -> Tuple[str, tuple]:
+        """UPDATE ... RETURNING * setting the given column values."""
+        assignments = ', '.join(f"{column} = %s" for column in fields)
+        params = [json.dumps(value) if column == 'attendees' else value for column, value in fields.items()]
+        params.append(appointment_id)
+
+        return f"UPDATE appointments SET {assignments} WHERE id = %s RETURNING *", tuple(params)
+
+    @staticmethod
+    def recurring_params(series: RecurringAppointment) -> tuple:
+        return (
+            series.id,
+            series.title,
+            series.description,
+            series.start_time,
+            series.end_time,
+            series.rrule,
+            series.time_zone,
+            json.dumps([day.isoformat() for day in series.exdates]),
+            series.until,
+            json.dumps(series.attendees),
+            series.location,
+            series.status,
+            series.created_at
+        )
+
+    @staticmethod
+    def build_recurring_query(start: Optional[datetime] = None,
+                              end: Optional[datetime] = None) -> Tuple[str, tuple]:
+        """Active series that can have occurrences overlapping [start, end)."""
+        query = "SELECT * FROM recurring_appointments WHERE status = 'active'"
+        params = []
+
+        if end:
+            query += " AND start_time < %s"
+            params.append(end)
+
+        if start:
+            # until is the last occurrence's start; NULL if the series never ends
+            query += " AND (until IS NULL OR until + (end_time - start_time) > %s)"
+            params.append(start)
+
+        return query + " ORDER BY start_time ASC, id ASC", tuple(params)
+
+    @staticmethod
+    def build_recurring_update(series_id: str, fields: Dict) -> Tuple[str, tuple]:
+        assignments = ', '.join(f"{column} = %s" for column in fields)
+        params = []
+        for column, value in fields.items():
+            if column == 'exdates':
+                value = json.dumps([day.isoformat() for day in value])
+            elif column == 'attendees':
+                value = json.dumps(value)
+            params.append(value)
+        params.append(series_id)
+
+        return f"UPDATE recurring_appointments SET {assignments} WHERE id = %s RETURNING *", tuple(params)
+
+    def init_schema(self):
+        from database import init_database
+        init_database()
+
+    def change_version(self) -> Tuple[int, Optional[datetime]]:
+        row = self.db.execute_query(CHANGE_VERSION_QUERY)[0]
+        return row['version'], row['changed_at']
+
+    def get(self, appointment_id: str) -> Optional[Appointment]:
+        results = self.db.execute_query(self.GET_QUERY, (appointment_id,))
+        return Appointment.from_row(results[0]) if results else None
+
+    def list(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+             after: Optional[Tuple[datetime, str]] = None, limit: Optional[int] = None) -> List[Appointment]:
+        query, params = self.build_list_query(start_date, end_date, after, limit)
+        return [Appointment.from_row(row) for row in self.db.execute_query(query, params)]
+
+    def stream(self, start_date: Optional[datetime] = None,
+               end_date: Optional[datetime] = None) -> Iterator[Appointment]:
+        query, params = self.build_list_query(start_date, end_date)
+        for row in self.db.stream_query(query, params):
+            yield Appointment.from_row(row)
+
+    def busy_intervals(self, start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+        rows = self.db.execute_query(self.RANGE_BUSY_QUERY, (end, start))
+        return [(row['start_time'], row['end_time']) for row in rows]
+
+    def find_conflict(self, start_time: datetime, end_time: datetime,
+                      exclude_id: str = '') -> Optional[Appointment]:
+        results = self.db.execute_query(self.CONFLICT_QUERY, (exclude_id, start_time, end_time))
+        return Appointment.from_row(results[0]) if results else None
+
+    def insert(self, appointment: Appointment) -> Appointment:
+        try:
+            # RETURNING * hands back the stored row without a second SELECT
+            rows = self.db.execute_query(self.INSERT_QUERY, self.insert_params(appointment))
+        except Exception as e:
+            if not is_exclusion_violation(e):
+                raise
+            raise AppointmentConflict(self.find_conflict(appointment.start_time, appointment.end_time))
+        return Appointment.from_row(rows[0])
+
+    def update(self, appointment_id: str, fields: Dict) -> Optional[Appointment]:
+        query, params = self.build_update(appointment_id, fields)
+        try:
+            rows = self.db.execute_query(query, params)
+        except Exception as e:
+            if not is_exclusion_violation(e):
+                raise
+            # Report the clash using whichever times the update left unchanged
+            current = self.get(appointment_id)
+            start_time = fields.get('start_time', current and current.start_time)
+            end_time = fields.get('end_time', current and current.end_time)
+            raise AppointmentConflict(self.find_conflict(start_time, end_time, appointment_id))
+        return Appointment.from_row(rows[0]) if rows else None
+
+    def cancel(self, appointment_id: str) -> bool:
+        return self.db.execute_query(self.CANCEL_QUERY, (appointment_id,)) > 0
+
+    def bulk_import(self, job: BulkImport, records: Iterable):
+        with self.db.connection() as conn:
+            try:
+                with conn.cursor() as cursor:
+                    def write(batch) -> set:
+                        started = time.perf_counter()
+                        cursor.execute(BULK_INSERT_QUERY, BulkImport.columns(batch))
+                        inserted = {row['id'] for row in cursor.fetchall()}
+                        self.db.record_query(time.perf_counter() - started, 'insert')
+                        return inserted
+
+                    run_import(job, records, write)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    @staticmethod
+    def group_participant_rows(participants: List[str], rows: Iterable) -> Dict[str, List[Tuple[datetime, datetime]]]:
+        """PARTICIPANT_BUSY_QUERY rows as each participant's intervals, in start order."""
+        intervals = {key: [] for key in participants}
+        for row in rows:
+            intervals[row['email']].append((row['start_time'], row['end_time']))
+        return intervals
+
+    def participant_busy_intervals(self, participants: List[str], start: datetime,
+                                   end: datetime) -> Dict[str, List[Tuple[datetime, datetime]]]:
+        keys = participant_keys(participants)
+        rows = self.db.execute_query(self.PARTICIPANT_BUSY_QUERY, (keys, end, start)) if keys else []
+        return self.group_participant_rows(keys, rows)
+
+    def busy_bitmaps(self, first_day: date, last_day: date) -> Dict[date, int]:
+        rows = self.db.execute_query(self.BUSY_BITMAPS_QUERY, (first_day, last_day))
+        return {row['day']: from_bytes(row['bits']) for row in rows}
+
+    def rebuild_busy_bitmaps(self) -> int:
+        return self.db.execute_query(self.REBUILD_BITMAPS_QUERY)[0]['days']
+
+    @contextmanager
+    def series_guard(self, exclusive: bool = False):
+        # A session-level advisory lock, so it holds across every database process
+        mode = '' if exclusive else '_shared'
+        with self.db.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT pg_advisory_lock{mode}(%s)", (SERIES_LOCK_KEY,))
+            try:
+                yield
+            finally:
+                # Writes commit as they go, so this only ends a read or failed transaction
+                conn.rollback()
+                with conn.cursor() as cursor:
+                    cursor.execute(f"SELECT pg_advisory_unlock{mode}(%s)", (SERIES_LOCK_KEY,))
+                conn.commit()
+
+    def insert_recurring(self, series: RecurringAppointment) -> RecurringAppointment:
+        rows = self.db.execute_query(self.INSERT_RECURRING_QUERY, self.recurring_params(series))
+        return RecurringAppointment.from_row(rows[0])
+
+    def get_recurring(self, series_id: str) -> Optional[RecurringAppointment]:
+        rows = self.db.execute_query(self.GET_RECURRING_QUERY, (series_id,))
+        return RecurringAppointment.from_row(rows[0]) if rows else None
+
+    def list_recurring(self, start: Optional[datetime] = None,
+                       end: Optional[datetime] = None) -> List[RecurringAppointment]:
+        query, params = self.build_recurring_query(start, end)
+        return [RecurringAppointment.from_row(row) for row in self.db.execute_query(query, params)]
+
+    def update_recurring(self, series_id: str, fields: Dict) -> Optional[RecurringAppointment]:
+        rows = self.db.execute_query(*self.build_recurring_update(series_id, fields))
+        return RecurringAppointment.from_row(rows[0]) if rows else None
+
+    @staticmethod
+    def build_add_turns(session_id: str, turns: List[Dict]) -> Tuple[str, tuple]:
+        """One multi-row INSERT for a chat exchange."""
+        values = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(turns))
+        params = []
+        for turn in turns:
+            params.extend((session_id, turn['message'], turn['sender'], turn['intent'],
+                           json.dumps(turn['metadata']), turn['created_at']))
+        query = (f"INSERT INTO conversation_history (user_id, message, sender, intent, metadata, created_at) "
+                 f"VALUES {values}")
+        return query, tuple(params)
+
+    def recent_turns(self, session_id: str, limit: int) -> List[Dict]:
+        return self.db.execute_query(self.RECENT_TURNS_QUERY, (session_id, limit))
+
+    def add_turns(self, session_id: str, turns: List[Dict]):
+        query, params = self.build_add_turns(session_id, turns)
+        self.db.execute_query(query, params)
+
+    def stats(self) -> Dict:
+        return dict(self.db.stats(), backend=self.name)
+
+
+class MemoryStorage(AppointmentStorage):
+    name = 'memory'
+
+    def __init__(self):
+        self._appointments: Dict[str, Appointment] = {}
+        self._schedule: List[Tuple[datetime, str]] = []  # (start_time, id) of scheduled, sorted
+        self._lock = threading.RLock()
+        self._conversations: Dict[str, deque] = {}
+        self._participants: Dict[str, List[Tuple[datetime, str]]] = {}  # key -> (start_time, id), sorted
+        self._bitmaps: Dict[date, int] = {}
+        self._stale_days: Set[date] = set()
+        self._recurring: Dict[str, RecurringAppointment] = {}
+        self._version = 0
+        self._changed_at = datetime.now(timezone.utc)
+        self._series_lock = SharedLock()
+
+    def _changed(self):
+        self._version += 1
+        self._changed_at = datetime.now(timezone.utc)
+        self._refresh_bitmaps(self._stale_days)
+        self._stale_days = set()
+
+    def _add(self, appointment: Appointment):
+        self._appointments[appointment.id] = appointment
+        if appointment.status == 'scheduled':
+            insort(self._schedule, (appointment.start_time, appointment.id))
+            for key in participant_keys(appointment.attendees):
+                insort(self._participants.setdefault(key, []), (appointment.start_time, appointment.id))
+            self._stale_days.update(days_touched(appointment.start_time, appointment.end_time))
+
+    def _remove(self, appointment: Appointment):
+        if appointment.status == 'scheduled':
+            index = bisect_left(self._schedule, (appointment.start_time, appointment.id))
+            del self._schedule[index]
+            for key in participant_keys(appointment.attendees):
+                schedule = self._participants[key]
+                del schedule[bisect_left(schedule, (appointment.start_time, appointment.id))]
+                if not schedule:
+                    del self._participants[key]
+            self._stale_days.update(days_touched(appointment.start_time, appointment.end_time))
+
+    def _refresh_bitmaps(self, days: Iterable[date]):
+        for day in days:
+            bits = day_bits(self.busy_intervals(day_start(day), day_start(day) + DAY), day)
+            if bits:
+                self._bitmaps[day] = bits
+            else:
+                self._bitmaps.pop(day, None)
+
+    def _conflict(self, start_time: datetime, end_time: datetime, exclude_id: str) -> Optional[Appointment]:
+        index = bisect_left(self._schedule, (start_time,))
+
+        # Only the last appointment starting before start_time can cover it
+        before = index - 1
+        if before >= 0 and self._schedule[before][1] == exclude_id:
+            before -= 1
+        if before >= 0:
+            other = self._appointments[self._schedule[before][1]]
+            if other.end_time > start_time:
+                return other
+
+        while index < len(self._schedule) and self._schedule[index][0] < end_time:
+            if self._schedule[index][1] != exclude_id:
+                return self._appointments[self._schedule[index][1]]
+            index += 1
+        return None
+
+    def change_version(self) -> Tuple[int, datetime]:
+        return self._version, self._changed_at
+
+    def get(self, appointment_id: str) -> Optional[Appointment]:
+        return self._appointments.get(appointment_id)
+
+    def list(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+             after: Optional[Tuple[datetime, str]] = None, limit: Optional[int] = None) -> List[Appointment]:
+        with self._lock:
+            index = bisect_left(self._schedule, (_aware(start_date),)) if start_date else 0
+            if after:
+                index = max(index, bisect_right(self._schedule, (_aware(after[0]), after[1])))
+            end_date = _aware(end_date) if end_date else None
+
+            appointments = []
+            while index < len(self._schedule) and not (limit and len(appointments) >= limit):
+                appointment = self._appointments[self._schedule[index][1]]
+                # End times are sorted too, so nothing later can end before end_date
+                if end_date and appointment.end_time > end_date:
+                    break
+                appointments.append(appointment)
+                index += 1
+            return appointments
+
+    def _busy(self, schedule: List[Tuple[datetime, str]], start: datetime, end: datetime) -> List[Interval]:
+        index = bisect_left(schedule, (start,))
+        if index > 0 and self._appointments[schedule[index - 1][1]].end_time > start:
+            index -= 1
+        intervals = []
+        while index < len(schedule) and schedule[index][0] < end:
+            appointment = self._appointments[schedule[index][1]]
+            intervals.append((appointment.start_time, appointment.end_time))
+            index += 1
+        return intervals
+
+    def busy_intervals(self, start: datetime, end: datetime) -> List[Interval]:
+        with self._lock:
+            return self._busy(self._schedule, _aware(start), _aware(end))
+
+    def participant_busy_intervals(self, participants: List[str], start: datetime,
+                                   end: datetime) -> Dict[str, List[Interval]]:
+        start, end = _aware(start), _aware(end)
+        with self._lock:
+            # A participant's appointments are a subset of the schedule, so they don't overlap either
+            return {key: self._busy(self._participants.get(key, []), start, end)
+                    for key in participant_keys(participants)}
+
+    def find_conflict(self, start_time: datetime, end_time: datetime,
+                      exclude_id: str = '') -> Optional[Appointment]:
+        with self._lock:
+            return self._conflict(_aware(start_time), _aware(end_time), exclude_id)
+
+    def insert(self, appointment: Appointment) -> Appointment:
+        appointment = appointment.replace(start_time=_aware(appointment.start_time),
+                                          end_time=_aware(appointment.end_time))
+        with self._lock:
+            if appointment.status == 'scheduled':
+                conflict = self._conflict(appointment.start_time, appointment.end_time, '')
+                if conflict:
+                    raise AppointmentConflict(conflict)
+            self._add(appointment)
+            self._changed()
+        return appointment
+
+    def update(self, appointment_id: str, fields: Dict) -> Optional[Appointment]:
+        fields = {name: _aware(value) if isinstance(value, datetime) else value
+                  for name, value in fields.items()}
+        with self._lock:
+            current = self._appointments.get(appointment_id)
+            if current is None:
+                return None
+            updated = current.replace(**fields)
+            if updated.status == 'scheduled':
+                conflict = self._conflict(updated.start_time, updated.end_time, appointment_id)
+                if conflict:
+                    raise AppointmentConflict(conflict)
+            self._remove(current)
+            self._add(updated)
+            self._changed()
+            return updated
+
+    def cancel(self, appointment_id: str) -> bool:
+        with self._lock:
+            current = self._appointments.get(appointment_id)
+            if current is None:
+                return False
+            self._remove(current)
+            self._add(current.replace(status='cancelled'))
+            self._changed()
+            return True
+
+    def busy_bitmaps(self, first_day: date, last_day: date) -> Dict[date, int]:
+        with self._lock:
+            return {day: bits for day, bits in self._bitmaps.items() if first_day <= day <= last_day}
+
+    def rebuild_busy_bitmaps(self) -> int:
+        with self._lock:
+            days = set()
+            for _, appointment_id in self._schedule:
+                appointment = self._appointments[appointment_id]
+                days.update(days_touched(appointment.start_time, appointment.end_time))
+            self._bitmaps = {}
+            self._refresh_bitmaps(days)
+            return len(days)
+
+    def bulk_import(self, job: BulkImport, records: Iterable):
+        def write(batch) -> set:
+            inserted = set()
+            for _, row in batch:
+                appointment = _from_import_row(row)
+                if appointment.status == 'scheduled' and \
+                        self._conflict(appointment.start_time, appointment.end_time, ''):
+                    continue
+                self._add(appointment)
+                inserted.add(appointment.id)
+            return inserted
+
+        with self._lock:
+            run_import(job, records, write)
+            self._changed()
+
+    def series_guard(self, exclusive: bool = False):
+        return self._series_lock.hold(exclusive)
+
+    def insert_recurring(self, series: RecurringAppointment) -> RecurringAppointment:
+        series = series.replace(start_time=_aware(series.start_time), end_time=_aware(series.end_time))
+        with self._lock:
+            self._recurring[series.id] = series
+            self._changed()
+        return series
+
+    def get_recurring(self, series_id: str) -> Optional[RecurringAppointment]:
+        return self._recurring.get(series_id)
+
+    def list_recurring(self, start: Optional[datetime] = None,
+                       end: Optional[datetime] = None) -> List[RecurringAppointment]:
+        with self._lock:
+            return sorted((series for series in self._recurring.values()
+                           if series.status == 'active' and _series_in_window(series, start, end)),
+                          key=lambda series: (series.start_time, series.id))
+
+    def update_recurring(self, series_id: str, fields: Dict) -> Optional[RecurringAppointment]:
+        with self._lock:
+            current = self._recurring.get(series_id)
+            if current is None:
+                return None
+            updated = self._recurring[series_id] = current.replace(**fields)
+            self._changed()
+            return updated
+
+    def recent_turns(self, session_id: str, limit: int) -> List[Dict]:
+        with self._lock:
+            turns = self._conversations.get(session_id, ())
+            return [dict(turn) for turn in reversed(turns)][:limit]
+
+    def add_turns(self, session_id: str, turns: List[Dict]):
+        with self._lock:
+            # Only recent turns are ever read back, so older ones are dropped
+            history = self._conversations.setdefault(session_id, deque(maxlen=MEMORY_SESSION_TURNS))
+            history.extend(dict(turn) for turn in turns)
+
+    def stats(self) -> Dict:
+        return {'backend': self.name, 'appointments': len(self._appointments),
+                'scheduled': len(self._schedule), 'conversations': len(self._conversations),
+                'participants': len(self._participants), 'bitmap_days': len(self._bitmaps),
+                'recurring': len(self._recurring)}
+
+
+class SQLiteStorage(AppointmentStorage):
+    """Single-file backend. Each thread gets its own connection; WAL mode lets
+    readers run alongside the single writer."""
+
+    name = 'sqlite'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS appointments (
+            id TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            description TEXT,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            attendees TEXT NOT NULL DEFAULT '[]',
+            location TEXT,
+            status TEXT NOT NULL DEFAULT 'scheduled',
+            created_at TEXT,
+            updated_at TEXT
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_appointments_scheduled_start_id
+        ON appointments(start_time, id) WHERE status = 'scheduled';
+
+        -- SQLite admits one writer at a time anyway, so a counter row adds no contention
+        CREATE TABLE IF NOT EXISTS appointment_changes (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0,
+            changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+        );
+        INSERT OR IGNORE INTO appointment_changes (id) VALUES (1);
+
+        CREATE TRIGGER IF NOT EXISTS appointments_version_insert AFTER INSERT ON appointments
+        BEGIN
+            UPDATE appointment_changes SET version = version + 1,
+                changed_at = strftime('%Y-%m-%dT%H:%M:%f', 'now');
+        END;
+        CREATE TRIGGER IF NOT EXISTS appointments_version_update AFTER UPDATE ON appointments
+        BEGIN
+            UPDATE appointment_changes SET version = version + 1,
+                changed_at = strftime('%Y-%m-%dT%H:%M:%f', 'now');
+        END;
+        CREATE TRIGGER IF NOT EXISTS appointments_version_delete AFTER DELETE ON appointments
+        BEGIN
+            UPDATE appointment_changes SET version = version + 1,
+                changed_at = strftime('%Y-%m-%dT%H:%M:%f', 'now');
+        END;
+
+        CREATE TABLE IF NOT EXISTS conversation_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT,
+            message TEXT NOT NULL,
+            sender TEXT NOT NULL CHECK (sender IN ('user', 'agent')),
+            intent TEXT,
+            metadata TEXT NOT NULL DEFAULT '{}',
+            created_at TEXT NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_conversation_history_user_created
+        ON conversation_history(user_id, created_at);
+
+        -- One row per attendee of each appointment, kept in sync with attendees
+        CREATE TABLE IF NOT EXISTS appointment_participants (
+            appointment_id TEXT NOT NULL,
+            email TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_appointment_participants_email
+        ON appointment_participants(email, appointment_id);
+        CREATE INDEX IF NOT EXISTS idx_appointment_participants_appointment
+        ON appointment_participants(appointment_id);
+
+        CREATE TRIGGER IF NOT EXISTS appointments_participants_insert AFTER INSERT ON appointments
+        BEGIN
+            INSERT INTO appointment_participants (appointment_id, email)
+            SELECT DISTINCT NEW.id, lower(trim(value)) FROM json_each(NEW.attendees)
+            WHERE type = 'text' AND trim(value) <> '';
+        END;
+        CREATE TRIGGER IF NOT EXISTS appointments_participants_update AFTER UPDATE OF attendees ON appointments
+        BEGIN
+            DELETE FROM appointment_participants WHERE appointment_id = NEW.id;
+            INSERT INTO appointment_participants (appointment_id, email)
+            SELECT DISTINCT NEW.id, lower(trim(value)) FROM json_each(NEW.attendees)
+            WHERE type = 'text' AND trim(value) <> '';
+        END;
+        CREATE TRIGGER IF NOT EXISTS appointments_participants_delete AFTER DELETE ON appointments
+        BEGIN
+            DELETE FROM appointment_participants WHERE appointment_id = OLD.id;
+        END;
+
+        -- Files created before participants were tracked get them once
+        INSERT INTO appointment_participants (appointment_id, email)
+        SELECT DISTINCT appointments.id, lower(trim(value)) FROM appointments, json_each(appointments.attendees)
+        WHERE type = 'text' AND trim(value) <> ''
+        AND NOT EXISTS (SELECT 1 FROM appointment_participants);
+
+        -- Busy bitmap per UTC day (see busy_bitmap.py), written with the appointments
+        CREATE TABLE IF NOT EXISTS busy_bitmaps (
+            day TEXT PRIMARY KEY,
+            bits BLOB NOT NULL
+        );
+
+        -- Recurring series; their occurrences are expanded on read (see recurrence.py)
+        CREATE TABLE IF NOT EXISTS recurring_appointments (
+            id TEXT PRIMARY KEY,
+            title TEXT NOT NULL,
+            description TEXT,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            rrule TEXT NOT NULL,
+            time_zone TEXT NOT NULL,
+            exdates TEXT NOT NULL DEFAULT '[]',
+            until TEXT,
+            attendees TEXT NOT NULL DEFAULT '[]',
+            location TEXT,
+            status TEXT NOT NULL DEFAULT 'active',
+            created_at TEXT,
+            updated_at TEXT
+        );
+
+        CREATE TRIGGER IF NOT EXISTS recurring_appointments_version_insert AFTER INSERT ON recurring_appointments
+        BEGIN
+            UPDATE appointment_changes SET version = version + 1,
+                changed_at = strftime('%Y-%m-%dT%H:%M:%f', 'now');
+        END;
+        CREATE TRIGGER IF NOT EXISTS recurring_appointments_version_update AFTER UPDATE ON recurring_appointments
+        BEGIN
+            UPDATE appointment_changes SET version = version + 1,
+                changed_at = strftime('%Y-%m-%dT%H:%M:%f', 'now');
+        END;
+    """
+
+    COLUMNS = ('id', 'title', 'description', 'start_time', 'end_time', 'attendees', 'location',
+               'status', 'created_at', 'updated_at')
+    RECURRING_COLUMNS = ('id', 'title', 'description', 'start_time', 'end_time', 'rrule', 'time_zone',
+                         'exdates', 'until', 'attendees', 'location', 'status', 'created_at', 'updated_at')
+
+    # Overlap lookups: the one appointment that can cover a start time, then the
+    # first one starting inside the range
+    COVERING_QUERY = """
+        SELECT * FROM appointments
+        WHERE status = 'scheduled' AND id <> ? AND start_time < ?
+        ORDER BY start_time DESC LIMIT 1
+    """
+    STARTING_QUERY = """
+        SELECT * FROM appointments
+        WHERE status = 'scheduled' AND id <> ? AND start_time >= ? AND start_time < ?
+        ORDER BY start_time ASC
+    """
+
+    def __init__(self, path: str, on_query: Optional[Callable[[float, str], None]] = None):
+        self.path = path
+        self.on_query = on_query
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        # Process-local; several processes sharing one file are not guarded against each other
+        self._series_lock = SharedLock()
+
+    @staticmethod
+    def _text(value: Optional[datetime]) -> Optional[str]:
+        # Fixed-width UTC text sorts the same as the instants it encodes
+        if value is None:
+            return None
+        return _aware(value).astimezone(timezone.utc).isoformat(timespec='microseconds')
+
+    @staticmethod
+    def _datetime(value: Optional[str]) -> Optional[datetime]:
+        return datetime.fromisoformat(value) if value else None
+
+    @classmethod
+    def _appointment(cls, row: sqlite3.Row) -> Appointment:
+        return Appointment(
+            id=row['id'],
+            title=row['title'],
+            description=row['description'],
+            start_time=cls._datetime(row['start_time']),
+            end_time=cls._datetime(row['end_time']),
+            attendees=json.loads(row['attendees'] or '[]'),
+            location=row['location'],
+            status=row['status'],
+            created_at=cls._datetime(row['created_at']),
+            updated_at=cls._datetime(row['updated_at'])
+        )
+
+    @classmethod
+    def _series(cls, row: sqlite3.Row) -> RecurringAppointment:
+        return RecurringAppointment.from_row(dict(
+            row, start_time=cls._datetime(row['start_time']), end_time=cls._datetime(row['end_time']),
+            until=cls._datetime(row['until']), created_at=cls._datetime(row['created_at']),
+            updated_at=cls._datetime(row['updated_at'])))
+
+    def _series_row(self, series: RecurringAppointment) -> tuple:
+        return (series.id, series.title, series.description, self._text(series.start_time),
+                self._text(series.end_time), series.rrule, series.time_zone,
+                json.dumps([day.isoformat() for day in series.exdates]), self._text(series.until),
+                json.dumps(series.attendees), series.location, series.status,
+                self._text(series.created_at), self._text(series.updated_at))
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode; writes open their own BEGIN IMMEDIATE transaction
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._ensure_schema(conn)
+            self._local.conn = conn
+        return conn
+
+    def _ensure_schema(self, conn: sqlite3.Connection):
+        with self._schema_lock:
+            if not self._schema_ready:
+                conn.executescript(self.SCHEMA)
+                self._schema_ready = True
+
+    def _execute(self, query: str, params: tuple = ()) -> sqlite3.Cursor:
+        started = time.perf_counter()
+        try:
+            return self._connection().execute(query, params)
+        finally:
+            if self.on_query:
+                self.on_query(time.perf_counter() - started, statement_type(query))
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def init_schema(self):
+        # The schema is created by the first connection opened
+        self._connection()
+
+    def change_version(self) -> Tuple[int, datetime]:
+        row = self._execute("SELECT version, changed_at FROM appointment_changes WHERE id = 1").fetchone()
+        return row['version'], self._datetime(row['changed_at']).replace(tzinfo=timezone.utc)
+
+    def get(self, appointment_id: str) -> Optional[Appointment]:
+        row = self._execute("SELECT * FROM appointments WHERE id = ?", (appointment_id,)).fetchone()
+        return self._appointment(row) if row else None
+
+    def _list_query(self, start_date, end_date, after=None, limit=None) -> Tuple[str, tuple]:
+        query = "SELECT * FROM appointments WHERE status = 'scheduled'"
+        params = []
+        if start_date:
+            query += " AND start_time >= ?"
+            params.append(self._text(start_date))
+        if end_date:
+            query += " AND end_time <= ?"
+            params.append(self._text(end_date))
+        if after:
+            query += " AND (start_time, id) > (?, ?)"
+            params.extend((self._text(after[0]), after[1]))
+        query += " ORDER BY start_time ASC, id ASC"
+        if limit:
+            query += " LIMIT ?"
+            params.append(limit)
+        return query, tuple(params)
+
+    def list(self, start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+             after: Optional[Tuple[datetime, str]] = None, limit: Optional[int] = None) -> List[Appointment]:
+        query, params = self._list_query(start_date, end_date, after, limit)
+        return [self._appointment(row) for row in self._execute(query, params)]
+
+    def stream(self, start_date: Optional[datetime] = None,
+               end_date: Optional[datetime] = None) -> Iterator[Appointment]:
+        query, params = self._list_query(start_date, end_date)
+        for row in self._execute(query, params):
+            yield self._appointment(row)
+
+    def _overlapping(self, start_time: datetime, end_time: datetime, exclude_id: str = '') -> List[sqlite3.Row]:
+        start, end = self._text(start_time), self._text(end_time)
+        rows = []
+        covering = self._execute(self.COVERING_QUERY, (exclude_id, start)).fetchone()
+        if covering and covering['end_time'] > start:
+            rows.append(covering)
+        rows.extend(self._execute(self.STARTING_QUERY, (exclude_id, start, end)))
+        return rows
+
+    def busy_intervals(self, start: datetime, end: datetime) -> List[Interval]:
+        return [(self._datetime(row['start_time']), self._datetime(row['end_time']))
+                for row in self._overlapping(start, end)]
+
+    def participant_busy_intervals(self, participants: List[str], start: datetime,
+                                   end: datetime) -> Dict[str, List[Interval]]:
+        keys = participant_keys(participants)
+        intervals = {key: [] for key in keys}
+        if not keys:
+            return intervals
+        rows = self._execute(
+            "SELECT p.email, a.start_time, a.end_time FROM appointment_participants p "
+            "JOIN appointments a ON a.id = p.appointment_id "
+            f"WHERE p.email IN ({', '.join('?' * len(keys))}) AND a.status = 'scheduled' "
+            "AND a.start_time < ? AND a.end_time > ? ORDER BY p.email, a.start_time",
+            tuple(keys) + (self._text(end), self._text(start)))
+        for row in rows:
+            intervals[row['email']].append((self._datetime(row['start_time']), self._datetime(row['end_time'])))
+        return intervals
+
+    def find_conflict(self, start_time: datetime, end_time: datetime,
+                      exclude_id: str = '') -> Optional[Appointment]:
+        start, end = self._text(start_time), self._text(end_time)
+        row = self._execute(self.COVERING_QUERY, (exclude_id, start)).fetchone()
+        if not (row and row['end_time'] > start):
+            row = self._execute(self.STARTING_QUERY + " LIMIT 1", (exclude_id, start, end)).fetchone()
+        return self._appointment(row) if row else None
+
+    def _row(self, appointment: Appointment) -> tuple:
+        return (appointment.id, appointment.title, appointment.description,
+                self._text(appointment.start_time), self._text(appointment.end_time),
+                json.dumps(appointment.attendees), appointment.location, appointment.status,
+                self._text(appointment.created_at), self._text(appointment.updated_at))
+
+    def _refresh_bitmaps(self, days: Iterable[date]):
+        """Recompute the bitmaps of ``days`` inside the current transaction."""
+        for day in sorted(days):
+            bits = day_bits(self.busy_intervals(day_start(day), day_start(day) + DAY), day)
+            self._execute("INSERT INTO busy_bitmaps (day, bits) VALUES (?, ?) "
+                          "ON CONFLICT (day) DO UPDATE SET bits = excluded.bits",
+                          (day.isoformat(), to_bytes(bits)))
+
+    def _insert(self, appointment: Appointment) -> Optional[Appointment]:
+        """Insert inside the current transaction; returns the conflict instead if there is one."""
+        if appointment.status == 'scheduled':
+            conflict = self.find_conflict(appointment.start_time, appointment.end_time)
+            if conflict:
+                return conflict
+        self._execute(f"INSERT INTO appointments ({', '.join(self.COLUMNS)}) "
+                      f"VALUES ({', '.join('?' * len(self.COLUMNS))})", self._row(appointment))
+        return None
+
+    def insert(self, appointment: Appointment) -> Appointment:
+        with self._transaction():
+            conflict = self._insert(appointment)
+            if not conflict and appointment.status == 'scheduled':
+                self._refresh_bitmaps(days_touched(appointment.start_time, appointment.end_time))
+        if conflict:
+            raise AppointmentConflict(conflict)
+        return self.get(appointment.id)
+
+    def update(self, appointment_id: str, fields: Dict) -> Optional[Appointment]:
+        with self._transaction():
+            current = self.get(appointment_id)
+            if current is None:
+                return None
+            updated = current.replace(**fields)
+            if updated.status == 'scheduled':
+                conflict = self.find_conflict(updated.start_time, updated.end_time, appointment_id)
+                if conflict:
+                    raise AppointmentConflict(conflict)
+
+            columns = [column for column in self.COLUMNS if column in fields]
+            values = dict(zip(self.COLUMNS, self._row(updated)))
+            self._execute(f"UPDATE appointments SET {', '.join(f'{column} = ?' for column in columns)} "
+                          f"WHERE id = ?", tuple(values[column] for column in columns) + (appointment_id,))
+            self._refresh_bitmaps(set(days_touched(current.start_time, current.end_time)) |
+                                  set(days_touched(updated.start_time, updated.end_time)))
+        return self.get(appointment_id)
+
+    def cancel(self, appointment_id: str) -> bool:
+        with self._transaction():
+            current = self.get(appointment_id)
+            if current is None:
+                return False
+            self._execute("UPDATE appointments SET status = 'cancelled' WHERE id = ?", (appointment_id,))
+            self._refresh_bitmaps(days_touched(current.start_time, current.end_time))
+            return True
+
+    def bulk_import(self, job: BulkImport, records: Iterable):
+        days = set()
+
+        def write(batch) -> set:
+            inserted = set()
+            for _, row in batch:
+                appointment = _from_import_row(row)
+                if self._insert(appointment) is None:
+                    inserted.add(appointment.id)
+                    if appointment.status == 'scheduled':
+                        days.update(days_touched(appointment.start_time, appointment.end_time))
+            return inserted
+
+        with self._transaction():
+            run_import(job, records, write)
+            # Each touched day once, rather than once per imported row
+            self._refresh_bitmaps(days)
+
+    def busy_bitmaps(self, first_day: date, last_day: date) -> Dict[date, int]:
+        rows = self._execute("SELECT day, bits FROM busy_bitmaps WHERE day BETWEEN ? AND ?",
+                             (first_day.isoformat(), last_day.isoformat()))
+        return {date.fromisoformat(row['day']): from_bytes(row['bits']) for row in rows}
+
+    def rebuild_busy_bitmaps(self) -> int:
+        with self._transaction():
+            days = set()
+            for row in self._execute("SELECT start_time, end_time FROM appointments WHERE status = 'scheduled'"):
+                days.update(days_touched(self._datetime(row['start_time']), self._datetime(row['end_time'])))
+            self._execute("DELETE FROM busy_bitmaps")
+            self._refresh_bitmaps(days)
+            return len(days)
+
+    def series_guard(self, exclusive: bool = False):
+        return self._series_lock.hold(exclusive)
+
+    def insert_recurring(self, series: RecurringAppointment) -> RecurringAppointment:
+        self._execute(f"INSERT INTO recurring_appointments ({', '.join(self.RECURRING_COLUMNS)}) "
+                      f"VALUES ({', '.join('?' * len(self.RECURRING_COLUMNS))})", self._series_row(series))
+        return self.get_recurring(series.id)
+
+    def get_recurring(self, series_id: str) -> Optional[RecurringAppointment]:
+        row = self._execute("SELECT * FROM recurring_appointments WHERE id = ?", (series_id,)).fetchone()
+        return self._series(row) if row else None
+
+    def list_recurring(self, start: Optional[datetime] = None,
+                       end: Optional[datetime] = None) -> List[RecurringAppointment]:
+        query = "SELECT * FROM recurring_appointments WHERE status = 'active'"
+        params = ()
+        if end:
+            query += " AND start_time < ?"
+            params = (self._text(end),)
+        rows = self._execute(query + " ORDER BY start_time, id", params)
+        # Series are few; the end of the last occurrence is checked here rather than in SQL
+        return [series for series in map(self._series, rows) if _series_in_window(series, start, None)]
+
+    def update_recurring(self, series_id: str, fields: Dict) -> Optional[RecurringAppointment]:
+        with self._transaction():
+            current = self.get_recurring(series_id)
+            if current is None:
+                return None
+            columns = [column for column in self.RECURRING_COLUMNS if column in fields]
+            values = dict(zip(self.RECURRING_COLUMNS, self._series_row(current.replace(**fields))))
+            self._execute(f"UPDATE recurring_appointments SET "
+                          f"{', '.join(f'{column} = ?' for column in columns)} WHERE id = ?",
+                          tuple(values[column] for column in columns) + (series_id,))
+        return self.get_recurring(series_id)
+
+    def recent_turns(self, session_id: str, limit: int) -> List[Dict]:
+        rows = self._execute(
+            "SELECT sender, message, intent, metadata, created_at FROM conversation_history "
+            "WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?", (session_id, limit))
+        return [dict(row, metadata=json.loads(row['metadata']), created_at=self._datetime(row['created_at']))
+                for row in rows]
+
+    def add_turns(self, session_id: str, turns: List[Dict]):
+        rows = [(session_id, turn['message'], turn['sender'], turn['intent'], json.dumps(turn['metadata']),
+                 self._text(turn['created_at'])) for turn in turns]
+        started = time.perf_counter()
+        self._connection().executemany(
+            "INSERT INTO conversation_history (user_id, message, sender, intent, metadata, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)", rows)
+        if self.on_query:
+            self.on_query(time.perf_counter() - started, 'insert')
+
+    def stats(self) -> Dict:
+        return {'backend': self.name, 'path': self.path}
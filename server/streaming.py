@@ -0,0 +1,109 @@
+import re
+from typing import Dict
+
+from models import dumps
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+_HEX4 = re.compile(r'[0-9a-fA-F]{4}')
+# What may still turn into a \uXXXX escape once more of the stream arrives
+_PARTIAL_ESCAPE = re.compile(r'(?:\\(?:u[0-9a-fA-F]{0,3})?)?')
+
+
+def sse_event(event: str, data: Dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+class ReplyExtractor:
+    """Incrementally pulls the ``"reply"`` string out of a streamed JSON document.
+
+    Feed it raw chunks as the model produces them; ``feed`` returns the newly
+    decoded part of the reply so it can be forwarded before the JSON is complete.
+    """
+
+    KEY = '"reply"'
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0          # next unread index in _buffer
+        self._state = 'key'    # key -> value -> string -> done
+        self.reply = ''
+
+    def feed(self, chunk: str) -> str:
+        self._buffer += chunk
+        out = []
+
+        while self._state != 'done':
+            if self._state == 'key':
+                index = self._buffer.find(self.KEY, self._pos)
+                if index < 0:
+                    # Keep enough of the tail to match a key split across chunks
+                    self._pos = max(self._pos, len(self._buffer) - len(self.KEY))
+                    break
+                self._pos = index + len(self.KEY)
+                self._state = 'value'
+
+            elif self._state == 'value':
+                while self._pos < len(self._buffer) and self._buffer[self._pos] in ' \t\r\n:':
+                    self._pos += 1
+                if self._pos >= len(self._buffer):
+                    break
+                if self._buffer[self._pos] != '"':
+                    self._state = 'done'
+                    break
+                self._pos += 1
+                self._state = 'string'
+
+            elif self._state == 'string':
+                # Decodes up to the closing quote or the end of what has arrived so far
+                out.append(self._read_string())
+                break
+
+        text = ''.join(out)
+        self.reply += text
+        return text
+
+    def _read_string(self) -> str:
+        chars = []
+        buffer = self._buffer
+        while self._pos < len(buffer):
+            char = buffer[self._pos]
+            if char == '"':
+                self._pos += 1
+                self._state = 'done'
+                return ''.join(chars)
+            if char == '\\':
+                if self._pos + 1 >= len(buffer):
+                    break
+                escape = buffer[self._pos + 1]
+                if escape == 'u':
+                    if _PARTIAL_ESCAPE.fullmatch(buffer[self._pos:self._pos + 6]):
+                        break
+                    digits = buffer[self._pos + 2:self._pos + 6]
+                    if not _HEX4.fullmatch(digits):
+                        # Not a valid escape: keep it as text rather than failing the stream
+                        chars.append('\\u')
+                        self._pos += 2
+                        continue
+                    code = int(digits, 16)
+                    if 0xD800 <= code < 0xDC00:
+                        # A high surrogate pairs with a following \uDC00-\uDFFF into one character
+                        tail = buffer[self._pos + 6:self._pos + 12]
+                        if len(tail) < 6 and _PARTIAL_ESCAPE.fullmatch(tail):
+                            break
+                        low = int(tail[2:], 16) if tail[:2] == '\\u' and _HEX4.fullmatch(tail[2:]) else 0
+                        if 0xDC00 <= low < 0xE000:
+                            chars.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                            self._pos += 12
+                            continue
+                    # Lone surrogates can't be encoded as UTF-8
+                    chars.append('\ufffd' if 0xD800 <= code < 0xE000 else chr(code))
+                    self._pos += 6
+                else:
+                    chars.append(_ESCAPES.get(escape, escape))
+                    self._pos += 2
+                continue
+            chars.append(char)
+            self._pos += 1
+        return ''.join(chars)
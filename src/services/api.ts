@@ -1,8 +1,11 @@
-import { ApiResponse, Appointment, AvailabilitySlot } from '../types';
+import { ApiResponse, Appointment, AvailabilitySlot, DayAvailability } from '../types';
 
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:5000/api';
 
 class ApiService {
+  // Lets the server keep conversation context across messages of this page session
+  private sessionId = crypto.randomUUID();
+
   private async request<T>(
     endpoint: string,
     options: RequestInit = {}
@@ -35,14 +38,69 @@ class ApiService {
   async sendMessage(message: string): Promise<ApiResponse<{ reply: string; action?: string; data?: any }>> {
     return this.request('/chat', {
       method: 'POST',
-      body: JSON.stringify({ message }),
+      body: JSON.stringify({ message, sessionId: this.sessionId }),
     });
   }
 
-  async getAppointments(startDate?: Date, endDate?: Date): Promise<ApiResponse<Appointment[]>> {
+  async streamMessage(
+    message: string,
+    onDelta: (text: string) => void
+  ): Promise<ApiResponse<{ reply: string; action?: string; data?: any }>> {
+    try {
+      const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ message, sessionId: this.sessionId }),
+      });
+
+      if (!response.ok || !response.body) {
+        const data = await response.json().catch(() => ({}));
+        throw new Error(data.error || 'API request failed');
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+          const rawEvent = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+
+          const event = rawEvent.match(/^event: (.*)$/m)?.[1];
+          const data = JSON.parse(rawEvent.match(/^data: (.*)$/m)?.[1] || '{}');
+
+          if (event === 'delta') onDelta(data.text);
+          else if (event === 'done' || event === 'error') return data;
+        }
+      }
+
+      throw new Error('Stream ended unexpectedly');
+    } catch (error) {
+      console.error('API stream failed:', error);
+      return {
+        success: false,
+        error: error instanceof Error ? error.message : 'Unknown error occurred',
+      };
+    }
+  }
+
+  async getAppointments(
+    startDate?: Date,
+    endDate?: Date,
+    cursor?: string,
+    limit?: number
+  ): Promise<ApiResponse<Appointment[]>> {
     const params = new URLSearchParams();
     if (startDate) params.append('start', startDate.toISOString());
     if (endDate) params.append('end', endDate.toISOString());
+    if (cursor) params.append('cursor', cursor);
+    if (limit) params.append('limit', limit.toString());
     
     return this.request(`/appointments?${params.toString()}`);
   }
@@ -55,10 +113,21 @@ class ApiService {
   }
 
   async checkAvailability(date: Date, duration: number): Promise<ApiResponse<AvailabilitySlot[]>> {
-    return this.request('/availability', {
-      method: 'POST',
-      body: JSON.stringify({ date: date.toISOString(), duration }),
+    const params = new URLSearchParams({ date: date.toISOString(), duration: duration.toString() });
+    return this.request(`/availability?${params.toString()}`);
+  }
+
+  async checkAvailabilityRange(
+    startDate: Date,
+    endDate: Date,
+    durations: number[]
+  ): Promise<ApiResponse<DayAvailability[]>> {
+    const params = new URLSearchParams({
+      start: startDate.toISOString(),
+      end: endDate.toISOString(),
+      durations: durations.join(','),
     });
+    return this.request(`/availability/range?${params.toString()}`);
   }
 
   async deleteAppointment(id: string): Promise<ApiResponse> {
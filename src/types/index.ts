@@ -15,6 +15,7 @@ export interface Appointment {
   attendees?: string[];
   location?: string;
   status: 'scheduled' | 'cancelled' | 'completed';
+  recurrenceId?: string | null;
 }
 
 export interface AvailabilitySlot {
@@ -23,6 +24,11 @@ export interface AvailabilitySlot {
   available: boolean;
 }
 
+export interface DayAvailability {
+  date: string;
+  slots: Record<string, AvailabilitySlot[]>;
+}
+
 export interface ChatState {
   messages: Message[];
   isListening: boolean;
@@ -37,6 +43,7 @@ export interface ApiResponse<T = any> {
   data?: T;
   message?: string;
   error?: string;
+  nextCursor?: string | null;
 }
 
 export interface VoiceSettings {